@@ -52,6 +52,25 @@ const authenticateToken = (req, res, next) => {
     });
 };
 
+// Store configuration, bump its version atomically and notify every gateway
+const CONFIG_KEY = 'rate_limit_config';
+const CONFIG_VERSION_KEY = '{rate_limit_config}:version';  // same cluster slot as CONFIG_KEY
+
+const saveConfig = async (config, notification) => {
+    const [, version] = await redisClient.multi()
+        .set(CONFIG_KEY, JSON.stringify(config))
+        .incr(CONFIG_VERSION_KEY)
+        .exec();
+
+    await redisClient.publish('config_update', JSON.stringify({
+        ...notification,
+        version,
+        timestamp: Date.now()
+    }));
+
+    return version;
+};
+
 // Routes
 
 // Health check
@@ -143,15 +162,11 @@ app.post('/api/config', authenticateToken, async (req, res) => {
             });
         }
 
-        // Store configuration in Redis
-        await redisClient.set('rate_limit_config', JSON.stringify(configData));
-
-        // Notify FastAPI gateway about config update (optional)
-        await redisClient.publish('config_update', JSON.stringify({
+        // Save configuration and notify gateways
+        await saveConfig(configData, {
             type: 'rate_limit_config',
-            data: configData,
-            timestamp: Date.now()
-        }));
+            data: configData
+        });
 
         res.json({ 
             message: 'Configuration updated successfully',
@@ -214,17 +229,13 @@ app.post('/api/endpoints', authenticateToken, async (req, res) => {
             burst_size: parseInt(burst_size) || config.default_burst_size || 10
         };
 
-        // Save updated configuration
-        await redisClient.set('rate_limit_config', JSON.stringify(config));
-
-        // Notify about update
-        await redisClient.publish('config_update', JSON.stringify({
+        // Save configuration and notify gateways
+        await saveConfig(config, {
             type: 'endpoint_config',
             endpoint,
             method,
-            data: config.endpoints[endpoint][method],
-            timestamp: Date.now()
-        }));
+            data: config.endpoints[endpoint][method]
+        });
 
         res.json({ 
             message: 'Endpoint configuration updated successfully',
@@ -259,16 +270,12 @@ app.delete('/api/endpoints/:endpoint/:method', authenticateToken, async (req, re
                 delete config.endpoints[endpoint];
             }
 
-            // Save updated configuration
-            await redisClient.set('rate_limit_config', JSON.stringify(config));
-
-            // Notify about deletion
-            await redisClient.publish('config_update', JSON.stringify({
+            // Save configuration and notify gateways
+            await saveConfig(config, {
                 type: 'endpoint_deleted',
                 endpoint,
-                method,
-                timestamp: Date.now()
-            }));
+                method
+            });
 
             res.json({ 
                 message: 'Endpoint configuration deleted successfully',
@@ -329,16 +336,12 @@ app.post('/api/users', authenticateToken, async (req, res) => {
             burst_size: parseInt(burst_size) || config.default_burst_size || 10
         };
 
-        // Save updated configuration
-        await redisClient.set('rate_limit_config', JSON.stringify(config));
-
-        // Notify about update
-        await redisClient.publish('config_update', JSON.stringify({
+        // Save configuration and notify gateways
+        await saveConfig(config, {
             type: 'user_override',
             user_id,
-            data: config.user_overrides[user_id],
-            timestamp: Date.now()
-        }));
+            data: config.user_overrides[user_id]
+        });
 
         res.json({ 
             message: 'User override updated successfully',
@@ -367,15 +370,11 @@ app.delete('/api/users/:user_id', authenticateToken, async (req, res) => {
         if (config.user_overrides && config.user_overrides[user_id]) {
             delete config.user_overrides[user_id];
 
-            // Save updated configuration
-            await redisClient.set('rate_limit_config', JSON.stringify(config));
-
-            // Notify about deletion
-            await redisClient.publish('config_update', JSON.stringify({
+            // Save configuration and notify gateways
+            await saveConfig(config, {
                 type: 'user_override_deleted',
-                user_id,
-                timestamp: Date.now()
-            }));
+                user_id
+            });
 
             res.json({ 
                 message: 'User override deleted successfully',
@@ -390,35 +389,77 @@ app.delete('/api/users/:user_id', authenticateToken, async (req, res) => {
     }
 });
 
+// Statistics layout written by the gateway's StatsRecorder: per-minute hashes kept for an hour,
+// hourly rollups (`h<hour>`) kept for a week, and top-N sorted sets under one hash tag
+const STATS_MINUTE_TTL_MINUTES = 60;
+const STATS_MAX_WINDOW_MINUTES = 7 * 24 * 60;
+const STATS_TOP_PREFIX = 'stats:{top}:';
+
+// Buckets covering the last `minutes` minutes, newest first: [first minute, key suffix]
+const statsWindow = (minutes, currentMinute) => {
+    const buckets = [];
+    if (minutes <= STATS_MINUTE_TTL_MINUTES) {
+        for (let i = 0; i < minutes; i++) {
+            buckets.push([currentMinute - i, `${currentMinute - i}`]);
+        }
+        return { resolution: 'minute', buckets };
+    }
+    const currentHour = Math.floor(currentMinute / 60);
+    for (let i = 0; i < Math.ceil(minutes / 60); i++) {
+        buckets.push([(currentHour - i) * 60, `h${currentHour - i}`]);
+    }
+    return { resolution: 'hour', buckets };
+};
+
 // Get statistics
 app.get('/api/stats', authenticateToken, async (req, res) => {
     try {
         const currentTime = Math.floor(Date.now() / 1000);
         const currentMinute = Math.floor(currentTime / 60);
-        
+        const minutes = Math.min(Math.max(parseInt(req.query.minutes) || 5, 1), STATS_MAX_WINDOW_MINUTES);
+        const top = Math.min(Math.max(parseInt(req.query.top) || 10, 1), 100);
+        const { resolution, buckets } = statsWindow(minutes, currentMinute);
+
+        // One round trip whatever the window: every counter hash, plus the merged top-N boards
+        const scratch = `${STATS_TOP_PREFIX}scratch:${process.pid}:${Date.now()}:${Math.random().toString(36).slice(2)}`;
+        const boards = ['users', 'endpoints', 'blocked_users', 'blocked_endpoints'];
+        const pipeline = redisClient.multi();
+        for (const [, suffix] of buckets) {
+            pipeline.hmGet(`stats:global:${suffix}`, ['total', 'allowed', 'blocked']);
+        }
+        for (const board of boards) {
+            pipeline.zUnionStore(`${scratch}:${board}`, buckets.map(([, suffix]) => `${STATS_TOP_PREFIX}${board}:${suffix}`));
+            pipeline.zRangeWithScores(`${scratch}:${board}`, 0, top - 1, { REV: true });
+        }
+        pipeline.del(boards.map((board) => `${scratch}:${board}`));
+        const replies = await pipeline.exec();
+
+        const [topUsers, topEndpoints, topOffenders, topBlockedEndpoints] =
+            boards.map((_, i) => replies[buckets.length + i * 2 + 1]);
+        // Members are "<METHOD> <route>"
+        const endpointEntries = (entries, countField) => entries.map(({ value, score }) => {
+            const split = value.indexOf(' ');
+            return { method: value.slice(0, split), endpoint: value.slice(split + 1), [countField]: score };
+        });
         const stats = {
             current_minute: currentMinute,
-            global_stats: [],
+            resolution,
+            global_stats: buckets.map(([minute], i) => {
+                const [total, allowed, blocked] = replies[i];
+                return {
+                    minute,
+                    total: parseInt(total || 0),
+                    allowed: parseInt(allowed || 0),
+                    blocked: parseInt(blocked || 0)
+                };
+            }),
+            top_users: topUsers.map(({ value, score }) => ({ user_id: value, requests: score })),
+            top_endpoints: endpointEntries(topEndpoints, 'requests'),
+            top_offenders: topOffenders.map(({ value, score }) => ({ user_id: value, blocked: score })),
+            top_blocked_endpoints: endpointEntries(topBlockedEndpoints, 'blocked'),
             recent_activity: []
         };
 
-        // Get global stats for last 5 minutes
-        for (let i = 0; i < 5; i++) {
-            const minuteKey = currentMinute - i;
-            const globalStatsKey = `stats:global:${minuteKey}`;
-            
-            const total = await redisClient.get(`${globalStatsKey}:total`) || 0;
-            const allowed = await redisClient.get(`${globalStatsKey}:allowed`) || 0;
-            const blocked = await redisClient.get(`${globalStatsKey}:blocked`) || 0;
-            
-            stats.global_stats.push({
-                minute: minuteKey,
-                total: parseInt(total),
-                allowed: parseInt(allowed),
-                blocked: parseInt(blocked)
-            });
-        }
-
         res.json(stats);
     } catch (error) {
         console.error('Get stats error:', error);
@@ -2,10 +2,25 @@ import React, { useState, useEffect } from 'react';
 
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:3001';
 
+// Windows longer than an hour are served from hourly rollups
+const STATS_WINDOWS = [
+  { minutes: 5, label: 'Last 5 Minutes' },
+  { minutes: 60, label: 'Last Hour' },
+  { minutes: 24 * 60, label: 'Last 24 Hours' },
+  { minutes: 7 * 24 * 60, label: 'Last 7 Days' }
+];
+
+const formatBucket = (stats, minute) => (
+  stats.resolution === 'hour'
+    ? new Date(minute * 60 * 1000).toLocaleString([], { weekday: 'short', hour: '2-digit', minute: '2-digit' })
+    : new Date(minute * 60 * 1000).toLocaleTimeString()
+);
+
 const Dashboard = ({ token, onLogout }) => {
   const [activeTab, setActiveTab] = useState('overview');
   const [config, setConfig] = useState(null);
   const [stats, setStats] = useState(null);
+  const [statsMinutes, setStatsMinutes] = useState(5);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
 
@@ -56,7 +71,7 @@ const Dashboard = ({ token, onLogout }) => {
 
   const loadStats = async () => {
     try {
-      const response = await apiCall('/api/stats');
+      const response = await apiCall(`/api/stats?minutes=${statsMinutes}`);
       if (response && response.ok) {
         const data = await response.json();
         setStats(data);
@@ -69,16 +84,22 @@ const Dashboard = ({ token, onLogout }) => {
   useEffect(() => {
     const loadData = async () => {
       setLoading(true);
-      await Promise.all([loadConfig(), loadStats()]);
+      await loadConfig();
       setLoading(false);
     };
 
     loadData();
-    
-    // Refresh stats every 30 seconds
+  }, []);
+
+  useEffect(() => {
+    loadStats();
+
+    // Refresh stats every 30 seconds; one request whatever the window length
     const interval = setInterval(loadStats, 30000);
     return () => clearInterval(interval);
-  }, []);
+  }, [statsMinutes]);
+
+  const windowLabel = STATS_WINDOWS.find((w) => w.minutes === statsMinutes).label;
 
   const handleAddEndpoint = async () => {
     if (!newEndpoint.endpoint) {
@@ -282,13 +303,13 @@ const Dashboard = ({ token, onLogout }) => {
               <div className="bg-white overflow-hidden shadow rounded-lg">
                 <div className="px-4 py-5 sm:p-6">
                   <h3 className="text-lg leading-6 font-medium text-gray-900 mb-4">
-                    Recent Activity (Last 5 Minutes)
+                    Recent Activity ({windowLabel})
                   </h3>
                   <div className="space-y-2">
                     {stats.global_stats.map((stat, index) => (
                       <div key={index} className="flex justify-between items-center py-2 border-b">
                         <div className="text-sm text-gray-600">
-                          Minute {stat.minute}
+                          {formatBucket(stats, stat.minute)}
                         </div>
                         <div className="flex space-x-4 text-sm">
                           <span className="text-green-600">✓ {stat.allowed}</span>
@@ -478,12 +499,23 @@ const Dashboard = ({ token, onLogout }) => {
                   <h3 className="text-lg leading-6 font-medium text-gray-900">
                     Rate Limiting Statistics
                   </h3>
-                  <button
-                    onClick={loadStats}
-                    className="bg-blue-600 hover:bg-blue-700 text-white px-3 py-1 rounded text-sm"
-                  >
-                    Refresh
-                  </button>
+                  <div className="flex space-x-2">
+                    <select
+                      className="border border-gray-300 rounded-md px-2 py-1 text-sm"
+                      value={statsMinutes}
+                      onChange={(e) => setStatsMinutes(parseInt(e.target.value))}
+                    >
+                      {STATS_WINDOWS.map((w) => (
+                        <option key={w.minutes} value={w.minutes}>{w.label}</option>
+                      ))}
+                    </select>
+                    <button
+                      onClick={loadStats}
+                      className="bg-blue-600 hover:bg-blue-700 text-white px-3 py-1 rounded text-sm"
+                    >
+                      Refresh
+                    </button>
+                  </div>
                 </div>
                 
                 {stats ? (
@@ -508,7 +540,7 @@ const Dashboard = ({ token, onLogout }) => {
                     </div>
 
                     <div className="mt-8">
-                      <h4 className="text-md font-medium text-gray-900 mb-4">Request History (Last 5 Minutes)</h4>
+                      <h4 className="text-md font-medium text-gray-900 mb-4">Request History ({windowLabel})</h4>
                       <div className="overflow-x-auto">
                         <table className="min-w-full divide-y divide-gray-200">
                           <thead className="bg-gray-50">
@@ -534,7 +566,7 @@ const Dashboard = ({ token, onLogout }) => {
                             {stats.global_stats.map((stat, index) => (
                               <tr key={index}>
                                 <td className="px-6 py-4 whitespace-nowrap text-sm font-medium text-gray-900">
-                                  {new Date(stat.minute * 60 * 1000).toLocaleTimeString()}
+                                  {formatBucket(stats, stat.minute)}
                                 </td>
                                 <td className="px-6 py-4 whitespace-nowrap text-sm text-gray-500">
                                   {stat.total}
@@ -554,6 +586,41 @@ const Dashboard = ({ token, onLogout }) => {
                         </table>
                       </div>
                     </div>
+
+                    <div className="grid grid-cols-1 md:grid-cols-2 gap-6 mt-8">
+                      <div>
+                        <h4 className="text-md font-medium text-gray-900 mb-4">Top Users ({windowLabel})</h4>
+                        {(stats.top_users || []).length > 0 ? (
+                          <div className="space-y-2">
+                            {stats.top_users.map((user) => (
+                              <div key={user.user_id} className="flex justify-between items-center py-2 border-b text-sm">
+                                <span className="text-gray-900">{user.user_id}</span>
+                                <span className="text-gray-600">{user.requests}</span>
+                              </div>
+                            ))}
+                          </div>
+                        ) : (
+                          <p className="text-gray-500 text-sm">No requests in this window.</p>
+                        )}
+                      </div>
+                      <div>
+                        <h4 className="text-md font-medium text-gray-900 mb-4">Top Endpoints ({windowLabel})</h4>
+                        {(stats.top_endpoints || []).length > 0 ? (
+                          <div className="space-y-2">
+                            {stats.top_endpoints.map((endpoint) => (
+                              <div key={`${endpoint.method} ${endpoint.endpoint}`} className="flex justify-between items-center py-2 border-b text-sm">
+                                <span className="text-gray-900">
+                                  <span className="font-medium">{endpoint.method}</span> {endpoint.endpoint}
+                                </span>
+                                <span className="text-gray-600">{endpoint.requests}</span>
+                              </div>
+                            ))}
+                          </div>
+                        ) : (
+                          <p className="text-gray-500 text-sm">No requests in this window.</p>
+                        )}
+                      </div>
+                    </div>
                   </div>
                 ) : (
                   <p className="text-gray-500">Loading statistics...</p>
@@ -1,10 +1,74 @@
 import jwt
+import time
+import hashlib
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from fastapi import HTTPException, status
 
 from config import settings
 
+class VerifiedTokenCache:
+    """Bounded LRU of tokens whose signature has already been verified.
+
+    Keyed by the SHA-256 digest of the token so raw tokens are not retained.
+    An entry lives until the token's `exp` or the cache TTL, whichever is
+    sooner, and the whole cache is dropped when the signing secret changes.
+    Only successful verifications are cached. Cached payloads are shared
+    between requests and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.secret = settings.JWT_SECRET_KEY
+        self.entries: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+    def _check_secret(self):
+        if settings.JWT_SECRET_KEY != self.secret:
+            # Secret rotated: tokens verified under the old one must be verified again
+            self.entries.clear()
+            self.secret = settings.JWT_SECRET_KEY
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached payload for a token, or None if it must be verified"""
+        self._check_secret()
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        entry = self.entries.get(digest)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if time.time() >= expires_at:
+            del self.entries[digest]
+            return None
+        self.entries.move_to_end(digest)
+        return payload
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        """Remember a verified token until its exp (or the cache TTL)"""
+        if self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if "exp" in payload:
+            expires_at = min(expires_at, float(payload["exp"]))
+        self.entries[hashlib.sha256(token.encode("utf-8")).digest()] = (payload, expires_at)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+token_cache = VerifiedTokenCache(settings.JWT_CACHE_MAX_ENTRIES, settings.JWT_CACHE_TTL_SECONDS)
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """Extract the token from an `Authorization: Bearer <token>` header value"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    return token.strip() or None
+
 def create_access_token(data: Dict[str, Any]) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -19,20 +83,24 @@ def create_access_token(data: Dict[str, Any]) -> str:
     return encoded_jwt
 
 def verify_jwt_token(token: str) -> Dict[str, Any]:
-    """Verify and decode a JWT token"""
+    """Verify and decode a JWT token (served from the verified-token cache when possible)"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(
             token, 
             settings.JWT_SECRET_KEY, 
             algorithms=[settings.JWT_ALGORITHM]
         )
+        token_cache.put(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired"
         )
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
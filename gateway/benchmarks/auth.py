@@ -0,0 +1,40 @@
+"""Microbenchmark: per-request authentication cost with and without the verified-token cache.
+
+Run from the gateway directory:
+    python -m benchmarks.auth
+"""
+import time
+
+import jwt
+
+from config import settings
+from auth import create_access_token, verify_jwt_token, bearer_token, token_cache
+
+TOKEN_COUNTS = [1, 100, 10000]
+LOOKUPS = 100000
+
+def uncached(authorization: str):
+    """The previous middleware path: split the header and verify every time"""
+    token = authorization.split(" ")[1]
+    return jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+
+def cached(authorization: str):
+    return verify_jwt_token(bearer_token(authorization))
+
+def bench(authenticate, headers) -> float:
+    """Return microseconds per request"""
+    n = len(headers)
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        authenticate(headers[i % n])
+    return (time.perf_counter() - start) / LOOKUPS * 1e6
+
+def main():
+    print(f"{'tokens':>8} {'uncached us/op':>16} {'cached us/op':>14}")
+    for token_count in TOKEN_COUNTS:
+        headers = [f"Bearer {create_access_token({'sub': f'user{i}'})}" for i in range(token_count)]
+        token_cache.clear()
+        print(f"{token_count:>8} {bench(uncached, headers):>16.2f} {bench(cached, headers):>14.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark: memory per key and admissions/sec for each limiter engine.
+
+Run from the gateway directory against the Redis in config.Settings:
+    python -m benchmarks.engines
+or against an in-memory fake (no memory numbers):
+    python -m benchmarks.engines --fake
+"""
+import sys
+import time
+import asyncio
+
+from redis_client import RedisClient
+from engines import ENGINES
+
+KEYS = 2000
+OPERATIONS = 20000
+CONCURRENCY = 50
+
+async def connect(fake: bool) -> RedisClient:
+    client = RedisClient()
+    for engine in ENGINES.values():
+        engine(client)  # registers the engine's scripts
+    if fake:
+        import fakeredis
+        client.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await client.load_scripts()
+    else:
+        await client.connect()
+    return client
+
+async def bench_engine(client: RedisClient, name: str, fake: bool):
+    engine = ENGINES[name](client)
+    keys = [engine.key_for(f"bench:{name}:{i}") for i in range(KEYS)]
+
+    # One admission per key so every key holds steady-state data
+    for key in keys:
+        await engine.consume(key, 600, 20)
+
+    memory = None
+    if not fake:
+        sample = keys[:: max(1, KEYS // 200)]
+        usages = [await client.redis.memory_usage(key) for key in sample]
+        memory = sum(usages) / len(usages)
+
+    async def worker(offset: int):
+        for i in range(offset, OPERATIONS, CONCURRENCY):
+            await engine.consume(keys[i % KEYS], 600, 20)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(offset) for offset in range(CONCURRENCY)])
+    elapsed = time.perf_counter() - start
+
+    await client.redis.delete(*keys)
+    return memory, OPERATIONS / elapsed
+
+async def main():
+    fake = "--fake" in sys.argv
+    client = await connect(fake)
+    print(f"{'engine':<24} {'bytes/key':>10} {'ops/sec':>10}")
+    for name in ENGINES:
+        memory, ops = await bench_engine(client, name, fake)
+        memory_text = f"{memory:.0f}" if memory is not None else "n/a"
+        print(f"{name:<24} {memory_text:>10} {ops:>10.0f}")
+    await client.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
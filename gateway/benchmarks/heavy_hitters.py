@@ -0,0 +1,81 @@
+"""Benchmark: accuracy, memory and speed of the sketch stats mode against exact per-user counts.
+
+Replays a Zipf-distributed stream of requests over many users (a few heavy
+users, a long tail) into a Count-Min Sketch and a Space-Saving top-K for
+several sizes, and compares them with exact counts:
+
+- error: mean and max overestimate of per-user counts, as a fraction of
+  all requests (the sketch guarantee is e / width at probability 1 - e^-depth)
+- top-K recall: share of the true top 10 users present in the top-K
+- memory: sketch bytes (the same in-process and in Redis) vs. one exact
+  counter per user
+
+Run from the gateway directory:
+    python -m benchmarks.heavy_hitters
+"""
+import math
+import random
+import time
+from collections import Counter
+
+from heavy_hitters import CountMinSketch, SpaceSaving
+
+USERS = 200000
+REQUESTS = 500000
+ZIPF_S = 1.1
+SAMPLE = 2000
+SKETCH_SIZES = [(256, 2), (1024, 4), (2048, 4), (8192, 5)]
+TOP_K_SIZES = [20, 100, 1000]
+
+def zipf_stream(users: int, requests: int, s: float):
+    """User ids drawn with P(rank r) proportional to 1 / r^s"""
+    weights = [1.0 / (rank ** s) for rank in range(1, users + 1)]
+    rng = random.Random(42)
+    return [f"user{index}" for index in rng.choices(range(users), weights=weights, k=requests)]
+
+def bench_sketch(stream, exact: Counter, width: int, depth: int):
+    sketch = CountMinSketch(width, depth)
+    start = time.perf_counter()
+    for user in stream:
+        sketch.add(user)
+    ns_per_add = (time.perf_counter() - start) / len(stream) * 1e9
+
+    rng = random.Random(7)
+    sample = rng.sample(list(exact), min(SAMPLE, len(exact)))
+    errors = [(sketch.estimate(user) - exact[user]) / len(stream) for user in sample]
+    assert min(errors) >= 0, "count-min sketch must never underestimate"
+    bound = math.e / width
+    print(f"{width:>6} {depth:>5} {sketch.memory_bytes:>10} {ns_per_add:>8.0f} "
+          f"{sum(errors) / len(errors):>11.6f} {max(errors):>10.6f} {bound:>10.6f}")
+
+def bench_top_k(stream, exact: Counter, capacity: int):
+    top = SpaceSaving(capacity)
+    start = time.perf_counter()
+    for user in stream:
+        top.add(user)
+    ns_per_add = (time.perf_counter() - start) / len(stream) * 1e9
+
+    true_top = {user for user, _ in exact.most_common(10)}
+    reported = {user for user, _ in top.top(capacity)}
+    recall = len(true_top & reported) / len(true_top)
+    worst = max(top.counts[user] - exact[user] for user in true_top & reported) if true_top & reported else 0
+    print(f"{capacity:>6} {ns_per_add:>8.0f} {recall:>14.0%} {worst:>16}")
+
+def main():
+    stream = zipf_stream(USERS, REQUESTS, ZIPF_S)
+    exact = Counter(stream)
+    print(f"{REQUESTS} requests from {len(exact)} distinct users (Zipf s={ZIPF_S})")
+    print(f"exact counts: {len(exact)} counters, one Redis hash per user per minute in exact mode\n")
+
+    print("Count-Min Sketch (error as a fraction of all requests)")
+    print(f"{'width':>6} {'depth':>5} {'bytes':>10} {'ns/add':>8} {'mean error':>11} {'max error':>10} {'e/width':>10}")
+    for width, depth in SKETCH_SIZES:
+        bench_sketch(stream, exact, width, depth)
+
+    print("\nSpace-Saving top-K")
+    print(f"{'K':>6} {'ns/add':>8} {'top-10 recall':>14} {'max overcount':>16}")
+    for capacity in TOP_K_SIZES:
+        bench_top_k(stream, exact, capacity)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Load and latency benchmark for the whole gateway (main.app).
+
+Drives the real app with authenticated traffic from Zipf-distributed users
+(a few heavy users hit their limits, a long tail does not) over a mix of GET
+and POST requests to the example /api endpoints, and reports throughput,
+latency percentiles, response statuses and Redis usage per request.
+
+Transports:
+    asgi    requests go straight into the ASGI app in-process (no sockets, no HTTP parsing)
+    socket  the app is served by uvicorn on a loopback port in the same process
+
+Redis:
+    --fake  in-memory fakeredis; otherwise the Redis in config.Settings, where the
+            server-side command count (INFO total_commands_processed) is also reported
+
+Results are written as JSON (--output) and can be compared with an earlier run
+(--compare), e.g. one saved on the previous commit. Run from the gateway directory:
+    python -m benchmarks.load --fake
+    python -m benchmarks.load --transport socket --output after.json --compare before.json
+"""
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from config import settings
+from auth import create_access_token
+from metrics import REDIS_COMMAND_SECONDS
+
+ENDPOINTS = [("/api/data", 0.6), ("/api/users", 0.4)]
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Gateway load and latency benchmark")
+    parser.add_argument("--transport", choices=["asgi", "socket"], default="asgi")
+    parser.add_argument("--fake", action="store_true", help="use an in-memory fake Redis")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--warmup", type=int, default=500, help="requests sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="user popularity exponent")
+    parser.add_argument("--post-ratio", type=float, default=0.2)
+    parser.add_argument("--backend-delay-ms", type=int, default=0,
+                        help="simulated work in the example endpoints (EXAMPLE_API_DELAY_MS)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="print changes against an earlier results file")
+    return parser.parse_args(argv)
+
+def build_plan(args: argparse.Namespace, count: int, rng: random.Random) -> List[Tuple[str, str, Dict[str, str]]]:
+    """(method, path, headers) per request: Zipf users, weighted endpoints, POST share"""
+    tokens = [create_access_token({"sub": f"load-user-{rank}"}) for rank in range(1, args.users + 1)]
+    user_weights = [1.0 / (rank ** args.zipf) for rank in range(1, args.users + 1)]
+    users = rng.choices(range(args.users), weights=user_weights, k=count)
+    paths = rng.choices([path for path, _ in ENDPOINTS], weights=[w for _, w in ENDPOINTS], k=count)
+    plan = []
+    for user, path in zip(users, paths):
+        method = "POST" if rng.random() < args.post_ratio else "GET"
+        plan.append((method, path, {"Authorization": f"Bearer {tokens[user]}"}))
+    return plan
+
+async def start_gateway(fake: bool):
+    import main
+    if fake:
+        import fakeredis
+        main.redis_client.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await main.redis_client.load_scripts()
+        main.redis_client.connected = True
+        if main.stats_client:
+            main.stats_client.redis = main.redis_client.redis
+            main.stats_client.connected = True
+    else:
+        await main.redis_client.connect()
+        if main.stats_client:
+            await main.stats_client.connect()
+    await main.rate_limiter.stats_recorder.start()
+    return main
+
+async def stop_gateway(main, fake: bool):
+    await main.rate_limiter.stats_recorder.stop()
+    await main.upstreams.close()
+    if not fake:
+        if main.stats_client:
+            await main.stats_client.disconnect()
+        await main.redis_client.disconnect()
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def serve_socket(app):
+    """Start uvicorn on a loopback port; returns (base URL, server, serving task)"""
+    import uvicorn
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off",
+                                           log_level="warning", access_log=False))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return f"http://127.0.0.1:{port}", server, task
+
+async def redis_commands_processed(main) -> Optional[int]:
+    """Server-side command counter; None for the fake"""
+    try:
+        return int((await main.redis_client.redis.info("stats"))["total_commands_processed"])
+    except Exception:
+        return None
+
+def redis_calls() -> int:
+    """Round trips made through RedisClient so far (scripts, pipelines and single commands)"""
+    return sum(int(sum(series[:-1])) for series in REDIS_COMMAND_SECONDS.series.values())
+
+async def drive(client: httpx.AsyncClient, plan, concurrency: int) -> Tuple[List[float], Counter]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(plan):
+            method, path, headers = plan[position]
+            position += 1
+            start = time.perf_counter()
+            if method == "POST":
+                response = await client.post(path, headers=headers, json={"value": "load"})
+            else:
+                response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, statuses
+
+def percentile(sorted_values: List[float], quantile: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(quantile * len(sorted_values)))]
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    settings.EXAMPLE_API_DELAY_MS = args.backend_delay_ms
+    rng = random.Random(args.seed)
+    warmup_plan = build_plan(args, args.warmup, rng)
+    plan = build_plan(args, args.requests, rng)
+
+    main = await start_gateway(args.fake)
+    server = task = None
+    try:
+        if args.transport == "socket":
+            base_url, server, task = await serve_socket(main.app)
+            transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.concurrency))
+        else:
+            base_url, transport = "http://gateway", httpx.ASGITransport(app=main.app)
+
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=30.0) as client:
+            await drive(client, warmup_plan, args.concurrency)
+            calls_before, commands_before = redis_calls(), await redis_commands_processed(main)
+            start = time.perf_counter()
+            latencies, statuses = await drive(client, plan, args.concurrency)
+            elapsed = time.perf_counter() - start
+            calls_after, commands_after = redis_calls(), await redis_commands_processed(main)
+    finally:
+        if server is not None:
+            server.should_exit = True
+            await task
+        await stop_gateway(main, args.fake)
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "requests": count,
+        "duration_seconds": elapsed,
+        "throughput_rps": count / elapsed,
+        "latency_ms": {
+            "mean": sum(latencies) / count * 1000,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p90": percentile(latencies, 0.90) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "p999": percentile(latencies, 0.999) * 1000,
+            "max": latencies[-1] * 1000
+        },
+        "status_counts": {str(status): n for status, n in sorted(statuses.items())},
+        "redis_calls_per_request": (calls_after - calls_before) / count,
+        # The INFO call between the two readings is itself one command
+        "redis_commands_per_request": (commands_after - commands_before - 1) / count
+        if commands_before is not None and commands_after is not None else None
+    }
+
+def report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    def line(label: str, value: Optional[float], old: Optional[float], unit: str = ""):
+        if value is None:
+            print(f"{label:<26} {'-':>12}")
+            return
+        change = f"  ({(value - old) / old:+.1%} vs {old:.2f})" if old else ""
+        print(f"{label:<26} {value:>12.2f}{unit}{change}")
+
+    base = baseline or {}
+    print(f"{results['requests']} requests, concurrency {results['settings']['concurrency']}, "
+          f"transport {results['settings']['transport']}, {'fake' if results['settings']['fake'] else 'real'} Redis")
+    line("throughput (req/s)", results["throughput_rps"], base.get("throughput_rps"))
+    for name, value in results["latency_ms"].items():
+        line(f"latency {name} (ms)", value, base.get("latency_ms", {}).get(name))
+    line("redis calls/request", results["redis_calls_per_request"], base.get("redis_calls_per_request"))
+    line("redis commands/request", results["redis_commands_per_request"], base.get("redis_commands_per_request"))
+    print("statuses: " + ", ".join(f"{status}={n}" for status, n in results["status_counts"].items()))
+
+def main(argv: List[str]):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,104 @@
+"""Benchmark: Redis memory per active user for each bucket encoding and stats mode.
+
+Simulates USERS users each calling every configured endpoint/method once in
+the same minute, through the real admission scripts and statistics flush,
+then sums MEMORY USAGE over every key written and divides by the number of
+users:
+
+- hash buckets, exact stats      the defaults (BUCKET_ENCODING=hash)
+- packed buckets, exact stats    BUCKET_ENCODING=packed
+- packed buckets, sketch stats   plus STATS_SKETCH_ENABLED=true
+
+Shared keys (global and endpoint counters, top-N sets, sketches) are spread
+over the users, so they shrink per user as USERS grows. Needs the Redis in
+config.Settings (MEMORY USAGE is not emulated by fakeredis). Keys are written
+under a `membench:` prefix and deleted afterwards. Run from the gateway directory:
+    python -m benchmarks.memory
+"""
+import asyncio
+from typing import Dict, List
+
+from config import settings
+from redis_client import RedisClient
+from engines import TokenBucketEngine
+from stats_recorder import StatsRecorder
+
+USERS = 10000
+CONCURRENCY = 100
+PREFIX = "membench:"
+SCENARIOS = [
+    ("hash buckets, exact stats", "hash", False),
+    ("packed buckets, exact stats", "packed", False),
+    ("packed buckets, sketch stats", "packed", True)
+]
+
+def endpoint_limits() -> List[tuple]:
+    """(route, method, requests_per_minute, burst_size) for every configured endpoint"""
+    return [
+        (route, method, limit["requests_per_minute"], limit["burst_size"])
+        for route, methods in settings.DEFAULT_RATE_LIMITS["endpoints"].items()
+        for method, limit in methods.items()
+    ]
+
+async def populate(client: RedisClient, encoding: str, sketch: bool):
+    engine = TokenBucketEngine(client, encoding)
+    await client.load_scripts()
+    recorder = StatsRecorder(client, f"{PREFIX}stats:")
+    recorder.sketch_enabled = sketch
+    limits = endpoint_limits()
+
+    async def user(index: int):
+        user_id = f"user{index}"
+        for route, method, requests_per_minute, burst_size in limits:
+            key = engine.key_for(f"{PREFIX}bucket:{{{user_id}}}:{route}:{method}")
+            admission = await engine.consume(
+                key, requests_per_minute, burst_size, 1, f"{PREFIX}bucket_index:{{{user_id}}}"
+            )
+            recorder.record(user_id, route, method, admission.allowed)
+
+    for start in range(0, USERS, CONCURRENCY):
+        await asyncio.gather(*[user(index) for index in range(start, min(start + CONCURRENCY, USERS))])
+    await recorder.flush()
+
+async def measure(client: RedisClient) -> Dict[str, int]:
+    """Bytes by key kind (bucket, index, stats) over every benchmark key; deletes them"""
+    totals = {"buckets": 0, "index": 0, "stats": 0}
+    keys = [key async for key in client.redis.scan_iter(match=f"{PREFIX}*", count=1000)]
+    for start in range(0, len(keys), 1000):
+        batch = keys[start:start + 1000]
+        async with client.pipeline() as pipe:
+            for key in batch:
+                pipe.memory_usage(key, samples=0)
+            sizes = await pipe.execute()
+        for key, size in zip(batch, sizes):
+            kind = "index" if key.startswith(f"{PREFIX}bucket_index:") else \
+                "buckets" if key.startswith(f"{PREFIX}bucket:") else "stats"
+            totals[kind] += size or 0
+        await client.redis.delete(*batch)
+    return totals
+
+async def run():
+    client = RedisClient()
+    try:
+        await client.connect()
+    except Exception:
+        print(f"Redis at {settings.REDIS_HOST}:{settings.REDIS_PORT} unreachable: this benchmark needs a real server")
+        return
+
+    try:
+        info = await client.redis.info("server")
+        print(f"Redis {info.get('redis_version')}; {USERS} active users, {len(endpoint_limits())} buckets each\n")
+        print(f"{'':<30} {'buckets':>9} {'index':>9} {'stats':>9} {'total':>9}  bytes per user")
+        baseline = None
+        for label, encoding, sketch in SCENARIOS:
+            await populate(client, encoding, sketch)
+            totals = await measure(client)
+            total = sum(totals.values())
+            baseline = baseline or total
+            print(f"{label:<30} {totals['buckets'] / USERS:>9.0f} {totals['index'] / USERS:>9.0f} "
+                  f"{totals['stats'] / USERS:>9.0f} {total / USERS:>9.0f}  ({total / baseline:.0%})")
+    finally:
+        await client.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,38 @@
+"""Microbenchmark: hot-path cost of recording metrics, and of rendering a scrape.
+
+Run from the gateway directory:
+    python -m benchmarks.metrics
+"""
+import time
+
+from metrics import Counter, Histogram, Registry
+
+OPERATIONS = 1000000
+ROUTES = 50
+
+def bench(record) -> float:
+    """Return nanoseconds per call (loop overhead included)"""
+    start = time.perf_counter()
+    for i in range(OPERATIONS):
+        record(i)
+    return (time.perf_counter() - start) / OPERATIONS * 1e9
+
+def main():
+    registry = Registry()
+    counter = registry.register(Counter("bench_requests_total", "Requests", ("route", "method", "result")))
+    histogram = registry.register(Histogram("bench_seconds", "Latency", ("operation",)))
+    unlabelled = registry.register(Histogram("bench_admission_seconds", "Latency"))
+    routes = [f"/api/route{i}" for i in range(ROUTES)]
+
+    print(f"{'operation':<28} {'ns/op':>8}")
+    print(f"{'loop only':<28} {bench(lambda i: None):>8.0f}")
+    print(f"{'Counter.inc (3 labels)':<28} {bench(lambda i: counter.inc(routes[i % ROUTES], 'GET', 'allowed')):>8.0f}")
+    print(f"{'Histogram.observe (1 label)':<28} {bench(lambda i: histogram.observe(0.0003, 'get')):>8.0f}")
+    print(f"{'Histogram.observe (no label)':<28} {bench(lambda i: unlabelled.observe(0.0003)):>8.0f}")
+
+    start = time.perf_counter()
+    body = registry.render()
+    print(f"render: {len(body.splitlines())} lines in {(time.perf_counter() - start) * 1e3:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark: requests/sec through the previous @app.middleware("http") limiter vs RateLimitMiddleware.
+
+Requests are driven in-process straight into the ASGI app, so the numbers
+are middleware and framework overhead only. The limiter always admits (no
+Redis), isolating the cost of the middleware itself.
+
+Run from the gateway directory:
+    python -m benchmarks.middleware
+"""
+import time
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from auth import create_access_token, verify_jwt_token
+from engines import Admission
+from rate_limit_middleware import RateLimitMiddleware, EXEMPT_PATHS
+
+REQUESTS = 20000
+CONCURRENCY = 50
+
+class AdmitAll:
+    """Limiter with the TokenBucketRateLimiter interface that admits everything"""
+
+    def has_dimensions(self) -> bool:
+        return False
+
+    def has_concurrency_limits(self) -> bool:
+        return False
+
+    async def is_allowed(self, user_id: str, endpoint: str, method: str) -> bool:
+        return True
+
+    async def admit(self, user_id: str, endpoint: str, method: str) -> Admission:
+        return Admission(True, 99.0, 100, 0.0, 0.6)
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/data")
+    async def data():
+        return {"data": "ok"}
+
+    @app.get("/api/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(16):
+                yield b"x" * 1024
+        return StreamingResponse(chunks())
+
+    return app
+
+def legacy_app(limiter) -> FastAPI:
+    """The middleware as it was before RateLimitMiddleware"""
+    app = build_app()
+
+    @app.middleware("http")
+    async def rate_limit_middleware(request: Request, call_next):
+        if request.url.path in ["/docs", "/redoc", "/openapi.json", "/admin/login", "/health"]:
+            return await call_next(request)
+        user_id = None
+        auth_header = request.headers.get("authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            token = auth_header.split(" ")[1]
+            try:
+                user_id = verify_jwt_token(token).get("sub")
+            except Exception:
+                return JSONResponse(status_code=401, content={"error": "Invalid token"})
+        if not user_id:
+            return JSONResponse(status_code=401, content={"error": "Authentication required"})
+        if not await limiter.is_allowed(user_id, request.url.path, request.method):
+            return JSONResponse(status_code=429, content={"error": "Rate limit exceeded"})
+        return await call_next(request)
+
+    return app
+
+def asgi_app(limiter) -> FastAPI:
+    app = build_app()
+    app.add_middleware(RateLimitMiddleware, rate_limiter=limiter, exempt_paths=EXEMPT_PATHS)
+    return app
+
+async def call(app, path: str, headers) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 50000), "server": ("testserver", 80)
+    }
+    status = 0
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Client stays connected; disconnect listeners wait until they are cancelled
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+async def bench(app, path: str, headers) -> float:
+    """Return requests per second"""
+    async def worker(count: int):
+        for _ in range(count):
+            await call(app, path, headers)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(REQUESTS // CONCURRENCY) for _ in range(CONCURRENCY)])
+    return REQUESTS / (time.perf_counter() - start)
+
+async def main():
+    limiter = AdmitAll()
+    headers = [(b"authorization", f"Bearer {create_access_token({'sub': 'bench'})}".encode())]
+    apps = {"@app.middleware": legacy_app(limiter), "RateLimitMiddleware": asgi_app(limiter)}
+
+    print(f"{'path':<16} {'middleware':<22} {'req/sec':>10}")
+    for path, request_headers in (("/api/data", headers), ("/api/stream", headers), ("/api/data", [])):
+        label = path if request_headers else f"{path} (401)"
+        for name, app in apps.items():
+            await call(app, path, request_headers)  # warm up routing and caches
+            print(f"{label:<16} {name:<22} {await bench(app, path, request_headers):>10.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
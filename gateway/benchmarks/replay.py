@@ -0,0 +1,317 @@
+"""Replay a recorded request log through the rate limiter or the whole gateway.
+
+The log is JSON Lines, one request per line:
+    {"user": "alice", "path": "/api/data", "method": "GET", "timestamp": 1760000000.25}
+(`user_id` and `endpoint` are accepted as aliases, `method` defaults to GET and
+`timestamp` may be unix seconds or ISO 8601, UTC unless it has an offset). Gzipped logs (.gz) and stdin (-)
+work too. The log is streamed through a chain of generators, so it is never
+held in memory; lines that do not parse are counted and skipped.
+
+Targets:
+    limiter  TokenBucketRateLimiter directly: is_allowed, or is_allowed_dimensions when
+             dimension limits or plan quotas are configured (as the middleware does)
+    app      main.app in-process over ASGI, with a bearer token per user; any status
+             other than 429 counts as admitted
+
+Timing:
+    original  requests are sent at their recorded offsets (--speed 10 plays ten times faster)
+    fast      as fast as --concurrency allows; the limiter's clock follows the log's
+              timestamps instead of the wall clock, so decisions match an original-timing replay
+
+Reports throughput, decision latency and admitted/blocked counts per user.
+Results can be saved (--output) and compared with an earlier run (--compare),
+e.g. one made before a config or engine change; --decisions writes every
+decision as JSON Lines. Run from the gateway directory:
+    python -m benchmarks.replay traffic.jsonl --fake
+    python -m benchmarks.replay traffic.jsonl.gz --fake --config candidate.json --compare before.json
+"""
+import sys
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import contextvars
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO
+
+import httpx
+
+from auth import create_access_token
+from redis_client import RedisClient
+from rate_limiter import TokenBucketRateLimiter
+from benchmarks.load import start_gateway, stop_gateway, percentile, git_commit
+
+class Record(NamedTuple):
+    seq: int  # line number in the log
+    user: str
+    path: str
+    method: str
+    timestamp: float
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay a JSONL request log through the gateway")
+    parser.add_argument("log", help="JSONL request log (.gz allowed, - for stdin)")
+    parser.add_argument("--target", choices=["limiter", "app"], default="limiter")
+    parser.add_argument("--timing", choices=["original", "fast"], default="fast")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed for original timing")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight at most")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--fake", action="store_true", help="use an in-memory fake Redis")
+    parser.add_argument("--config", help="rate limit config (JSON) to apply before replaying")
+    parser.add_argument("--top", type=int, default=10, help="most-blocked users to print")
+    parser.add_argument("--decisions", help="write every decision to this JSONL file")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="print changes against an earlier results file")
+    return parser.parse_args(argv)
+
+# Generator pipeline: lines -> records -> (first N) -> paced
+
+def read_lines(path: str) -> Iterator[str]:
+    if path == "-":
+        yield from sys.stdin
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        yield from f
+
+def parse_timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        # Naive times are UTC, not this machine's local time
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def field(entry: Dict[str, Any], name: str, alias: str) -> Any:
+    """A required field under its name or alias; KeyError (a malformed line) if neither is set"""
+    value = entry.get(name)
+    if value is None:
+        value = entry.get(alias)
+    if value is None:
+        raise KeyError(name)
+    return value
+
+def parse_records(lines: Iterable[str], malformed: Counter) -> Iterator[Record]:
+    for seq, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            yield Record(
+                seq,
+                str(field(entry, "user", "user_id")),
+                field(entry, "path", "endpoint"),
+                entry.get("method", "GET").upper(),
+                parse_timestamp(entry["timestamp"])
+            )
+        except (ValueError, KeyError, TypeError, AttributeError):
+            malformed["lines"] += 1
+
+async def paced(records: Iterable[Record], timing: str, speed: float) -> AsyncIterator[Record]:
+    """Yield records as they are due (original timing) or immediately (fast)"""
+    start = first = None
+    for record in records:
+        if timing == "original":
+            if first is None:
+                start, first = time.perf_counter(), record.timestamp
+            delay = (record.timestamp - first) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield record
+
+# The limiter's clock while replaying fast: each request task sees its own record's timestamp
+
+log_time: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("log_time", default=None)
+
+def log_clock() -> float:
+    """The timestamp of the record being decided, or the wall clock outside a fast replay"""
+    timestamp = log_time.get()
+    return timestamp if timestamp is not None else time.time()
+
+# Targets: async callables deciding one record, True when admitted
+
+async def limiter_target(args: argparse.Namespace, config: Optional[Dict[str, Any]]):
+    client = RedisClient()
+    if args.fake:
+        import fakeredis
+        client.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await client.load_scripts()
+        client.connected = True
+    else:
+        await client.connect()
+    limiter = TokenBucketRateLimiter(client, clock=log_clock if args.timing == "fast" else time.time)
+    if config is not None:
+        await limiter.update_config(config)
+    await limiter.stats_recorder.start()
+
+    async def decide(record: Record) -> bool:
+        if limiter.has_dimensions():
+            return await limiter.is_allowed_dimensions(record.user, record.path, record.method)
+        return await limiter.is_allowed(record.user, record.path, record.method)
+
+    async def close():
+        await limiter.stats_recorder.stop()
+        if not args.fake:
+            await client.disconnect()
+
+    return decide, close
+
+async def app_target(args: argparse.Namespace, config: Optional[Dict[str, Any]]):
+    main = await start_gateway(args.fake)
+    if args.timing == "fast":
+        main.rate_limiter.use_clock(log_clock)
+    if config is not None:
+        await main.rate_limiter.update_config(config)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://gateway", timeout=30.0)
+    tokens: Dict[str, str] = {}
+
+    async def decide(record: Record) -> bool:
+        token = tokens.get(record.user)
+        if token is None:
+            token = tokens[record.user] = create_access_token({"sub": record.user})
+        body = {"value": "replay"} if record.method in ("POST", "PUT", "PATCH") else None
+        response = await client.request(record.method, record.path, json=body,
+                                        headers={"Authorization": f"Bearer {token}"})
+        return response.status_code != 429
+
+    async def close():
+        await client.aclose()
+        main.rate_limiter.use_clock(time.time)
+        await stop_gateway(main, args.fake)
+
+    return decide, close
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    malformed: Counter = Counter()
+    records = islice(parse_records(read_lines(args.log), malformed), args.limit)
+    decide, close = await (limiter_target if args.target == "limiter" else app_target)(args, config)
+    decisions_file: Optional[TextIO] = open(args.decisions, "w") if args.decisions else None
+
+    users: Dict[str, Counter] = {}
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    span = [None, None]  # first and last log timestamp
+    slots = asyncio.Semaphore(args.concurrency)
+    pending = set()
+
+    async def replay(record: Record):
+        try:
+            start = time.perf_counter()
+            allowed = await decide(record)
+            latencies.append(time.perf_counter() - start)
+            users.setdefault(record.user, Counter())["allowed" if allowed else "blocked"] += 1
+            if decisions_file is not None:
+                decisions_file.write(json.dumps({**record._asdict(), "allowed": allowed}) + "\n")
+        except Exception as e:
+            errors[type(e).__name__] += 1
+        finally:
+            slots.release()
+
+    start = time.perf_counter()
+    try:
+        async for record in paced(records, args.timing, args.speed):
+            if span[0] is None:
+                span[0] = record.timestamp
+            span[1] = record.timestamp
+            await slots.acquire()
+            # The task copies the context, so its engine calls see this record's timestamp
+            log_time.set(record.timestamp if args.timing == "fast" else None)
+            task = asyncio.create_task(replay(record))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        elapsed = time.perf_counter() - start
+    finally:
+        if decisions_file is not None:
+            decisions_file.close()
+        await close()
+
+    latencies.sort()
+    count = len(latencies)
+    totals = sum(users.values(), Counter())
+    return {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "top")},
+        "requests": count,
+        "malformed_lines": malformed["lines"],
+        "errors": dict(errors),
+        "log_span_seconds": (span[1] - span[0]) if span[0] is not None else 0.0,
+        "duration_seconds": elapsed,
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / count * 1000,
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": latencies[-1] * 1000
+        } if count else {},
+        "allowed": totals["allowed"],
+        "blocked": totals["blocked"],
+        "users": {user: dict(counts) for user, counts in users.items()}
+    }
+
+def report(results: Dict[str, Any], top: int, baseline: Optional[Dict[str, Any]] = None):
+    base = baseline or {}
+
+    def line(label: str, value: float, old: Optional[float]):
+        change = f"  ({(value - old) / old:+.1%} vs {old:.2f})" if old else ""
+        print(f"{label:<22} {value:>12.2f}{change}")
+
+    replay_settings = results["settings"]
+    print(f"{results['requests']} requests from {replay_settings['log']} ({results['malformed_lines']} malformed lines "
+          f"skipped), target {replay_settings['target']}, {replay_settings['timing']} timing, "
+          f"{'fake' if replay_settings['fake'] else 'real'} Redis")
+    print(f"log span {results['log_span_seconds']:.1f}s, replayed in {results['duration_seconds']:.1f}s")
+    if results["errors"]:
+        print("errors: " + ", ".join(f"{name}={n}" for name, n in results["errors"].items()))
+    line("throughput (req/s)", results["throughput_rps"], base.get("throughput_rps"))
+    for name, value in results["latency_ms"].items():
+        line(f"latency {name} (ms)", value, base.get("latency_ms", {}).get(name))
+    print(f"admitted {results['allowed']}, blocked {results['blocked']}"
+          + (f" (before: admitted {base['allowed']}, blocked {base['blocked']})" if base else ""))
+
+    users = results["users"]
+    most_blocked = sorted(users.items(), key=lambda item: item[1].get("blocked", 0), reverse=True)[:top]
+    print(f"\nmost blocked users ({len(users)} users):")
+    for user, counts in most_blocked:
+        if counts.get("blocked"):
+            print(f"  {user:<30} admitted {counts.get('allowed', 0):>8}  blocked {counts['blocked']:>8}")
+
+    if baseline:
+        # Users whose decisions changed between the two runs
+        changed = []
+        for user in users.keys() | baseline["users"].keys():
+            now, before = users.get(user, {}), baseline["users"].get(user, {})
+            delta = now.get("blocked", 0) - before.get("blocked", 0)
+            if delta:
+                changed.append((user, delta))
+        changed.sort(key=lambda item: abs(item[1]), reverse=True)
+        print(f"\n{len(changed)} users with different decisions than the baseline:")
+        for user, delta in changed[:top]:
+            print(f"  {user:<30} blocked {delta:+d}")
+
+def main(argv: List[str]):
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, args.top, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
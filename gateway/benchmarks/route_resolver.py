@@ -0,0 +1,61 @@
+"""Microbenchmark: rate limit resolution cost as the number of rules grows.
+
+Run from the gateway directory:
+    python -m benchmarks.route_resolver
+"""
+import random
+import time
+
+from route_resolver import RouteResolver
+
+RULE_COUNTS = [10, 100, 1000, 5000]
+LOOKUPS = 200000
+
+def build_config(rule_count: int):
+    endpoints = {}
+    for i in range(rule_count):
+        kind = i % 3
+        if kind == 0:
+            path = f"/api/service{i}/items"
+        elif kind == 1:
+            path = f"/api/service{i}/items/{{id}}"
+        else:
+            path = f"/api/service{i}/*"
+        endpoints[path] = {"GET": {"requests_per_minute": 100, "burst_size": 20}}
+    return {"default_requests_per_minute": 60, "default_burst_size": 10, "endpoints": endpoints}
+
+def build_paths(rule_count: int, count: int = 1000):
+    rng = random.Random(42)
+    paths = []
+    for _ in range(count):
+        i = rng.randrange(rule_count)
+        kind = i % 3
+        if kind == 0:
+            paths.append(f"/api/service{i}/items")
+        elif kind == 1:
+            paths.append(f"/api/service{i}/items/{rng.randrange(100000)}")
+        else:
+            paths.append(f"/api/service{i}/a/b")
+    return paths
+
+def bench(resolve, paths) -> float:
+    """Return nanoseconds per lookup"""
+    n = len(paths)
+    start = time.perf_counter()
+    for i in range(LOOKUPS):
+        resolve("user", paths[i % n], "GET")
+    return (time.perf_counter() - start) / LOOKUPS * 1e9
+
+def main():
+    print(f"{'rules':>8} {'uncached ns/op':>16} {'memoized ns/op':>16}")
+    for rule_count in RULE_COUNTS:
+        config = build_config(rule_count)
+        paths = build_paths(rule_count)
+
+        uncached = RouteResolver(config, cache_size=0)
+        cached = RouteResolver(config, cache_size=len(paths) * 2)
+
+        print(f"{rule_count:>8} {bench(uncached.resolve, paths):>16.0f} {bench(cached.resolve, paths):>16.0f}")
+
+if __name__ == "__main__":
+    main()
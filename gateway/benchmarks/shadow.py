@@ -0,0 +1,158 @@
+"""Benchmark: what shadow evaluation costs live requests.
+
+Runs the same admission workload through TokenBucketRateLimiter.admit in
+three modes and reports per-call admission latency percentiles and throughput:
+
+    off       no shadow run
+    queued    a shadow run is active but no workers run: only the request-path
+              part (observe() putting the request on the queue) is measured
+    on        workers evaluate the candidate config (every limit halved, so
+              decisions differ) on the same event loop and Redis
+
+plus the cost of one observe() call and what the workers evaluated, found or
+dropped. With --fake, Redis itself runs inside this process, so in `on` mode
+the server-side work of the shadow scripts is charged to the live requests
+too; against a real Redis only the client side is.
+
+Redis:
+    --fake  in-memory fakeredis; otherwise the Redis in config.Settings
+            (keys are written under the usual prefixes; use a scratch database)
+
+Run from the gateway directory:
+    python -m benchmarks.shadow --fake
+"""
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import Any, Dict, List
+
+from config import settings
+from redis_client import RedisClient
+from rate_limiter import TokenBucketRateLimiter
+
+PATHS = ["/api/data", "/api/users"]
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Shadow mode overhead benchmark")
+    parser.add_argument("--fake", action="store_true", help="use an in-memory fake Redis")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+def candidate_config() -> Dict[str, Any]:
+    """The default config with every limit halved"""
+    config = settings.DEFAULT_RATE_LIMITS
+    return {
+        **config,
+        "default_requests_per_minute": max(1, config["default_requests_per_minute"] // 2),
+        "endpoints": {
+            route: {
+                method: {**limit, "requests_per_minute": max(1, limit["requests_per_minute"] // 2),
+                         "burst_size": max(1, limit["burst_size"] // 2)}
+                for method, limit in methods.items()
+            }
+            for route, methods in config["endpoints"].items()
+        }
+    }
+
+async def connect(fake: bool) -> RedisClient:
+    client = RedisClient()
+    if fake:
+        import fakeredis
+        client.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+        await client.load_scripts()
+        client.connected = True
+    else:
+        await client.connect()
+    return client
+
+async def drive(limiter: TokenBucketRateLimiter, args: argparse.Namespace, run: int) -> Dict[str, float]:
+    """Send the workload through admit(); per-call latencies and throughput"""
+    rng = random.Random(args.seed)
+    plan = [(f"shadow-bench-{run}-{rng.randrange(args.users)}", rng.choice(PATHS),
+             "POST" if rng.random() < 0.2 else "GET") for _ in range(args.requests)]
+    latencies: List[float] = []
+
+    async def client(offset: int):
+        for user_id, path, method in plan[offset::args.concurrency]:
+            start = time.perf_counter()
+            await limiter.admit(user_id, path, method)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(offset) for offset in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": len(latencies) / elapsed,
+        "mean": statistics.fmean(latencies) * 1000,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "max": latencies[-1] * 1000
+    }
+
+def observe_cost(limiter: TokenBucketRateLimiter, count: int = 100000) -> float:
+    """Nanoseconds per observe() call (queue drained between rounds so none are dropped)"""
+    shadow = limiter.shadow
+    batch = min(count, shadow.queue.maxsize)
+    total = 0.0
+    for _ in range(count // batch):
+        start = time.perf_counter()
+        for _ in range(batch):
+            shadow.observe("user", "/api/data", "GET", True)
+        total += time.perf_counter() - start
+        while not shadow.queue.empty():
+            shadow.queue.get_nowait()
+    return total / (batch * (count // batch)) * 1e9
+
+async def main():
+    args = parse_args()
+    client = await connect(args.fake)
+    limiter = TokenBucketRateLimiter(client)
+    shadow = limiter.shadow
+    await limiter.stats_recorder.start()
+    try:
+        results = {"off": await drive(limiter, args, 0)}
+
+        shadow.apply({"id": "bench", "started_at": time.time(), "config": candidate_config()})
+        ns_per_observe = observe_cost(limiter)
+        results["queued"] = await drive(limiter, args, 1)
+        while not shadow.queue.empty():
+            shadow.queue.get_nowait()
+        shadow.dropped = 0
+        shadow.pending_dropped.clear()
+
+        await shadow.start()
+        results["on"] = await drive(limiter, args, 2)
+        backlog = shadow.queue.qsize()
+        # Let the workers catch up so the report covers the whole run
+        while not shadow.queue.empty():
+            await asyncio.sleep(0.1)
+        await shadow.stop()
+        report = await shadow.report()
+
+        print(f"{args.requests} admissions, {args.concurrency} concurrent clients, {args.users} users, "
+              f"{'fake' if args.fake else 'real'} Redis; observe() {ns_per_observe:.0f} ns/op\n")
+        print(f"{'':<8} {'req/s':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        off = results["off"]
+        for label, result in results.items():
+            change = "" if label == "off" else \
+                f"  p50 {result['p50'] - off['p50']:+.3f} ms, throughput {result['throughput'] / off['throughput'] - 1:+.1%}"
+            print(f"{label:<8} {result['throughput']:>9.0f} {result['mean']:>9.3f} {result['p50']:>9.3f} "
+                  f"{result['p99']:>9.3f} {result['max']:>9.3f}{change}")
+        totals = report["totals"]
+        print(f"\nshadow: {totals['evaluated']} evaluated, {totals['would_block']} would block, "
+              f"{totals['would_allow']} would allow, {totals['dropped']} dropped, "
+              f"{backlog} still queued when the live requests finished")
+    finally:
+        await shadow.stop()
+        await limiter.stats_recorder.stop()
+        await client.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
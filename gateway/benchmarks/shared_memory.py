@@ -0,0 +1,98 @@
+"""Benchmark: aggregate admissions/sec of the shared-memory backend vs Redis, across worker processes.
+
+Each worker is a separate process, like a uvicorn worker, admitting requests
+for a pool of keys as fast as it can (Redis workers keep CONCURRENCY requests
+in flight). The Redis backend is skipped when the Redis in config.Settings is
+unreachable. Run from the gateway directory:
+    python -m benchmarks.shared_memory
+"""
+import os
+import time
+import random
+import asyncio
+import tempfile
+import multiprocessing as mp
+
+from config import settings
+from redis_client import RedisClient
+from engines import TokenBucketEngine
+from shared_memory_limiter import SharedMemoryRateLimiter
+
+WORKER_COUNTS = [1, 2, 4, 8, 16, 32]
+OPERATIONS_PER_WORKER = 5000
+KEYS = 10000
+CONCURRENCY = 20
+PATH = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "gateway-limiter-bench")
+
+def keys_for(worker: int):
+    rng = random.Random(worker)
+    return [f"bucket:{{user{rng.randrange(KEYS)}}}:/api/data:GET" for _ in range(OPERATIONS_PER_WORKER)]
+
+def shared_worker(worker: int, start, results):
+    limiter = SharedMemoryRateLimiter(PATH, settings.SHARED_LIMITER_SLOTS, settings.SHARED_LIMITER_STRIPES)
+    keys = keys_for(worker)
+    start.wait()
+    began = time.perf_counter()
+    for key in keys:
+        limiter.consume(key, 600, 20)
+    results.put(time.perf_counter() - began)
+    limiter.close()
+
+def redis_worker(worker: int, start, results):
+    async def run():
+        client = RedisClient()
+        engine = TokenBucketEngine(client)
+        await client.connect()
+        keys = keys_for(worker)
+        start.wait()
+        began = time.perf_counter()
+
+        async def lane(lane_keys):
+            for key in lane_keys:
+                await engine.consume(key, 600, 20)
+
+        await asyncio.gather(*[lane(keys[i::CONCURRENCY]) for i in range(CONCURRENCY)])
+        results.put(time.perf_counter() - began)
+        await client.disconnect()
+
+    asyncio.run(run())
+
+def bench(target, workers: int) -> float:
+    """Aggregate admissions per second; workers start together once set up"""
+    start, results = mp.Event(), mp.Queue()
+    processes = [mp.Process(target=target, args=(i, start, results)) for i in range(workers)]
+    for process in processes:
+        process.start()
+    time.sleep(0.5 + 0.05 * workers)  # let every worker connect / map the table
+    start.set()
+    elapsed = max(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return workers * OPERATIONS_PER_WORKER / elapsed
+
+def redis_reachable() -> bool:
+    async def ping():
+        client = RedisClient()
+        try:
+            await client.connect()
+            await client.disconnect()
+            return True
+        except Exception:
+            return False
+    return asyncio.run(ping())
+
+def main():
+    use_redis = redis_reachable()
+    if not use_redis:
+        print(f"Redis at {settings.REDIS_HOST}:{settings.REDIS_PORT} unreachable: shared memory only")
+    print(f"{os.cpu_count()} CPUs; table {PATH} with {settings.SHARED_LIMITER_SLOTS} slots, "
+          f"{settings.SHARED_LIMITER_STRIPES} stripes\n")
+    print(f"{'workers':>8} {'shared memory/s':>16} {'redis/s':>10}")
+    for workers in WORKER_COUNTS:
+        shared = bench(shared_worker, workers)
+        redis_rate = f"{bench(redis_worker, workers):>10.0f}" if use_redis else f"{'-':>10}"
+        print(f"{workers:>8} {shared:>16.0f} {redis_rate}")
+    os.unlink(PATH)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import time
+from typing import Dict, Any
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+class CircuitBreaker:
+    """Three-state circuit breaker around a remote dependency.
+
+    closed: calls go through; `failure_threshold` consecutive failures open it.
+    open: calls are rejected immediately for `reset_timeout` seconds.
+    half_open: a single probe call is let through; success closes the circuit,
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.state_since = time.time()
+        self.failures = 0
+        self.probe_in_flight = False
+        # Metrics: transitions into each state, and calls short-circuited while open
+        self.transitions: Dict[str, int] = {self.CLOSED: 0, self.OPEN: 0, self.HALF_OPEN: 0}
+        self.rejected = 0
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit '{self.name}' {self.state} -> {state}")
+        self.state = state
+        self.state_since = time.time()
+        self.transitions[state] += 1
+
+    def allow_request(self) -> bool:
+        """Whether a call may be attempted now (moves open -> half_open after the timeout)"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.time() - self.state_since >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def is_available(self) -> bool:
+        """Whether calls are expected to go through, without claiming the half-open probe"""
+        if self.state == self.OPEN:
+            return time.time() - self.state_since >= self.reset_timeout
+        return self.state == self.CLOSED or not self.probe_in_flight
+
+    def record_success(self):
+        self.failures = 0
+        self.probe_in_flight = False
+        self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._transition(self.OPEN)
+
+    def release_probe(self):
+        """Give up a half-open probe without an outcome (e.g. the caller was cancelled)"""
+        self.probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state and counters for health and metrics endpoints"""
+        return {
+            "state": self.state,
+            "state_since": self.state_since,
+            "consecutive_failures": self.failures,
+            "opened_total": self.transitions[self.OPEN],
+            "half_opened_total": self.transitions[self.HALF_OPEN],
+            "closed_total": self.transitions[self.CLOSED],
+            "rejected_total": self.rejected
+        }
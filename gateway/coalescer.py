@@ -0,0 +1,73 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+
+from engines import Admission, TokenBucketEngine
+from metrics import COALESCED_BATCH_SIZE
+
+class _Batch:
+    """Requests waiting on one bucket key for the same Redis call"""
+    __slots__ = ("costs", "waiters")
+
+    def __init__(self):
+        self.costs: List[int] = []
+        self.waiters: List[asyncio.Future] = []
+
+class AdmissionCoalescer:
+    """Groups concurrent token bucket admissions for the same bucket key into one Redis call.
+
+    The first request for a key opens a batch and waits `window` seconds (0 waits
+    one event loop pass); requests for the key arriving meanwhile join it. The
+    batch is then decided by a single script that consumes for each request in
+    arrival order, so the outcome is the same as evaluating them one by one, and
+    every waiter gets its own Admission. A batch that is full or already sent is
+    never joined: later arrivals open the next one.
+    """
+
+    def __init__(self, engine: TokenBucketEngine, window: float, max_batch: int):
+        self.engine = engine
+        self.window = window
+        self.max_batch = max_batch
+        self.pending: Dict[str, _Batch] = {}
+        # Keep flush tasks referenced until they finish; the loop only holds weak references
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def consume(self, key: str, requests_per_minute: int, burst_size: int, cost: int = 1,
+                      index_key: Optional[str] = None) -> Admission:
+        """Same contract as TokenBucketEngine.consume"""
+        batch = self.pending.get(key)
+        if batch is None:
+            batch = self.pending[key] = _Batch()
+            task = asyncio.create_task(self._flush(key, batch, requests_per_minute, burst_size, index_key))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+        waiter = asyncio.get_running_loop().create_future()
+        batch.costs.append(cost)
+        batch.waiters.append(waiter)
+        if len(batch.costs) >= self.max_batch:
+            self._close(key, batch)
+        return await waiter
+
+    def _close(self, key: str, batch: _Batch):
+        if self.pending.get(key) is batch:
+            del self.pending[key]
+
+    async def _flush(self, key: str, batch: _Batch, requests_per_minute: int, burst_size: int,
+                     index_key: Optional[str]):
+        await asyncio.sleep(self.window)
+        self._close(key, batch)
+        COALESCED_BATCH_SIZE.observe(len(batch.costs))
+        try:
+            admissions = await self.engine.consume_batch(
+                key, requests_per_minute, burst_size, batch.costs, index_key
+            )
+        except Exception as e:
+            # Each waiter handles the failure like its own Redis error (fail open)
+            for waiter in batch.waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+        for waiter, admission in zip(batch.waiters, admissions):
+            # A waiter cancelled by a client disconnect has still spent its tokens
+            if not waiter.done():
+                waiter.set_result(admission)
@@ -0,0 +1,135 @@
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# Take a slot in every lease set, or in none of them.
+# KEYS = lease sets (sorted sets of lease id -> expiry time)
+# ARGV = now, expiry (unix seconds), ttl (milliseconds), lease id, then the cap of each set
+# Returns {1, 0} when the lease was taken, else {0, position of the first full set}
+CONCURRENCY_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+
+for i, key in ipairs(KEYS) do
+    -- Leases of requests whose worker died without releasing them
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+    if redis.call('ZCARD', key) >= tonumber(ARGV[4 + i]) then
+        return {0, i}
+    end
+end
+
+for _, key in ipairs(KEYS) do
+    redis.call('ZADD', key, ARGV[2], ARGV[4])
+    redis.call('PEXPIRE', key, ARGV[3])
+end
+return {1, 0}
+"""
+
+class Lease(NamedTuple):
+    """Slots held by one request until it completes"""
+    keys: Tuple[str, ...]
+    lease_id: str
+    local: bool  # taken from this process's counters while Redis was unavailable
+
+class ConcurrencyLimiter:
+    """Caps requests in flight, with one Redis sorted set of leases per capped scope.
+
+    A request takes a slot in every set that applies to it (all-or-nothing, in
+    one script) and gives them back when it finishes. Each lease expires
+    `lease_ttl` seconds after it was last renewed: a background task pushes the
+    expiry of every lease this process holds forward every third of the TTL,
+    so long-running requests (streamed or slow upstream responses) keep
+    counting while a crashed worker's slots still free up on their own.
+
+    While the Redis circuit is open, slots are counted per process instead.
+    """
+
+    name = "concurrency_acquire"
+
+    def __init__(self, redis_client: RedisClient, lease_ttl: float):
+        self.redis = redis_client
+        self.lease_ttl = lease_ttl
+        self.redis.register_script(self.name, CONCURRENCY_ACQUIRE_SCRIPT)
+        self.local: Dict[str, int] = {}
+        self.held: Dict[str, Lease] = {}  # Redis leases of requests still running, by lease id
+        self._renewer: Optional[asyncio.Task] = None
+
+    async def acquire(self, caps: List[Tuple[str, int]]) -> Optional[Lease]:
+        """Take a slot under each (lease set key, cap); None if any of them is full"""
+        keys = tuple(key for key, _ in caps)
+        if not self.redis.available():
+            return self._acquire_local(caps)
+
+        lease_id = uuid.uuid4().hex
+        now = time.time()
+        result = await self.redis.evalsha(
+            self.name, list(keys),
+            [now, now + self.lease_ttl, int(self.lease_ttl * 1000), lease_id, *(cap for _, cap in caps)]
+        )
+        if result is None:
+            raise RuntimeError(f"Concurrency script failed for {keys[0]}")
+
+        acquired, _ = result
+        if not int(acquired):
+            return None
+        lease = Lease(keys, lease_id, False)
+        self.held[lease_id] = lease
+        if self._renewer is None:
+            self._renewer = asyncio.create_task(self._run_renewal())
+        return lease
+
+    def _acquire_local(self, caps: List[Tuple[str, int]]) -> Optional[Lease]:
+        local = self.local
+        if any(local.get(key, 0) >= cap for key, cap in caps):
+            return None
+        for key, _ in caps:
+            local[key] = local.get(key, 0) + 1
+        return Lease(tuple(key for key, _ in caps), "", True)
+
+    async def release(self, lease: Lease):
+        """Give back a lease's slots (errors are logged: the lease then expires on its own)"""
+        if lease.local:
+            for key in lease.keys:
+                count = self.local.get(key, 0) - 1
+                if count > 0:
+                    self.local[key] = count
+                else:
+                    self.local.pop(key, None)
+            return
+        self.held.pop(lease.lease_id, None)
+        await self.redis.zrem_many(list(lease.keys), lease.lease_id)
+
+    async def renew(self):
+        """Push the expiry of every held lease a full TTL ahead, in one round trip"""
+        members: Dict[str, List[str]] = {}
+        for lease in list(self.held.values()):
+            for key in lease.keys:
+                members.setdefault(key, []).append(lease.lease_id)
+        if members:
+            # XX: a lease released meanwhile is not brought back
+            await self.redis.zadd_existing_many(members, time.time() + self.lease_ttl, int(self.lease_ttl * 1000))
+
+    async def _run_renewal(self):
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            if not self.held or not self.redis.available():
+                continue
+            try:
+                await self.renew()
+            except Exception as e:
+                logger.error(f"Error renewing concurrency leases: {e}")
+
+    async def stop(self):
+        """Stop renewing leases (on shutdown; unreleased ones then expire on their own)"""
+        if self._renewer is not None:
+            self._renewer.cancel()
+            try:
+                await self._renewer
+            except asyncio.CancelledError:
+                pass
+            self._renewer = None
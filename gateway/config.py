@@ -1,4 +1,5 @@
 import os
+import json
 from typing import Dict, Any
 
 class Settings:
@@ -8,10 +9,34 @@ class Settings:
     REDIS_DB = int(os.getenv("REDIS_DB", 0))
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
     
+    # Connection pool and timeouts: a slow Redis must fail fast rather than stall every request
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_POOL_TIMEOUT_MS = int(os.getenv("REDIS_POOL_TIMEOUT_MS", 100))  # wait for a free pooled connection
+    REDIS_CONNECT_TIMEOUT_MS = int(os.getenv("REDIS_CONNECT_TIMEOUT_MS", 200))
+    REDIS_SOCKET_TIMEOUT_MS = int(os.getenv("REDIS_SOCKET_TIMEOUT_MS", 100))  # per command
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))  # seconds idle before a PING
+    
+    # Circuit breaker: after N consecutive connection failures/timeouts, stop calling Redis and
+    # admit from the in-memory fallback limiter; probe again after the reset timeout
+    REDIS_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("REDIS_CIRCUIT_FAILURE_THRESHOLD", 5))
+    REDIS_CIRCUIT_RESET_TIMEOUT_MS = int(os.getenv("REDIS_CIRCUIT_RESET_TIMEOUT_MS", 5000))
+    FALLBACK_MAX_BUCKETS = int(os.getenv("FALLBACK_MAX_BUCKETS", 10000))
+    
+    # Redis Cluster: user keys are hash-tagged ({user_id}) so a user's buckets and stats share a slot
+    REDIS_CLUSTER_ENABLED = os.getenv("REDIS_CLUSTER_ENABLED", "false").lower() == "true"
+    REDIS_CLUSTER_NODES = os.getenv("REDIS_CLUSTER_NODES", f"{REDIS_HOST}:{REDIS_PORT}")  # host:port,host:port
+    
+    # Serve admin statistics reads from replicas (cluster replicas, or a single-node replica)
+    REDIS_READ_FROM_REPLICAS = os.getenv("REDIS_READ_FROM_REPLICAS", "false").lower() == "true"
+    REDIS_REPLICA_HOST = os.getenv("REDIS_REPLICA_HOST", None)
+    REDIS_REPLICA_PORT = int(os.getenv("REDIS_REPLICA_PORT", 6379))
+    
     # JWT configuration
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-this-in-production")
     JWT_ALGORITHM = "HS256"
     JWT_EXPIRATION_HOURS = 24
+    JWT_CACHE_MAX_ENTRIES = int(os.getenv("JWT_CACHE_MAX_ENTRIES", 10000))  # verified tokens kept in memory
+    JWT_CACHE_TTL_SECONDS = int(os.getenv("JWT_CACHE_TTL_SECONDS", 300))  # upper bound; never past the token's exp
     
     # Admin credentials (in production, use proper user management)
     ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
@@ -21,6 +46,8 @@ class Settings:
     DEFAULT_RATE_LIMITS: Dict[str, Any] = {
         "default_requests_per_minute": 60,
         "default_burst_size": 10,
+        # token_bucket | gcra | sliding_window_counter | sliding_window_log (per endpoint/method via "algorithm")
+        "default_algorithm": "token_bucket",
         "endpoints": {
             "/api/users": {
                 "GET": {"requests_per_minute": 100, "burst_size": 20},
@@ -40,13 +67,83 @@ class Settings:
         }
     }
     
+    # Live configuration propagation
+    CONFIG_KEY = "rate_limit_config"
+    CONFIG_VERSION_KEY = "{rate_limit_config}:version"  # hash tag keeps it in the config key's slot
+    CONFIG_CHANNEL = "config_update"
+    CONFIG_POLL_INTERVAL_MS = int(os.getenv("CONFIG_POLL_INTERVAL_MS", 5000))  # fallback if pub/sub drops
+
+    # Shadow mode: a candidate config evaluated on live traffic without affecting admission
+    SHADOW_CONFIG_KEY = "{rate_limit_config}:shadow"
+    SHADOW_VERSION_KEY = "{rate_limit_config}:shadow:version"  # bumped on every start/stop
+    SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", 10000))  # requests waiting; more are dropped
+    SHADOW_WORKERS = int(os.getenv("SHADOW_WORKERS", 4))
+    SHADOW_FLUSH_INTERVAL_MS = int(os.getenv("SHADOW_FLUSH_INTERVAL_MS", 1000))
+    SHADOW_REPORT_TTL_SECONDS = int(os.getenv("SHADOW_REPORT_TTL_SECONDS", 86400))
+    SHADOW_TOP_USERS = int(os.getenv("SHADOW_TOP_USERS", 1000))  # users kept per difference
+
     # Rate limiter settings
     TOKEN_BUCKET_REFILL_RATE = 1.0  # tokens per second
     TOKEN_BUCKET_MAX_TOKENS = 100
+    ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", 10000))  # memoized (path, method) lookups
+    # Token bucket storage in Redis: "hash" (decimal string fields) or "packed" (one 12-byte binary
+    # string per bucket; see benchmarks/memory.py). Switching encodings starts from full buckets
+    BUCKET_ENCODING = os.getenv("BUCKET_ENCODING", "hash")
+    
+    # Statistics settings (counters are buffered in memory and flushed in batches)
+    STATS_FLUSH_INTERVAL_MS = int(os.getenv("STATS_FLUSH_INTERVAL_MS", 1000))
+    STATS_FLUSH_MAX_PENDING = int(os.getenv("STATS_FLUSH_MAX_PENDING", 5000))
+    # Counters kept in memory across failed flushes; past this the oldest minutes are dropped
+    STATS_MAX_RETAINED = int(os.getenv("STATS_MAX_RETAINED", 100000))
+    STATS_TTL_SECONDS = 3600  # per-minute counters; longer windows are read from hourly rollups
+    STATS_ROLLUP_TTL_SECONDS = int(os.getenv("STATS_ROLLUP_TTL_SECONDS", 7 * 86400))
+    STATS_TOP_SIZE = int(os.getenv("STATS_TOP_SIZE", 10))  # users/endpoints listed by get_stats
+    # Sketch mode: per-user counts in a fixed-size Count-Min Sketch and Space-Saving top-K instead of
+    # per-user keys. Estimates overshoot by at most e/WIDTH of the window's requests with probability
+    # 1 - e^-DEPTH; each sketch is WIDTH x DEPTH x 4 bytes in Redis (see benchmarks/heavy_hitters.py)
+    STATS_SKETCH_ENABLED = os.getenv("STATS_SKETCH_ENABLED", "false").lower() == "true"
+    STATS_SKETCH_WIDTH = int(os.getenv("STATS_SKETCH_WIDTH", 2048))
+    STATS_SKETCH_DEPTH = int(os.getenv("STATS_SKETCH_DEPTH", 4))
+    STATS_SKETCH_TOP_K = int(os.getenv("STATS_SKETCH_TOP_K", 100))  # heavy hitters tracked per window
+    
+    # Where bucket state lives: "redis" (shared by every gateway) or "shared_memory" (one host only:
+    # a memory-mapped table shared by the workers; config and statistics still use Redis)
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "redis")
+    SHARED_LIMITER_PATH = os.getenv("SHARED_LIMITER_PATH", "/dev/shm/gateway-rate-limiter")
+    SHARED_LIMITER_SLOTS = int(os.getenv("SHARED_LIMITER_SLOTS", 65536))  # 40 bytes each
+    SHARED_LIMITER_STRIPES = int(os.getenv("SHARED_LIMITER_STRIPES", 64))  # lock stripes
+    
+    # Local-first admission: workers lease small slices of tokens from Redis
+    LOCAL_FIRST_ENABLED = os.getenv("LOCAL_FIRST_ENABLED", "false").lower() == "true"
+    LOCAL_LEASE_SIZE = int(os.getenv("LOCAL_LEASE_SIZE", 5))  # max tokens borrowed per Redis trip
+    LOCAL_LEASE_TTL_MS = int(os.getenv("LOCAL_LEASE_TTL_MS", 500))  # max age of a lease before reconciling
+    LOCAL_CACHE_MAX_BUCKETS = int(os.getenv("LOCAL_CACHE_MAX_BUCKETS", 10000))
+    
+    # In-flight caps (`max_concurrent` in the rate limit config): a running request's slot is renewed
+    # every third of this; one left unreleased (crashed worker) expires this long after its last renewal
+    CONCURRENCY_LEASE_TTL_SECONDS = int(os.getenv("CONCURRENCY_LEASE_TTL_SECONDS", 60))
+    
+    # Request coalescing: concurrent token bucket admissions for the same bucket key within
+    # the window are decided by one Redis call (0 = those arriving in the same event loop pass)
+    COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "false").lower() == "true"
+    COALESCE_WINDOW_MS = float(os.getenv("COALESCE_WINDOW_MS", 0))
+    COALESCE_MAX_BATCH = int(os.getenv("COALESCE_MAX_BATCH", 100))  # requests per Redis call
+    
+    # Reverse proxy: path prefix -> upstream base URL, e.g.
+    # UPSTREAMS='{"/api/users": "http://users:8080", "/api/data": "http://data:8080"}'
+    # Unrouted paths are served by the gateway app itself
+    UPSTREAMS: Dict[str, str] = json.loads(os.getenv("UPSTREAMS", "{}"))
+    UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 100))  # per upstream
+    UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 20))  # idle connections kept per upstream
+    UPSTREAM_CONNECT_TIMEOUT_MS = int(os.getenv("UPSTREAM_CONNECT_TIMEOUT_MS", 1000))
+    UPSTREAM_READ_TIMEOUT_MS = int(os.getenv("UPSTREAM_READ_TIMEOUT_MS", 30000))  # between bytes, not total
+    UPSTREAM_POOL_TIMEOUT_MS = int(os.getenv("UPSTREAM_POOL_TIMEOUT_MS", 1000))  # wait for a pooled connection
+    UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", 2))  # extra attempts for GET/HEAD/OPTIONS/DELETE
     
     # Gateway settings
     GATEWAY_HOST = os.getenv("GATEWAY_HOST", "0.0.0.0")
     GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", 8000))
+    EXAMPLE_API_DELAY_MS = int(os.getenv("EXAMPLE_API_DELAY_MS", 100))  # simulated backend work in the /api examples
     
     # Admin API settings
     ADMIN_API_URL = os.getenv("ADMIN_API_URL", "http://localhost:3001")
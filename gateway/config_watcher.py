@@ -0,0 +1,155 @@
+import json
+import time
+import uuid
+import asyncio
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+from config import settings
+from redis_client import RedisClient
+from rate_limiter import TokenBucketRateLimiter
+from route_resolver import RouteResolver
+
+logger = logging.getLogger(__name__)
+
+class ConfigWatcher:
+    """Keeps the limiter's config in sync with Redis across workers and nodes.
+
+    Writers store the config and INCR a version key in one transaction, then
+    publish on the config channel. Each worker listens on the channel and, on
+    any message, reads the version key and fetches the config only if that
+    version is newer than the one it has. The version key is also polled
+    every CONFIG_POLL_INTERVAL_MS, so a missed message or a dropped
+    subscription only delays an update, and an idle poll reads two integers.
+    Nothing here runs on the request path.
+
+    A shadow run (a candidate config evaluated alongside the live one) is
+    stored under SHADOW_CONFIG_KEY with its own SHADOW_VERSION_KEY, polled in
+    the same round trip.
+    """
+
+    def __init__(self, redis_client: RedisClient, rate_limiter: TokenBucketRateLimiter):
+        self.redis = redis_client
+        self.rate_limiter = rate_limiter
+        self.poll_interval = settings.CONFIG_POLL_INTERVAL_MS / 1000.0
+        # Highest versions fetched so far (applied or rejected), so neither is fetched twice
+        self.config_seen: Optional[int] = None
+        self.shadow_seen: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, config: Dict[str, Any]) -> Optional[int]:
+        """Store a new config, bump its version and notify every gateway"""
+        # Compile once up front so a malformed config is rejected before it is stored
+        RouteResolver(config)
+
+        version = await self.redis.set_json_versioned(settings.CONFIG_KEY, settings.CONFIG_VERSION_KEY, config)
+        if version is not None:
+            self.config_seen = version
+            await self.redis.publish(
+                settings.CONFIG_CHANNEL,
+                json.dumps({"type": "rate_limit_config", "version": version})
+            )
+            await self.rate_limiter.update_config(config, version)
+        return version
+
+    async def publish_shadow(self, config: Optional[Dict[str, Any]]) -> Tuple[Optional[int], Optional[Dict[str, Any]]]:
+        """Start shadow evaluation of a candidate config on every gateway, or stop it (None).
+
+        Returns the new shadow version (None if it could not be stored, in which
+        case nothing is announced or applied) and the run started, if any.
+        """
+        run = None
+        if config is not None:
+            RouteResolver(config)
+            run = {"id": uuid.uuid4().hex[:12], "started_at": time.time(), "config": config}
+        version = await self.redis.set_json_versioned(settings.SHADOW_CONFIG_KEY, settings.SHADOW_VERSION_KEY, run)
+        if version is not None:
+            self.shadow_seen = version
+            await self.redis.publish(
+                settings.CONFIG_CHANNEL,
+                json.dumps({"type": "shadow_config", "id": run["id"] if run else None})
+            )
+            self.rate_limiter.shadow.apply(run)
+        return version, run
+
+    @staticmethod
+    def _is_newer(version: int, seen: Optional[int]) -> bool:
+        # Versions only grow (INCR), so a failed read (0) never looks like a change
+        return seen is None or version > seen
+
+    async def reload(self):
+        """Poll the version keys; fetch and apply the config or shadow run only when its version is newer"""
+        version_str, shadow_version_str = await self.redis.mget(
+            [settings.CONFIG_VERSION_KEY, settings.SHADOW_VERSION_KEY]
+        )
+        shadow_version = int(shadow_version_str or 0)
+        if self._is_newer(shadow_version, self.shadow_seen):
+            await self._reload_shadow(shadow_version)
+
+        version = int(version_str or 0)
+        if self._is_newer(version, self.config_seen) and self._is_newer(version, self.rate_limiter.config_version):
+            await self._reload_config(version)
+
+    async def _reload_config(self, version: int):
+        config_str = await self.redis.get(settings.CONFIG_KEY)
+        self.config_seen = version
+        if not config_str:
+            return
+
+        try:
+            await self.rate_limiter.update_config(json.loads(config_str), version)
+            logger.info(f"Applied rate limit config version {version}")
+        except Exception as e:
+            logger.error(f"Rejected rate limit config version {version}: {e}")
+
+    async def _reload_shadow(self, version: int):
+        """Switch to the stored shadow run if it is not the one we are evaluating"""
+        shadow_str = await self.redis.get(settings.SHADOW_CONFIG_KEY)
+        self.shadow_seen = version
+        shadow = self.rate_limiter.shadow
+        try:
+            run = json.loads(shadow_str) if shadow_str else None
+            if (run["id"] if run else None) != shadow.run_id:
+                shadow.apply(run)
+        except Exception as e:
+            logger.error(f"Rejected shadow config: {e}")
+
+    async def _run(self):
+        """Listen for change notifications, polling the version key between them"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(settings.CONFIG_CHANNEL)
+                # Catch up on anything published while we were not subscribed
+                await self.reload()
+                while True:
+                    await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.poll_interval)
+                    await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Config subscription error, retrying: {e}")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def start(self):
+        """Load the current config and start watching for changes"""
+        await self.reload()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Config watcher started")
+
+    async def stop(self):
+        """Stop watching for changes"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Config watcher stopped")
@@ -0,0 +1,833 @@
+import time
+import uuid
+from typing import Callable, Dict, Any, List, NamedTuple, Optional, Tuple, Type
+import logging
+
+from config import settings
+from redis_client import RedisClient
+
+logger = logging.getLogger(__name__)
+
+# Longest TTL an indexed key is given: buckets expire after an hour without
+# requests, and GCRA keys (which expire when their debt is repaid) are capped to it
+BUCKET_TTL = 3600
+
+# Every admission script can keep a per-user index set of bucket keys (passed as
+# an extra key) so admin views never need KEYS or SCAN. The set is written only
+# when a bucket is created or the index is due for a TTL refresh; a steady-state
+# admission pays a single TTL read. The index is kept for twice BUCKET_TTL and
+# refreshed once less than BUCKET_TTL is left, so it outlives every bucket it lists.
+INDEX_TTL = 2 * BUCKET_TTL
+INDEX_HELPER = """
+local function touch_index(index_key, bucket_key, is_new)
+    if index_key and (is_new or redis.call('TTL', index_key) < %d) then
+        redis.call('SADD', index_key, bucket_key)
+        redis.call('EXPIRE', index_key, %d)
+    end
+end
+""" % (BUCKET_TTL, INDEX_TTL)
+
+# Every admission script also reports, from the state it already read, how long a
+# denied request must wait (retry) and how long until the full budget is back (reset),
+# in seconds. The sliding windows need their stored counts or log entries for that.
+WINDOW_TIMING_HELPER = """
+local function counter_timing(limit, window, now, current_window, curr, prev, cost, allowed)
+    local retry = 0
+    if not allowed then
+        local elapsed = (now - current_window * window) / window
+        local window_left = (current_window + 1) * window - now
+        if prev > 0 and curr + cost <= limit then
+            -- the previous window's weight decays enough before this window ends
+            retry = (1 - (limit - curr - cost) / prev - elapsed) * window
+        elseif cost <= limit then
+            -- this window's count must decay as the next window's previous count
+            retry = window_left + math.max(0, 1 - (limit - cost) / curr) * window
+        else
+            retry = window_left + window
+        end
+        retry = math.max(0, retry)
+    end
+    local reset = 0
+    if curr > 0 then
+        reset = (current_window + 2) * window - now
+    elseif prev > 0 then
+        reset = (current_window + 1) * window - now
+    end
+    return retry, reset
+end
+
+local function log_timing(key, limit, window, now, count, cost, allowed)
+    local retry = 0
+    if not allowed then
+        -- the oldest (count + cost - limit) entries have to leave the window first
+        local need = count + cost - limit
+        if need <= count then
+            local entry = redis.call('ZRANGE', key, need - 1, need - 1, 'WITHSCORES')
+            retry = math.max(0, tonumber(entry[2]) + window - now)
+        else
+            retry = window
+        end
+    end
+    local reset = 0
+    if allowed then
+        reset = window
+    elseif count > 0 then
+        local newest = redis.call('ZRANGE', key, -1, -1, 'WITHSCORES')
+        reset = math.max(0, tonumber(newest[2]) + window - now)
+    end
+    return retry, reset
+end
+"""
+
+# Token bucket state is read and written through read_bucket / write_bucket, defined
+# per storage encoding (settings.BUCKET_ENCODING) and prepended to every script that
+# touches buckets. read_bucket returns nil, nil for a missing bucket.
+#
+# hash: a Redis hash with decimal string fields `tokens` and `last_refill`.
+HASH_BUCKET_IO = """
+local function read_bucket(key)
+    local bucket = redis.call('HMGET', key, 'tokens', 'last_refill')
+    return tonumber(bucket[1]), tonumber(bucket[2])
+end
+
+local function write_bucket(key, tokens, last_refill, ttl)
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'last_refill', string.format('%.6f', last_refill))
+    redis.call('EXPIRE', key, ttl)
+end
+"""
+
+# packed: one 12-byte string, two big-endian unsigned 48-bit integers: tokens in
+# thousandths and the last refill in unix milliseconds. Both are rounded in the
+# limiter's favour (tokens down, refill time up), so packing never admits more.
+# The layout is what BITFIELD GET u48 #0 / #1 reads, which is how admin views decode it.
+PACKED_BUCKET_IO = """
+local function pack48(n)
+    local bytes = {}
+    for i = 6, 1, -1 do
+        bytes[i] = n % 256
+        n = math.floor(n / 256)
+    end
+    return string.char(unpack(bytes))
+end
+
+local function unpack48(packed, offset)
+    local n = 0
+    for i = offset, offset + 5 do
+        n = n * 256 + string.byte(packed, i)
+    end
+    return n
+end
+
+local function read_bucket(key)
+    local packed = redis.call('GET', key)
+    if not packed or string.len(packed) ~= 12 then
+        return nil, nil
+    end
+    return unpack48(packed, 1) / 1000, unpack48(packed, 7) / 1000
+end
+
+local function write_bucket(key, tokens, last_refill, ttl)
+    local packed = pack48(math.floor(tokens * 1000)) .. pack48(math.ceil(last_refill * 1000))
+    redis.call('SET', key, packed, 'EX', ttl)
+end
+"""
+
+BUCKET_IO = {"hash": HASH_BUCKET_IO, "packed": PACKED_BUCKET_IO}
+# Packed buckets get their own key suffix, so switching encodings never reads the other type
+PACKED_KEY_SUFFIX = ":tbp"
+
+# Refill, consume and TTL refresh for one bucket in a single atomic round trip.
+# KEYS[1] = bucket key, KEYS[2] = optional user index
+# ARGV = max_tokens, refill_rate (tokens/sec), now (unix seconds), cost, ttl (seconds)
+# Returns {allowed (0/1), remaining tokens, retry after, reset} as strings so fractions survive the reply
+TOKEN_BUCKET_SCRIPT = INDEX_HELPER + """
+local max_tokens = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local ttl = tonumber(ARGV[5])
+
+local tokens, last_refill = read_bucket(KEYS[1])
+local is_new = tokens == nil or last_refill == nil
+if is_new then
+    tokens = max_tokens
+    last_refill = now
+end
+
+-- Never move the refill clock backwards if gateway clocks disagree slightly
+if now > last_refill then
+    tokens = math.min(max_tokens, tokens + (now - last_refill) * refill_rate)
+    last_refill = now
+end
+
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+
+write_bucket(KEYS[1], tokens, last_refill, ttl)
+touch_index(KEYS[2], KEYS[1], is_new)
+
+local retry = 0
+if allowed == 0 then
+    retry = (cost - tokens) / refill_rate
+end
+return {allowed, tostring(tokens), tostring(retry), tostring((max_tokens - tokens) / refill_rate)}
+"""
+
+# Lease up to max_take whole tokens from a bucket for local admission, after
+# crediting back the unused part of the previous lease, in one round trip.
+# KEYS[1] = bucket key, KEYS[2] = optional user index
+# ARGV = max_tokens, refill_rate (tokens/sec), now (unix seconds), refund, max_take, ttl (seconds)
+# Returns {granted, remaining tokens as a string}
+TOKEN_LEASE_SCRIPT = INDEX_HELPER + """
+local max_tokens = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local max_take = tonumber(ARGV[5])
+local ttl = tonumber(ARGV[6])
+
+local tokens, last_refill = read_bucket(KEYS[1])
+local is_new = tokens == nil or last_refill == nil
+if is_new then
+    tokens = max_tokens
+    last_refill = now
+end
+
+if now > last_refill then
+    tokens = math.min(max_tokens, tokens + (now - last_refill) * refill_rate)
+    last_refill = now
+end
+tokens = math.min(max_tokens, tokens + refund)
+
+local granted = math.max(0, math.min(math.floor(tokens), max_take))
+tokens = tokens - granted
+
+write_bucket(KEYS[1], tokens, last_refill, ttl)
+touch_index(KEYS[2], KEYS[1], is_new)
+return {granted, tostring(tokens)}
+"""
+
+# Decide a batch of coalesced requests for one bucket in arrival order, exactly as
+# if each had run TOKEN_BUCKET_SCRIPT in turn, with one refill and one write.
+# KEYS[1] = bucket key, KEYS[2] = optional user index
+# ARGV = max_tokens, refill_rate (tokens/sec), now (unix seconds), ttl (seconds), cost of each request...
+# Returns {granted count, allowed flag per request, tokens left after each request as strings}
+TOKEN_BATCH_SCRIPT = INDEX_HELPER + """
+local max_tokens = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+
+local tokens, last_refill = read_bucket(KEYS[1])
+local is_new = tokens == nil or last_refill == nil
+if is_new then
+    tokens = max_tokens
+    last_refill = now
+end
+
+if now > last_refill then
+    tokens = math.min(max_tokens, tokens + (now - last_refill) * refill_rate)
+    last_refill = now
+end
+
+local granted = 0
+local flags = {}
+local remaining = {}
+for i = 5, #ARGV do
+    local cost = tonumber(ARGV[i])
+    local allowed = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+        allowed = 1
+        granted = granted + 1
+    end
+    flags[#flags + 1] = allowed
+    remaining[#remaining + 1] = tostring(tokens)
+end
+
+write_bucket(KEYS[1], tokens, last_refill, ttl)
+touch_index(KEYS[2], KEYS[1], is_new)
+return {granted, flags, remaining}
+"""
+
+# Generic cell rate algorithm: the whole state is one theoretical arrival time (TAT).
+# Admits bursts of up to burst_size and then one request per emission interval.
+# KEYS[1] = key, KEYS[2] = optional user index
+# ARGV = emission_interval (sec/request), burst_size, now (unix seconds), cost, max key ttl (seconds)
+# Returns {allowed (0/1), remaining requests, retry after, reset} as strings
+GCRA_SCRIPT = INDEX_HELPER + """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local max_ttl = tonumber(ARGV[5])
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+local is_new = tat == nil
+if is_new or tat < now then
+    tat = now
+end
+
+local new_tat = tat + cost * interval
+local allow_at = new_tat - burst * interval
+if now < allow_at then
+    return {0, tostring(math.max(0, (now - (tat - burst * interval)) / interval)),
+            tostring(allow_at - now), tostring(tat - now)}
+end
+
+redis.call('SET', KEYS[1], string.format('%.6f', new_tat), 'PX', math.ceil(math.min(new_tat - now, max_ttl) * 1000))
+touch_index(KEYS[2], KEYS[1], is_new)
+return {1, tostring((now - allow_at) / interval), '0', tostring(new_tat - now)}
+"""
+
+# Sliding window approximated from the current and previous fixed window counts.
+# State is one small hash: window id, current count, previous count.
+# KEYS[1] = key, KEYS[2] = optional user index
+# ARGV = limit, window (seconds), now (unix seconds), cost
+# Returns {allowed (0/1), remaining requests, retry after, reset} as strings
+SLIDING_WINDOW_COUNTER_SCRIPT = INDEX_HELPER + WINDOW_TIMING_HELPER + """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+
+local current_window = math.floor(now / window)
+local state = redis.call('HMGET', KEYS[1], 'win', 'curr', 'prev')
+local stored_window = tonumber(state[1])
+local curr = tonumber(state[2]) or 0
+local prev = tonumber(state[3]) or 0
+
+if stored_window == nil or stored_window < current_window - 1 then
+    prev = 0
+    curr = 0
+elseif stored_window == current_window - 1 then
+    prev = curr
+    curr = 0
+end
+
+local elapsed = (now - current_window * window) / window
+local count = prev * (1 - elapsed) + curr
+if count + cost > limit then
+    local retry, reset = counter_timing(limit, window, now, current_window, curr, prev, cost, false)
+    return {0, tostring(math.max(0, limit - count)), tostring(retry), tostring(reset)}
+end
+
+curr = curr + cost
+redis.call('HSET', KEYS[1], 'win', current_window, 'curr', curr, 'prev', prev)
+redis.call('EXPIRE', KEYS[1], window * 2)
+touch_index(KEYS[2], KEYS[1], stored_window == nil)
+local retry, reset = counter_timing(limit, window, now, current_window, curr, prev, cost, true)
+return {1, tostring(limit - count - cost), tostring(retry), tostring(reset)}
+"""
+
+# Exact sliding window: one sorted set member per admitted request.
+# KEYS[1] = key, KEYS[2] = optional user index
+# ARGV = limit, window (seconds), now (unix seconds), cost, member id prefix
+# Returns {allowed (0/1), remaining requests, retry after, reset} as strings
+SLIDING_WINDOW_LOG_SCRIPT = INDEX_HELPER + WINDOW_TIMING_HELPER + """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local member = ARGV[5]
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count + cost > limit then
+    local retry, reset = log_timing(KEYS[1], limit, window, now, count, cost, false)
+    return {0, tostring(math.max(0, limit - count)), tostring(retry), tostring(reset)}
+end
+
+for i = 1, cost do
+    redis.call('ZADD', KEYS[1], now, member .. ':' .. i)
+end
+redis.call('EXPIRE', KEYS[1], math.ceil(window))
+touch_index(KEYS[2], KEYS[1], count == 0)
+local retry, reset = log_timing(KEYS[1], limit, window, now, count, cost, true)
+return {1, tostring(limit - count - cost), tostring(retry), tostring(reset)}
+"""
+
+# Evaluate several limits (any mix of engines) and consume from all of them only
+# if every one admits. Nothing is written when any limit rejects.
+# KEYS = one key per limit, then an optional user index
+# ARGV = now, bucket ttl, then per limit: algorithm, requests_per_minute (per window for the
+#        window algorithms), burst_size, cost, member id, indexed (0/1), window (seconds)
+# Returns {allowed (0/1), {allowed per limit}, and per limit as strings: {remaining}, {retry after}, {reset}}
+MULTI_LIMIT_SCRIPT = INDEX_HELPER + WINDOW_TIMING_HELPER + """
+local now = tonumber(ARGV[1])
+local bucket_ttl = tonumber(ARGV[2])
+local limit_count = (#ARGV - 2) / 7
+local index_key = KEYS[limit_count + 1]
+
+local all_allowed = 1
+local allowed_flags = {}
+local remaining = {}
+local retries = {}
+local resets = {}
+local writes = {}
+
+for i = 1, limit_count do
+    local key = KEYS[i]
+    local base = 2 + (i - 1) * 7
+    local algorithm = ARGV[base + 1]
+    local rate = tonumber(ARGV[base + 2])
+    local burst = tonumber(ARGV[base + 3])
+    local cost = tonumber(ARGV[base + 4])
+    local member = ARGV[base + 5]
+    local indexed = ARGV[base + 6] == '1'
+    local window = tonumber(ARGV[base + 7])
+    local ok = false
+    local left = 0
+    local retry = 0
+    local reset = 0
+    local is_new = false
+
+    if algorithm == 'token_bucket' then
+        local tokens, last_refill = read_bucket(key)
+        is_new = tokens == nil or last_refill == nil
+        if is_new then
+            tokens = burst
+            last_refill = now
+        end
+        if now > last_refill then
+            tokens = math.min(burst, tokens + (now - last_refill) * rate / 60)
+            last_refill = now
+        end
+        ok = tokens >= cost
+        left = tokens
+        if ok then
+            left = tokens - cost
+            writes[#writes + 1] = function()
+                write_bucket(key, left, last_refill, bucket_ttl)
+            end
+        else
+            retry = (cost - tokens) * 60 / rate
+        end
+        reset = (burst - left) * 60 / rate
+    elseif algorithm == 'gcra' then
+        local interval = 60 / rate
+        local tat = tonumber(redis.call('GET', key))
+        is_new = tat == nil
+        if is_new or tat < now then
+            tat = now
+        end
+        local new_tat = tat + cost * interval
+        local allow_at = new_tat - burst * interval
+        ok = now >= allow_at
+        if ok then
+            left = (now - allow_at) / interval
+            reset = new_tat - now
+            writes[#writes + 1] = function()
+                redis.call('SET', key, string.format('%.6f', new_tat), 'PX',
+                           math.ceil(math.min(new_tat - now, bucket_ttl) * 1000))
+            end
+        else
+            left = math.max(0, (now - (tat - burst * interval)) / interval)
+            retry = allow_at - now
+            reset = tat - now
+        end
+    elseif algorithm == 'sliding_window_counter' then
+        local current_window = math.floor(now / window)
+        local state = redis.call('HMGET', key, 'win', 'curr', 'prev')
+        local stored_window = tonumber(state[1])
+        local curr = tonumber(state[2]) or 0
+        local prev = tonumber(state[3]) or 0
+        is_new = stored_window == nil
+        if stored_window == nil or stored_window < current_window - 1 then
+            prev = 0
+            curr = 0
+        elseif stored_window == current_window - 1 then
+            prev = curr
+            curr = 0
+        end
+        local count = prev * (1 - (now - current_window * window) / window) + curr
+        ok = count + cost <= rate
+        left = math.max(0, rate - count)
+        if ok then
+            left = rate - count - cost
+            writes[#writes + 1] = function()
+                redis.call('HSET', key, 'win', current_window, 'curr', curr + cost, 'prev', prev)
+                redis.call('EXPIRE', key, window * 2)
+            end
+            retry, reset = counter_timing(rate, window, now, current_window, curr + cost, prev, cost, true)
+        else
+            retry, reset = counter_timing(rate, window, now, current_window, curr, prev, cost, false)
+        end
+    elseif algorithm == 'sliding_window_log' then
+        redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+        local count = redis.call('ZCARD', key)
+        is_new = count == 0
+        ok = count + cost <= rate
+        left = math.max(0, rate - count)
+        if ok then
+            left = rate - count - cost
+            writes[#writes + 1] = function()
+                for j = 1, cost do
+                    redis.call('ZADD', key, now, member .. ':' .. j)
+                end
+                redis.call('EXPIRE', key, math.ceil(window))
+            end
+        end
+        retry, reset = log_timing(key, rate, window, now, count, cost, ok)
+    else
+        return redis.error_reply('unknown algorithm ' .. tostring(algorithm))
+    end
+
+    if ok and indexed then
+        local new_bucket = is_new
+        writes[#writes + 1] = function()
+            touch_index(index_key, key, new_bucket)
+        end
+    end
+    if not ok then
+        all_allowed = 0
+    end
+    allowed_flags[i] = ok and 1 or 0
+    remaining[i] = tostring(left)
+    retries[i] = tostring(retry)
+    resets[i] = tostring(reset)
+end
+
+if all_allowed == 1 then
+    for _, write in ipairs(writes) do
+        write()
+    end
+end
+
+return {all_allowed, allowed_flags, remaining, retries, resets}
+"""
+
+# Longest wait ever reported; also what an unrefillable limit (rate 0) reports
+MAX_WAIT_SECONDS = 86400.0
+
+def _seconds(raw: Any) -> float:
+    """Parse a duration from a script reply, clamping inf/nan from zero rates"""
+    value = float(raw)
+    if value != value or value > MAX_WAIT_SECONDS:
+        return MAX_WAIT_SECONDS
+    return max(0.0, value)
+
+class Admission(NamedTuple):
+    """Outcome of one admission, with what clients need to pace themselves"""
+    allowed: bool
+    remaining: float  # requests (tokens) left after this one
+    limit: int  # size of the budget: burst for token bucket/GCRA, requests per minute for windows
+    retry_after: float  # seconds until a request of this cost can be admitted (0 if allowed)
+    reset: float  # seconds until the full budget is available again
+
+def bucket_admission(allowed: bool, tokens: float, requests_per_minute: int, burst_size: int,
+                     cost: int = 1) -> Admission:
+    """Admission for a token bucket holding `tokens` after the decision (local leases, fallback)"""
+    rate = requests_per_minute / 60.0
+    if rate <= 0:
+        return Admission(allowed, tokens, burst_size, 0.0 if allowed else MAX_WAIT_SECONDS, MAX_WAIT_SECONDS)
+    retry_after = 0.0 if allowed else max(0.0, (cost - tokens) / rate)
+    return Admission(
+        allowed, tokens, burst_size, min(retry_after, MAX_WAIT_SECONDS), min((burst_size - tokens) / rate, MAX_WAIT_SECONDS)
+    )
+
+def most_restrictive(admissions: List[Admission]) -> Admission:
+    """The admission to report for several limits: the longest wait if any denied, else the least headroom"""
+    denied = [admission for admission in admissions if not admission.allowed]
+    if denied:
+        return max(denied, key=lambda admission: admission.retry_after)
+    return min(admissions, key=lambda admission: admission.remaining)
+
+class LimitCheck(NamedTuple):
+    """One limit to evaluate in a multi-key admission"""
+    key: str
+    requests_per_minute: int
+    burst_size: int
+    algorithm: str
+    cost: int = 1
+    indexed: bool = False  # record the key in the request's user index
+    # Window algorithms only: seconds the limit spans (0 = a minute); requests_per_minute is
+    # then the requests allowed per window (e.g. a daily quota)
+    window: int = 0
+
+def refill_per_minute(check: LimitCheck) -> float:
+    """Token bucket refill rate approximating a check (local backends treat every check as a bucket)"""
+    if check.window:
+        return check.requests_per_minute * 60.0 / check.window
+    return check.requests_per_minute
+
+class LimiterEngine:
+    """Base class for a rate limiting algorithm evaluated atomically in Redis.
+
+    Engines keep their state under the limiter's bucket key plus a per-engine
+    suffix, so switching an endpoint's algorithm never reads another engine's
+    data type, and all of a user's state stays under `bucket:{user_id}:`.
+    `clock` supplies the current time sent to the scripts (a replay passes the
+    log's timestamps).
+    """
+
+    name = ""
+    key_suffix = ""
+    script = ""
+
+    def __init__(self, redis_client: RedisClient, clock: Callable[[], float] = time.time):
+        self.redis = redis_client
+        self.clock = clock
+        self.redis.register_script(self.name, self.script)
+
+    def key_for(self, bucket_key: str) -> str:
+        return f"{bucket_key}{self.key_suffix}"
+
+    def _args(self, key: str, requests_per_minute: int, burst_size: int, cost: int, now: float) -> list:
+        raise NotImplementedError
+
+    @staticmethod
+    def capacity(requests_per_minute: int, burst_size: int) -> int:
+        """Size of the budget a client can spend at once"""
+        return burst_size
+
+    async def consume(self, key: str, requests_per_minute: int, burst_size: int, cost: int = 1,
+                      index_key: Optional[str] = None) -> Admission:
+        """Try to admit a request of the given cost"""
+        keys = [key, index_key] if index_key else [key]
+        result = await self.redis.evalsha(
+            self.name, keys, self._args(key, requests_per_minute, burst_size, cost, self.clock())
+        )
+        if result is None:
+            raise RuntimeError(f"{self.name} script failed for {key}")
+
+        allowed, remaining, retry_after, reset = result
+        return Admission(
+            bool(int(allowed)), float(remaining), self.capacity(requests_per_minute, burst_size),
+            _seconds(retry_after), _seconds(reset)
+        )
+
+    def queue_inspect(self, pipe, key: str, read_only: bool = False):
+        """Queue the read of a key's raw state on a pipeline (for admin views).
+
+        read_only: the pipeline talks to a replica, so only read-only commands may be queued.
+        """
+        raise NotImplementedError
+
+    def parse_inspect(self, raw: Any) -> Optional[Dict[str, Any]]:
+        """Decode the reply queued by queue_inspect; None if the key is gone"""
+        raise NotImplementedError
+
+class TokenBucketEngine(LimiterEngine):
+    """Classic token bucket: burst_size tokens refilled at requests_per_minute / 60 per second.
+
+    Buckets are stored in the given encoding (see BUCKET_IO): a hash of decimal
+    strings, or one packed 12-byte string under the PACKED_KEY_SUFFIX keys.
+    """
+
+    name = "token_bucket"
+    bucket_ttl = BUCKET_TTL  # Expire buckets after 1 hour of inactivity
+
+    def __init__(self, redis_client: RedisClient, encoding: str = settings.BUCKET_ENCODING,
+                 clock: Callable[[], float] = time.time):
+        if encoding not in BUCKET_IO:
+            raise ValueError(f"Unknown bucket encoding: {encoding}")
+        self.packed = encoding == "packed"
+        self.key_suffix = PACKED_KEY_SUFFIX if self.packed else ""
+        bucket_io = BUCKET_IO[encoding]
+        self.script = bucket_io + TOKEN_BUCKET_SCRIPT
+        super().__init__(redis_client, clock)
+        self.redis.register_script("token_lease", bucket_io + TOKEN_LEASE_SCRIPT)
+        self.redis.register_script("token_batch", bucket_io + TOKEN_BATCH_SCRIPT)
+
+    def _args(self, key, requests_per_minute, burst_size, cost, now):
+        return [burst_size, requests_per_minute / 60.0, now, cost, self.bucket_ttl]
+
+    async def lease(self, key: str, requests_per_minute: int, burst_size: int, refund: float, max_take: int,
+                    index_key: Optional[str] = None) -> Tuple[int, float]:
+        """Borrow up to max_take whole tokens after returning refund; returns (granted, remaining)"""
+        result = await self.redis.evalsha(
+            "token_lease",
+            [key, index_key] if index_key else [key],
+            [burst_size, requests_per_minute / 60.0, self.clock(), refund, max_take, self.bucket_ttl]
+        )
+        if result is None:
+            raise RuntimeError(f"Token lease script failed for {key}")
+
+        granted, remaining = result
+        return int(granted), float(remaining)
+
+    async def consume_batch(self, key: str, requests_per_minute: int, burst_size: int, costs: List[int],
+                            index_key: Optional[str] = None) -> List[Admission]:
+        """Admit several requests on one bucket in order, in one round trip; one Admission per cost"""
+        result = await self.redis.evalsha(
+            "token_batch",
+            [key, index_key] if index_key else [key],
+            [burst_size, requests_per_minute / 60.0, self.clock(), self.bucket_ttl, *costs]
+        )
+        if result is None:
+            raise RuntimeError(f"Token batch script failed for {key}")
+
+        _, flags, remaining = result
+        return [
+            bucket_admission(bool(int(allowed)), float(tokens), requests_per_minute, burst_size, cost)
+            for allowed, tokens, cost in zip(flags, remaining, costs)
+        ]
+
+    def queue_inspect(self, pipe, key, read_only=False):
+        if self.packed:
+            # Decoded server-side: the packed bytes are not valid text for a decoding client
+            pipe.execute_command("BITFIELD_RO" if read_only else "BITFIELD", key, "GET", "u48", "#0", "GET", "u48", "#1")
+        else:
+            pipe.hgetall(key)
+
+    def parse_inspect(self, raw):
+        if self.packed:
+            # A missing key reads as zeros; a stored refill time is never 0
+            if not raw or not raw[1]:
+                return None
+            return {"tokens": raw[0] / 1000.0, "last_refill": raw[1] / 1000.0}
+        if not raw:
+            return None
+        return {
+            "tokens": float(raw.get("tokens", 0)),
+            "last_refill": float(raw.get("last_refill", 0))
+        }
+
+    async def read(self, key: str) -> Optional[Tuple[float, float]]:
+        """Stored (tokens, last_refill) of a bucket, before refill; None if it does not exist"""
+        raw, = await self.redis.execute_pipeline(lambda pipe: self.queue_inspect(pipe, key), operation="bucket_read")
+        state = self.parse_inspect(raw)
+        return (state["tokens"], state["last_refill"]) if state else None
+
+class GCRAEngine(LimiterEngine):
+    """GCRA: token bucket semantics with a single timestamp string per key"""
+
+    name = "gcra"
+    key_suffix = ":gcra"
+    script = GCRA_SCRIPT
+
+    def _args(self, key, requests_per_minute, burst_size, cost, now):
+        return [60.0 / requests_per_minute, burst_size, now, cost, BUCKET_TTL]
+
+    def queue_inspect(self, pipe, key, read_only=False):
+        pipe.get(key)
+
+    def parse_inspect(self, raw):
+        return {"tat": float(raw)} if raw else None
+
+class SlidingWindowCounterEngine(LimiterEngine):
+    """At most requests_per_minute per rolling minute, weighted from two fixed windows"""
+
+    name = "sliding_window_counter"
+    key_suffix = ":swc"
+    script = SLIDING_WINDOW_COUNTER_SCRIPT
+    window = 60
+
+    @staticmethod
+    def capacity(requests_per_minute, burst_size):
+        return requests_per_minute
+
+    def _args(self, key, requests_per_minute, burst_size, cost, now):
+        return [requests_per_minute, self.window, now, cost]
+
+    def queue_inspect(self, pipe, key, read_only=False):
+        pipe.hgetall(key)
+
+    def parse_inspect(self, raw):
+        return {field: float(value) for field, value in raw.items()} if raw else None
+
+class SlidingWindowLogEngine(LimiterEngine):
+    """Exactly requests_per_minute per rolling minute, one log entry per request"""
+
+    name = "sliding_window_log"
+    key_suffix = ":swl"
+    script = SLIDING_WINDOW_LOG_SCRIPT
+    window = 60
+
+    @staticmethod
+    def capacity(requests_per_minute, burst_size):
+        return requests_per_minute
+
+    def _args(self, key, requests_per_minute, burst_size, cost, now):
+        return [requests_per_minute, self.window, now, cost, uuid.uuid4().hex]
+
+    def queue_inspect(self, pipe, key, read_only=False):
+        pipe.zcount(key, self.clock() - self.window, "+inf")
+
+    def parse_inspect(self, raw):
+        return {"requests_in_window": int(raw)} if raw else None
+
+class MultiLimitEvaluator:
+    """All-or-nothing admission across several limits in one atomic round trip"""
+
+    name = "multi_limit"
+
+    def __init__(self, redis_client: RedisClient, encoding: str = settings.BUCKET_ENCODING,
+                 clock: Callable[[], float] = time.time):
+        self.redis = redis_client
+        self.clock = clock
+        # Token bucket limits are stored the same way as TokenBucketEngine's
+        self.redis.register_script(self.name, BUCKET_IO[encoding] + MULTI_LIMIT_SCRIPT)
+
+    async def consume_many(self, checks: List[LimitCheck],
+                           index_key: Optional[str] = None) -> Tuple[bool, List[Admission]]:
+        """Admit only if every check admits; returns (allowed, admission per check)"""
+        if self.redis.cluster:
+            return await self._consume_by_slot(checks, index_key)
+        return await self._consume(checks, index_key)
+
+    async def _consume_by_slot(self, checks: List[LimitCheck],
+                               index_key: Optional[str]) -> Tuple[bool, List[Admission]]:
+        """Cluster mode: one atomic evaluation per hash slot, in check order.
+
+        A user's keys share a slot, so the endpoint and user-wide limits stay
+        all-or-nothing; tenant and IP limits live in other slots and are only
+        evaluated once the earlier slots admitted. Tokens already taken from an
+        earlier slot are not returned when a later slot denies (errs strict),
+        and checks left unevaluated are reported as denied.
+        """
+        groups: Dict[int, List[int]] = {}
+        for position, check in enumerate(checks):
+            groups.setdefault(self.redis.key_slot(check.key), []).append(position)
+        index_slot = self.redis.key_slot(index_key) if index_key else None
+
+        results: List[Admission] = [
+            Admission(False, 0.0, ENGINES[check.algorithm].capacity(check.requests_per_minute, check.burst_size), 0.0, 0.0)
+            for check in checks
+        ]
+        for slot, positions in groups.items():
+            allowed, group_results = await self._consume(
+                [checks[position] for position in positions], index_key if slot == index_slot else None
+            )
+            for position, result in zip(positions, group_results):
+                results[position] = result
+            if not allowed:
+                return False, results
+        return True, results
+
+    async def _consume(self, checks: List[LimitCheck],
+                       index_key: Optional[str]) -> Tuple[bool, List[Admission]]:
+        args: List[Any] = [self.clock(), TokenBucketEngine.bucket_ttl]
+        for check in checks:
+            args.extend([
+                check.algorithm, check.requests_per_minute, check.burst_size, check.cost,
+                uuid.uuid4().hex, 1 if check.indexed and index_key else 0,
+                check.window or SlidingWindowLogEngine.window
+            ])
+
+        keys = [check.key for check in checks]
+        if index_key:
+            keys.append(index_key)
+        result = await self.redis.evalsha(self.name, keys, args)
+        if result is None:
+            raise RuntimeError(f"Multi-limit script failed for {len(checks)} keys")
+
+        allowed, flags, remaining, retries, resets = result
+        return bool(int(allowed)), [
+            Admission(
+                bool(int(flag)), float(left), ENGINES[check.algorithm].capacity(check.requests_per_minute, check.burst_size),
+                _seconds(retry_after), _seconds(reset)
+            )
+            for check, flag, left, retry_after, reset in zip(checks, flags, remaining, retries, resets)
+        ]
+
+ENGINES: Dict[str, Type[LimiterEngine]] = {
+    engine.name: engine
+    for engine in (TokenBucketEngine, GCRAEngine, SlidingWindowCounterEngine, SlidingWindowLogEngine)
+}
+
+DEFAULT_ENGINE = TokenBucketEngine.name
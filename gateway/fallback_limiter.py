@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from typing import Callable, List
+
+from engines import LimitCheck, Admission, bucket_admission, most_restrictive, refill_per_minute
+
+class InMemoryRateLimiter:
+    """Per-process token buckets used while Redis is unreachable.
+
+    Every algorithm is approximated by a token bucket, and limits are enforced
+    per worker rather than across the fleet, so the effective limit while
+    degraded is up to (workers x configured limit). That is still far tighter
+    than failing open, and needs no I/O.
+    """
+
+    def __init__(self, max_buckets: int, clock: Callable[[], float] = time.time):
+        self.max_buckets = max_buckets
+        self.clock = clock
+        # bucket key -> [tokens, last_refill]
+        self.buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.admitted = 0
+        self.rejected = 0
+
+    def _bucket(self, key: str, burst_size: int, requests_per_minute: int, now: float) -> List[float]:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [float(burst_size), now]
+            self.buckets[key] = bucket
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(float(burst_size), bucket[0] + (now - bucket[1]) * requests_per_minute / 60.0)
+            bucket[1] = now
+        return bucket
+
+    def consume(self, key: str, requests_per_minute: int, burst_size: int, cost: int = 1) -> Admission:
+        """Try to admit a request of the given cost"""
+        return self.consume_many([LimitCheck(key, requests_per_minute, burst_size, "", cost)])
+
+    def consume_many(self, checks: List[LimitCheck]) -> Admission:
+        """Admit only if every check has enough tokens; reports the most restrictive check"""
+        now = self.clock()
+        buckets = [self._bucket(check.key, check.burst_size, refill_per_minute(check), now) for check in checks]
+        allowed = all(bucket[0] >= check.cost for bucket, check in zip(buckets, checks))
+        if allowed:
+            for bucket, check in zip(buckets, checks):
+                bucket[0] -= check.cost
+            self.admitted += 1
+        else:
+            self.rejected += 1
+        return most_restrictive([
+            bucket_admission(allowed or bucket[0] >= check.cost, bucket[0],
+                             refill_per_minute(check), check.burst_size, check.cost)
+            for bucket, check in zip(buckets, checks)
+        ])
+
+    def clear_prefix(self, prefix: str):
+        """Drop every bucket whose key starts with prefix"""
+        for key in [k for k in self.buckets if k.startswith(prefix)]:
+            del self.buckets[key]
+
+    def __len__(self) -> int:
+        return len(self.buckets)
@@ -0,0 +1,124 @@
+import zlib
+from array import array
+from typing import Dict, List, Set, Tuple
+
+# Fixed-memory traffic summaries for the sketch stats mode (STATS_SKETCH_ENABLED).
+#
+# CountMinSketch answers "how many requests did X make" for any X, never
+# underestimating: with width w and depth d the estimate exceeds the true
+# count by more than (e / w) * N (N = all requests counted) with probability
+# at most e^-d. SpaceSaving keeps the k heaviest items; any item with more
+# than N / k requests is guaranteed to be in it, and each reported count
+# overestimates by at most its `error`. See benchmarks/heavy_hitters.py for
+# measured error and recall against exact counts.
+
+def _hash_pair(item: str) -> Tuple[int, int]:
+    """Two 32-bit hashes, stable across processes unlike hash(): CRC-32 of the item and of its reverse.
+
+    CRC-32 is not cryptographic, but its distribution is all a sketch needs and
+    it costs a fraction of a hashlib digest per request.
+    """
+    data = item.encode("utf-8")
+    return zlib.crc32(data), zlib.crc32(data[::-1]) | 1
+
+def sketch_indexes(item: str, width: int, depth: int) -> List[int]:
+    """Flat (row-major) cell index for the item in each of `depth` rows of `width` counters"""
+    h1, h2 = _hash_pair(item)
+    return [row * width + (h1 + row * h2) % width for row in range(depth)]
+
+class CountMinSketch:
+    """depth x width counters, stored flat (row-major) so they map onto one Redis string.
+
+    Row i uses the column (h1 + i * h2) mod width (Kirsch-Mitzenmacher double
+    hashing), so each update costs one hash regardless of depth.
+    """
+
+    def __init__(self, width: int, depth: int):
+        self.width = width
+        self.depth = depth
+        self.cells = array("I", [0]) * (width * depth)  # uint32, as merged into Redis
+
+    def indexes(self, item: str) -> List[int]:
+        return sketch_indexes(item, self.width, self.depth)
+
+    def add(self, item: str, count: int = 1):
+        h1, h2 = _hash_pair(item)
+        cells, width = self.cells, self.width
+        base = 0
+        for _ in range(self.depth):
+            cells[base + h1 % width] += count
+            h1 += h2
+            base += width
+
+    def estimate(self, item: str) -> int:
+        cells = self.cells
+        return min(cells[index] for index in self.indexes(item))
+
+    def merge(self, other: "CountMinSketch"):
+        """Add another sketch of the same shape into this one"""
+        cells = self.cells
+        for index, count in enumerate(other.cells):
+            if count:
+                cells[index] += count
+
+    def nonzero(self) -> Dict[int, int]:
+        """Touched cells as {flat index: count}, for merging into Redis"""
+        return {index: count for index, count in enumerate(self.cells) if count}
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.cells.itemsize * len(self.cells)
+
+class SpaceSaving:
+    """Top-k heavy hitters (Metwally et al.) with O(1) unit updates.
+
+    Items are grouped in buckets by count (the stream-summary layout). An unseen
+    item takes over an item with the minimum count, inheriting that count as its
+    error bound.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.buckets: Dict[int, Set[str]] = {}
+        self.min_count = 0
+
+    def _move(self, item: str, old: int, new: int):
+        bucket = self.buckets[old]
+        bucket.discard(item)
+        if not bucket:
+            del self.buckets[old]
+            if old == self.min_count:
+                # Unit increments: the emptied minimum is replaced by old + 1
+                self.min_count = new
+        self.buckets.setdefault(new, set()).add(item)
+        self.counts[item] = new
+
+    def add(self, item: str):
+        count = self.counts.get(item)
+        if count is not None:
+            self._move(item, count, count + 1)
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = 1
+            self.errors[item] = 0
+            self.buckets.setdefault(1, set()).add(item)
+            self.min_count = 1
+            return
+        # Evict one item with the minimum count and take over its count
+        error = self.min_count
+        bucket = self.buckets[error]
+        victim = bucket.pop()
+        del self.counts[victim], self.errors[victim]
+        bucket.add(item)
+        self.counts[item] = error
+        self.errors[item] = error
+        self._move(item, error, error + 1)
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """The n heaviest items with their (over)estimated counts"""
+        return sorted(self.counts.items(), key=lambda entry: entry[1], reverse=True)[:n]
+
+    def __len__(self) -> int:
+        return len(self.counts)
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+from typing import Optional
+
+class BucketLease:
+    """A slice of tokens borrowed from a shared Redis bucket by this worker"""
+    __slots__ = ("tokens", "expires_at", "denied_until", "shared_remaining")
+
+    def __init__(self, tokens: float, expires_at: float, denied_until: float = 0.0, shared_remaining: float = 0.0):
+        self.tokens = tokens
+        self.expires_at = expires_at
+        # Tokens left in the shared bucket when the lease was taken (for reporting remaining budget)
+        self.shared_remaining = shared_remaining
+        # When the shared bucket had nothing to lend, the moment it is expected to refill one token
+        self.denied_until = denied_until
+
+    def is_expired(self, now: float) -> bool:
+        return now >= self.expires_at
+
+class LocalBucketCache:
+    """Bounded LRU of bucket leases held by this worker process.
+
+    Tokens in a lease have already been removed from the shared bucket, so
+    admitting from a lease never exceeds the global limit; the lease TTL bounds
+    how long a worker can keep spending a budget computed under stale state.
+    """
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self.leases: "OrderedDict[str, BucketLease]" = OrderedDict()
+
+    def get(self, bucket_key: str) -> Optional[BucketLease]:
+        """Get the lease for a bucket and mark it as recently used"""
+        lease = self.leases.get(bucket_key)
+        if lease is not None:
+            self.leases.move_to_end(bucket_key)
+        return lease
+
+    def put(self, bucket_key: str, lease: BucketLease):
+        """Store a lease, evicting the least recently used bucket if full"""
+        self.leases[bucket_key] = lease
+        self.leases.move_to_end(bucket_key)
+        while len(self.leases) > self.max_buckets:
+            # Unused tokens of an evicted lease are simply forfeited (errs on the strict side)
+            self.leases.popitem(last=False)
+
+    def invalidate_prefix(self, prefix: str):
+        """Drop every lease whose bucket key starts with prefix"""
+        for bucket_key in [k for k in self.leases if k.startswith(prefix)]:
+            del self.leases[bucket_key]
+
+    def clear(self):
+        """Drop all leases"""
+        self.leases.clear()
+
+    def __len__(self) -> int:
+        return len(self.leases)
@@ -1,8 +1,8 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 import time
 import json
 from typing import Optional, Dict, Any
@@ -13,21 +13,77 @@ from config import settings
 from auth import verify_jwt_token, create_access_token
 from rate_limiter import TokenBucketRateLimiter
 from redis_client import RedisClient
+from config_watcher import ConfigWatcher
+from rate_limit_middleware import RateLimitMiddleware
+from proxy import UpstreamPool, ReverseProxyMiddleware
+from circuit_breaker import CircuitBreaker
+from metrics import REGISTRY, CONTENT_TYPE, Gauge
 
 # Initialize services globally
 redis_client = RedisClient()
-rate_limiter = TokenBucketRateLimiter(redis_client)
+# Admin statistics reads go to replicas when configured
+stats_client = RedisClient(replica=True) if settings.REDIS_READ_FROM_REPLICAS else None
+rate_limiter = TokenBucketRateLimiter(redis_client, stats_client)
+config_watcher = ConfigWatcher(redis_client, rate_limiter)
+upstreams = UpstreamPool(settings.UPSTREAMS)
 security = HTTPBearer()
 
+# Backend state exported on /metrics, read at scrape time
+def _pool_connections():
+    usage = redis_client.pool_usage() or {}
+    return [((state,), count) for state, count in usage.items()]
+
+def _circuit_state():
+    state = redis_client.breaker.state
+    return [((name,), int(name == state)) for name in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)]
+
+def _fallback_decisions():
+    return [(("allowed",), rate_limiter.fallback.admitted), (("blocked",), rate_limiter.fallback.rejected)]
+
+REGISTRY.register(Gauge(
+    "gateway_redis_pool_connections", "Redis pool connections by state (in_use, idle, max)", ("state",), _pool_connections
+))
+REGISTRY.register(Gauge(
+    "gateway_redis_circuit_state", "1 for the current Redis circuit breaker state", ("state",), _circuit_state
+))
+REGISTRY.register(Gauge(
+    "gateway_redis_circuit_opened_total", "Times the Redis circuit breaker opened",
+    (), lambda: [((), redis_client.breaker.transitions[CircuitBreaker.OPEN])], kind="counter"
+))
+REGISTRY.register(Gauge(
+    "gateway_fallback_decisions_total", "Decisions made by the in-memory fallback limiter while Redis was down",
+    ("result",), _fallback_decisions, kind="counter"
+))
+REGISTRY.register(Gauge(
+    "gateway_stats_dropped_total", "Buffered statistics counters discarded after repeated failed flushes",
+    (), lambda: [((), rate_limiter.stats_recorder.dropped)], kind="counter"
+))
+REGISTRY.register(Gauge(
+    "gateway_shadow_dropped_total", "Requests not shadow-evaluated because the shadow queue was full",
+    (), lambda: [((), rate_limiter.shadow.dropped)], kind="counter"
+))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await redis_client.connect()
+    if stats_client:
+        await stats_client.connect()
+    await rate_limiter.stats_recorder.start()
+    await rate_limiter.shadow.start()
+    await config_watcher.start()
     print("✅ API Gateway started successfully")
     
     yield  # Application runs here
     
     # Shutdown
+    await config_watcher.stop()
+    await upstreams.close()
+    await rate_limiter.shadow.stop()
+    await rate_limiter.concurrency.stop()
+    await rate_limiter.stats_recorder.stop()
+    if stats_client:
+        await stats_client.disconnect()
     await redis_client.disconnect()
     print("🔌 API Gateway shutdown complete")
 
@@ -42,6 +98,9 @@ app = FastAPI(
 
 GATEWAY_PORT = int(os.getenv("GATEWAY_PORT", 8000))
 
+# Routed prefixes are proxied to their upstream (after CORS and rate limiting)
+app.add_middleware(ReverseProxyMiddleware, upstreams=upstreams)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -51,57 +110,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Rate limiting middleware
-@app.middleware("http")
-async def rate_limit_middleware(request: Request, call_next):
-    # Skip rate limiting for docs and admin endpoints
-    if request.url.path in ["/docs", "/redoc", "/openapi.json", "/admin/login", "/health"]:
-        response = await call_next(request)
-        return response
-    
-    # Extract user from JWT token
-    user_id = None
-    auth_header = request.headers.get("authorization")
-    
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ")[1]
-        try:
-            payload = verify_jwt_token(token)
-            user_id = payload.get("sub")
-        except Exception:
-            return JSONResponse(
-                status_code=401,
-                content={"error": "Invalid token"}
-            )
-    
-    if not user_id:
-        return JSONResponse(
-            status_code=401,
-            content={"error": "Authentication required"}
-        )
-    
-    # Check rate limit
-    endpoint = request.url.path
-    method = request.method
-    
-    allowed = await rate_limiter.is_allowed(user_id, endpoint, method)
-    
-    if not allowed:
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": "Rate limit exceeded",
-                "message": "Too many requests. Please try again later."
-            }
-        )
-    
-    response = await call_next(request)
-    return response
+# Authentication and rate limiting (plain ASGI; added last so it runs outermost, as before)
+app.add_middleware(RateLimitMiddleware, rate_limiter=rate_limiter)
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": time.time()}
+    backend = rate_limiter.get_backend_status()
+    # Still serving while Redis is down, but enforcing limits per process only
+    status_text = "healthy" if backend["redis_circuit"]["state"] == "closed" else "degraded"
+    return {"status": status_text, "timestamp": time.time(), **backend}
+
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(REGISTRY.render(), headers={"Content-Type": CONTENT_TYPE})
 
 # Authentication endpoints
 @app.post("/admin/login")
@@ -157,40 +180,95 @@ async def update_config(config_data: dict, credentials: HTTPAuthorizationCredent
         if field not in config_data:
             raise HTTPException(status_code=400, detail=f"Missing field: {field}")
     
-    # Store configuration in Redis
-    await redis_client.set("rate_limit_config", json.dumps(config_data))
+    # Store configuration in Redis and notify every gateway worker
+    try:
+        version = await config_watcher.publish(config_data)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid configuration: {e}")
+    if version is None:
+        raise HTTPException(status_code=500, detail="Failed to store configuration")
+    
+    return {"message": "Configuration updated successfully", "version": version}
+
+@app.post("/admin/shadow")
+async def start_shadow(config_data: dict, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Evaluate a candidate configuration on live traffic without enforcing it"""
+    payload = verify_jwt_token(credentials.credentials)
+    if payload.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    required_fields = ["default_requests_per_minute", "endpoints"]
+    for field in required_fields:
+        if field not in config_data:
+            raise HTTPException(status_code=400, detail=f"Missing field: {field}")
+    
+    try:
+        version, run = await config_watcher.publish_shadow(config_data)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid configuration: {e}")
+    if version is None:
+        raise HTTPException(status_code=500, detail="Failed to store shadow configuration")
+    
+    return {"message": "Shadow evaluation started", "id": run["id"]}
+
+@app.delete("/admin/shadow")
+async def stop_shadow(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Stop shadow evaluation (the last run's report stays readable until it expires)"""
+    payload = verify_jwt_token(credentials.credentials)
+    if payload.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Update rate limiter configuration
-    await rate_limiter.update_config(config_data)
+    version, _ = await config_watcher.publish_shadow(None)
+    if version is None:
+        raise HTTPException(status_code=500, detail="Failed to stop shadow evaluation")
+    return {"message": "Shadow evaluation stopped"}
+
+@app.get("/admin/shadow")
+async def get_shadow_report(
+    top: int = Query(20, ge=1, le=100),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Decisions the shadow configuration would have made differently, per endpoint and user"""
+    payload = verify_jwt_token(credentials.credentials)
+    if payload.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
     
-    return {"message": "Configuration updated successfully"}
+    return await rate_limiter.shadow.report(top)
 
 @app.get("/admin/stats")
-async def get_stats(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Get rate limiting statistics"""
+async def get_stats(
+    minutes: int = Query(5, ge=1, le=settings.STATS_ROLLUP_TTL_SECONDS // 60),
+    top: int = Query(settings.STATS_TOP_SIZE, ge=0, le=100),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Get rate limiting statistics for the last `minutes` minutes (hourly resolution beyond an hour)"""
     payload = verify_jwt_token(credentials.credentials)
     if payload.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    stats = await rate_limiter.get_stats()
+    stats = await rate_limiter.get_stats(minutes, top)
     return stats
 
 @app.get("/admin/user/{user_id}/stats")
-async def get_user_stats(user_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_user_stats(
+    user_id: str,
+    minutes: int = Query(5, ge=1, le=settings.STATS_ROLLUP_TTL_SECONDS // 60),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """Get rate limiting statistics for a specific user"""
     payload = verify_jwt_token(credentials.credentials)
     if payload.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    stats = await rate_limiter.get_user_stats(user_id)
+    stats = await rate_limiter.get_user_stats(user_id, minutes)
     return stats
 
-# API proxy endpoints (examples)
+# Example API endpoints; requests for prefixes routed in settings.UPSTREAMS are proxied instead
 @app.get("/api/users")
 async def get_users():
     """Example API endpoint - Get users"""
     # Simulate API response
-    await asyncio.sleep(0.1)
+    await asyncio.sleep(settings.EXAMPLE_API_DELAY_MS / 1000.0)
     return {
         "users": [
             {"id": 1, "name": "John Doe", "email": "john@example.com"},
@@ -201,7 +279,7 @@ async def get_users():
 @app.post("/api/users")
 async def create_user(user_data: dict):
     """Example API endpoint - Create user"""
-    await asyncio.sleep(0.1)
+    await asyncio.sleep(settings.EXAMPLE_API_DELAY_MS / 1000.0)
     return {
         "message": "User created successfully",
         "user": {
@@ -214,7 +292,7 @@ async def create_user(user_data: dict):
 @app.get("/api/data")
 async def get_data():
     """Example API endpoint - Get data"""
-    await asyncio.sleep(0.1)
+    await asyncio.sleep(settings.EXAMPLE_API_DELAY_MS / 1000.0)
     return {
         "data": [
             {"id": 1, "value": "sample data 1"},
@@ -226,7 +304,7 @@ async def get_data():
 @app.post("/api/data")
 async def create_data(data: dict):
     """Example API endpoint - Create data"""
-    await asyncio.sleep(0.1)
+    await asyncio.sleep(settings.EXAMPLE_API_DELAY_MS / 1000.0)
     return {
         "message": "Data created successfully",
         "data": {
@@ -0,0 +1,137 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# In-process metrics rendered in the Prometheus text exposition format (version 0.0.4).
+# Everything runs on the event loop thread, so recording is a plain dict/list update
+# with no locks: a counter increment or histogram observation is a few hundred ns.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; suited to sub-millisecond Redis calls up to multi-second stalls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if value == int(value) else repr(value)
+
+class Counter:
+    """Monotonic counter per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        # Unlabelled counters are exported as 0 before their first increment
+        self.values: Dict[LabelValues, float] = {} if labels else {(): 0.0}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        values = self.values
+        values[label_values] = values.get(label_values, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        for label_values, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(value)}"
+
+class Histogram:
+    """Fixed-bucket histogram per label combination.
+
+    Each series is one list: a count per bucket (non-cumulative, the last one
+    for +Inf) followed by the running sum. Cumulative counts are only built at
+    scrape time.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.bounds = tuple(sorted(buckets))
+        self.series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.bounds) + 1) + [0.0]
+        series[bisect_left(self.bounds, value)] += 1
+        series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        le_labels = [f'le="{bound}"' for bound in self.bounds] + ['le="+Inf"']
+        for label_values, series in self.series.items():
+            cumulative = 0
+            for le, count in zip(le_labels, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}"
+            labels = _labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {repr(series[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+class Gauge:
+    """Value read from the application at scrape time; nothing is recorded on the hot path.
+
+    Also exposes counters the application already keeps (kind="counter").
+    """
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...],
+                 collect: Callable[[], Iterable[Tuple[LabelValues, float]]], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> Iterable[str]:
+        for label_values, value in self.collect():
+            yield f"{self.name}{_labels(self.labels, label_values)} {_number(float(value))}"
+
+class Registry:
+    def __init__(self):
+        self.metrics: List = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+ADMISSION_SECONDS = REGISTRY.register(Histogram(
+    "gateway_admission_seconds", "Time to reach a rate limit decision, including Redis"
+))
+REDIS_COMMAND_SECONDS = REGISTRY.register(Histogram(
+    "gateway_redis_command_seconds", "Redis call latency by operation", ("operation",)
+))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "gateway_requests_total", "Rate limit decisions by route and outcome", ("route", "method", "result")
+))
+FAIL_OPEN_TOTAL = REGISTRY.register(Counter(
+    "gateway_fail_open_total", "Requests admitted without a decision because the limiter errored"
+))
+CONCURRENCY_REJECTED_TOTAL = REGISTRY.register(Counter(
+    "gateway_concurrency_rejected_total", "Requests rejected by an in-flight cap", ("route", "method")
+))
+COALESCED_BATCH_SIZE = REGISTRY.register(Histogram(
+    "gateway_coalesced_batch_size", "Admissions decided per coalesced Redis call",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250)
+))
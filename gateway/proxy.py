@@ -0,0 +1,198 @@
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import httpx
+from starlette.requests import ClientDisconnect
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Connection-scoped headers that must not be forwarded (RFC 9110 section 7.6.1)
+HOP_BY_HOP_HEADERS = frozenset({
+    b"connection", b"keep-alive", b"proxy-authenticate", b"proxy-authorization",
+    b"te", b"trailer", b"trailers", b"transfer-encoding", b"upgrade"
+})
+
+# Methods whose request body is read up front so a failed attempt can be retried
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "DELETE"})
+
+# Connection failures worth retrying for idempotent methods (including a stale keep-alive
+# connection closed by the upstream); read timeouts are not retried
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError)
+
+def _error_response(status_code: int, error: str) -> Tuple[dict, dict]:
+    body = f'{{"error":"{error}"}}'.encode("utf-8")
+    start = {
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("latin-1"))]
+    }
+    return start, {"type": "http.response.body", "body": body}
+
+BAD_GATEWAY = _error_response(502, "Upstream unavailable")
+GATEWAY_TIMEOUT = _error_response(504, "Upstream timed out")
+
+def _filter_headers(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Drop hop-by-hop headers, including any listed in the Connection header.
+
+    Names come back lowercased, as ASGI requires; middleware outside this one
+    (e.g. CORS) looks headers up by their lowercase name.
+    """
+    headers = [(name.lower(), value) for name, value in headers]
+    hop_by_hop = HOP_BY_HOP_HEADERS
+    for name, value in headers:
+        if name == b"connection":
+            hop_by_hop = hop_by_hop | {token.strip().lower() for token in value.split(b",")}
+    return [(name, value) for name, value in headers if name not in hop_by_hop]
+
+class UpstreamPool:
+    """Routing table from path prefixes to upstream base URLs, with one pooled client per upstream.
+
+    Routes are matched by longest prefix on whole path segments, so `/api/users`
+    matches `/api/users` and `/api/users/42` but not `/api/usersettings`. The
+    request path is forwarded unchanged, appended to the upstream base URL.
+    """
+
+    def __init__(self, routes: Dict[str, str]):
+        # Longest prefix first
+        self.routes: List[Tuple[str, str]] = sorted(
+            ((prefix.rstrip("/") or "/", url.rstrip("/")) for prefix, url in routes.items()),
+            key=lambda route: len(route[0]),
+            reverse=True
+        )
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.retries = settings.UPSTREAM_RETRIES
+
+    def match(self, path: str) -> Optional[str]:
+        """Base URL of the upstream serving a path, or None"""
+        for prefix, url in self.routes:
+            if prefix == "/" or path == prefix or path.startswith(prefix + "/"):
+                return url
+        return None
+
+    def client(self, base_url: str) -> httpx.AsyncClient:
+        """Keep-alive client for one upstream, created on first use"""
+        client = self.clients.get(base_url)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE
+                ),
+                timeout=httpx.Timeout(
+                    connect=settings.UPSTREAM_CONNECT_TIMEOUT_MS / 1000.0,
+                    read=settings.UPSTREAM_READ_TIMEOUT_MS / 1000.0,
+                    write=settings.UPSTREAM_READ_TIMEOUT_MS / 1000.0,
+                    pool=settings.UPSTREAM_POOL_TIMEOUT_MS / 1000.0
+                ),
+                follow_redirects=False,
+                trust_env=False  # never route upstream traffic through *_PROXY environment settings
+            )
+            self.clients[base_url] = client
+        return client
+
+    async def close(self):
+        """Close every upstream connection pool"""
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+class ReverseProxyMiddleware:
+    """Forward requests for routed prefixes to their upstream; everything else goes to the app.
+
+    Request and response bodies are streamed chunk by chunk in both directions
+    and response bodies are passed on still content-encoded, so nothing is
+    buffered or decoded in the gateway. Requests with RETRY_METHODS are
+    retried on connection failures, up to UPSTREAM_RETRIES times.
+    """
+
+    def __init__(self, app, upstreams: UpstreamPool):
+        self.app = app
+        self.upstreams = upstreams
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        base_url = self.upstreams.match(scope["path"])
+        if base_url is None:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope.get("raw_path") or scope["path"].encode("utf-8")
+        url = base_url + path.decode("latin-1")
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+
+        headers = [(name, value) for name, value in _filter_headers(scope["headers"]) if name != b"host"]
+        client_addr = scope.get("client")
+        for name, value in scope["headers"]:
+            if name == b"host":
+                headers.append((b"x-forwarded-host", value))
+        if client_addr:
+            headers.append((b"x-forwarded-for", client_addr[0].encode("latin-1")))
+        headers.append((b"x-forwarded-proto", scope.get("scheme", "http").encode("latin-1")))
+
+        retryable = method in RETRY_METHODS
+        client = self.upstreams.client(base_url)
+        attempts = 1 + (self.upstreams.retries if retryable else 0)
+        response = None
+        try:
+            if retryable:
+                body = b"".join([chunk async for chunk in self._request_body(receive)])
+            else:
+                body = self._request_body(receive)
+            for attempt in range(attempts):
+                try:
+                    request = client.build_request(method, url, headers=headers, content=body)
+                    response = await client.send(request, stream=True)
+                    break
+                except httpx.TimeoutException as e:
+                    if not (retryable and isinstance(e, RETRY_ERRORS)) or attempt == attempts - 1:
+                        logger.error(f"Upstream timeout for {method} {url}: {e}")
+                        await self._send_error(send, GATEWAY_TIMEOUT)
+                        return
+                except httpx.HTTPError as e:
+                    if not (retryable and isinstance(e, RETRY_ERRORS)) or attempt == attempts - 1:
+                        logger.error(f"Upstream error for {method} {url}: {e}")
+                        await self._send_error(send, BAD_GATEWAY)
+                        return
+                logger.warning(f"Retrying {method} {url} (attempt {attempt + 2}/{attempts})")
+        except ClientDisconnect:
+            # Client went away while uploading; nothing to answer
+            return
+
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": _filter_headers(response.headers.raw)
+            })
+            async for chunk in response.aiter_raw():
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except httpx.HTTPError as e:
+            # Headers are already out; all we can do is cut the response short
+            logger.error(f"Upstream stream error for {method} {url}: {e}")
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await response.aclose()
+
+    async def _request_body(self, receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnect()
+            chunk = message.get("body", b"")
+            if chunk:
+                yield chunk
+            if not message.get("more_body", False):
+                return
+
+    async def _send_error(self, send, response: Tuple[dict, dict]):
+        start, body = response
+        await send({**start, "headers": list(start["headers"])})
+        await send(body)
@@ -0,0 +1,137 @@
+import json
+import math
+from typing import Any, Dict, FrozenSet, List, Tuple
+
+from auth import verify_jwt_token, bearer_token
+from engines import Admission
+from rate_limiter import TokenBucketRateLimiter
+
+# Paths served without authentication or rate limiting
+EXEMPT_PATHS: FrozenSet[str] = frozenset({"/docs", "/redoc", "/openapi.json", "/admin/login", "/health", "/metrics"})
+
+class _PreparedResponse:
+    """A fixed JSON response serialized once at import time"""
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, content: Dict[str, Any]):
+        self.status = status
+        # Same encoding as Starlette's JSONResponse
+        self.body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.headers: List[Tuple[bytes, bytes]] = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(self.body)).encode("latin-1"))
+        ]
+
+    async def send(self, send, extra_headers: List[Tuple[bytes, bytes]] = ()):
+        # Fresh header list per response: outer middleware may append to it
+        headers = self.headers + list(extra_headers)
+        await send({"type": "http.response.start", "status": self.status, "headers": headers})
+        await send({"type": "http.response.body", "body": self.body})
+
+INVALID_TOKEN = _PreparedResponse(401, {"error": "Invalid token"})
+AUTH_REQUIRED = _PreparedResponse(401, {"error": "Authentication required"})
+RATE_LIMITED = _PreparedResponse(429, {
+    "error": "Rate limit exceeded",
+    "message": "Too many requests. Please try again later."
+})
+CONCURRENCY_LIMITED = _PreparedResponse(429, {
+    "error": "Concurrency limit exceeded",
+    "message": "Too many requests in progress. Please retry once one completes."
+})
+
+def rate_limit_headers(admission: Admission) -> List[Tuple[bytes, bytes]]:
+    """RateLimit-Limit/-Remaining/-Reset (IETF RateLimit header fields draft), plus Retry-After when rejected"""
+    if admission.limit <= 0:
+        # Failed open: no budget information
+        return []
+    headers = [
+        (b"ratelimit-limit", str(admission.limit).encode("latin-1")),
+        (b"ratelimit-remaining", str(max(0, int(admission.remaining))).encode("latin-1")),
+        (b"ratelimit-reset", str(math.ceil(admission.reset)).encode("latin-1"))
+    ]
+    if not admission.allowed:
+        headers.append((b"retry-after", str(max(1, math.ceil(admission.retry_after))).encode("latin-1")))
+    return headers
+
+class RateLimitMiddleware:
+    """Authentication and rate limiting as a plain ASGI middleware.
+
+    Unlike @app.middleware("http") (BaseHTTPMiddleware) this does not wrap the
+    request and response in extra tasks and memory streams: admitted requests
+    call the downstream app with the original receive, and responses stream
+    straight through; the only change to them is the rate limit headers
+    added to the response start.
+    """
+
+    def __init__(self, app, rate_limiter: TokenBucketRateLimiter, exempt_paths: FrozenSet[str] = EXEMPT_PATHS):
+        self.app = app
+        self.rate_limiter = rate_limiter
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        # Extract user from JWT token
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value.decode("latin-1")
+                break
+
+        user_id = None
+        tenant_id = None
+        token = bearer_token(authorization)
+        if token:
+            try:
+                payload = verify_jwt_token(token)
+                user_id = payload.get("sub")
+                tenant_id = payload.get("tenant")
+            except Exception:
+                await INVALID_TOKEN.send(send)
+                return
+
+        if not user_id:
+            await AUTH_REQUIRED.send(send)
+            return
+
+        # Check rate limit
+        endpoint = scope["path"]
+        method = scope["method"]
+
+        if self.rate_limiter.has_dimensions():
+            # Endpoint limit, plan quotas, user-wide, tenant and IP limits in one atomic evaluation
+            client = scope.get("client")
+            client_ip = client[0] if client else None
+            admission = await self.rate_limiter.admit_dimensions(user_id, endpoint, method, tenant_id, client_ip)
+        else:
+            admission = await self.rate_limiter.admit(user_id, endpoint, method)
+
+        headers = rate_limit_headers(admission)
+        if not admission.allowed:
+            await RATE_LIMITED.send(send, headers)
+            return
+
+        lease = None
+        if self.rate_limiter.has_concurrency_limits():
+            allowed, lease = await self.rate_limiter.acquire_concurrency(user_id, endpoint, method)
+            if not allowed:
+                await CONCURRENCY_LIMITED.send(send, headers)
+                return
+
+        try:
+            if not headers:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_with_headers(message):
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": list(message.get("headers", [])) + headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            # Also on errors and client disconnects, or the slot stays taken until its lease expires
+            if lease is not None:
+                await self.rate_limiter.release_concurrency(lease)
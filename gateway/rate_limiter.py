@@ -1,25 +1,119 @@
 import time
 import json
 import asyncio
-from typing import Dict, Any, Optional, Tuple
+import uuid
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import logging
 
 from config import settings
 from redis_client import RedisClient
+from stats_recorder import StatsRecorder, USER_BOARDS
+from local_cache import LocalBucketCache, BucketLease
+from coalescer import AdmissionCoalescer
+from concurrency_limiter import ConcurrencyLimiter, Lease
+from shadow import ShadowEvaluator
+from fallback_limiter import InMemoryRateLimiter
+from shared_memory_limiter import SharedMemoryRateLimiter
+from route_resolver import RouteResolver
+from metrics import ADMISSION_SECONDS, REQUESTS_TOTAL, FAIL_OPEN_TOTAL, CONCURRENCY_REJECTED_TOTAL
+from engines import (
+    ENGINES, LimiterEngine, TokenBucketEngine, SlidingWindowCounterEngine, LimitCheck, MultiLimitEvaluator,
+    Admission, bucket_admission, most_restrictive
+)
 
 logger = logging.getLogger(__name__)
 
+# Reported when the limiter could not decide and let the request through; limit 0 means
+# there is no budget information to show the client
+FAIL_OPEN = Admission(True, 0.0, 0, 0.0, 0.0)
+
 class TokenBucketRateLimiter:
-    def __init__(self, redis_client: RedisClient):
+    def __init__(self, redis_client: RedisClient, stats_client: Optional[RedisClient] = None,
+                 clock: Callable[[], float] = time.time):
         self.redis = redis_client
+        # Admin statistics reads may be served by a replica; writes always go to the primary
+        self.stats_redis = stats_client or redis_client
         self.config = settings.DEFAULT_RATE_LIMITS
-        self.config_key = "rate_limit_config"
+        self.resolver = RouteResolver(self.config, settings.ROUTE_CACHE_SIZE)
+        self.config_version: Optional[int] = None  # None until a stored config is applied
+        self.config_key = settings.CONFIG_KEY
+        # User keys carry the user id as a hash tag (`bucket:{alice}:...`) so a user's
+        # buckets, index and stats live in one Redis Cluster slot
         self.bucket_prefix = "bucket:"
+        self.dimension_prefix = "limit:"
+        self.index_prefix = "bucket_index:"  # per-user set of live bucket keys
         self.stats_prefix = "stats:"
+        self.inflight_prefix = "inflight:"  # lease sets of the in-flight caps
+        # One instance per algorithm; each endpoint/method picks one via `algorithm` in the config
+        self.engines: Dict[str, LimiterEngine] = {
+            name: engine(redis_client, clock=clock) for name, engine in ENGINES.items()
+        }
+        self.multi_limit = MultiLimitEvaluator(redis_client, clock=clock)
+        self.stats_recorder = StatsRecorder(redis_client, self.stats_prefix)
+        self.concurrency = ConcurrencyLimiter(redis_client, settings.CONCURRENCY_LEASE_TTL_SECONDS)
+        # Candidate config evaluated off the request path (inactive until one is published)
+        self.shadow = ShadowEvaluator(redis_client, self.multi_limit, self.limit_checks)
+        
+        # Optional local-first mode: admit from per-worker token leases
+        self.local_cache: Optional[LocalBucketCache] = None
+        if settings.LOCAL_FIRST_ENABLED:
+            self.local_cache = LocalBucketCache(settings.LOCAL_CACHE_MAX_BUCKETS)
+        self.lease_size = settings.LOCAL_LEASE_SIZE
+        self.lease_ttl = settings.LOCAL_LEASE_TTL_MS / 1000.0
+        self.lease_refreshes: Dict[str, asyncio.Future] = {}
+        # Lease ages use the monotonic clock unless another clock is injected (see use_clock)
+        self.clock = clock
+        self.lease_clock = time.monotonic if clock is time.time else clock
+        
+        # Optional request coalescing: one Redis call per burst on a hot bucket key
+        self.coalescer: Optional[AdmissionCoalescer] = None
+        if settings.COALESCE_ENABLED:
+            self.coalescer = AdmissionCoalescer(
+                self.engines[TokenBucketEngine.name], settings.COALESCE_WINDOW_MS / 1000.0, settings.COALESCE_MAX_BATCH
+            )
+        
+        # Admits from per-process buckets while the Redis circuit breaker is open
+        self.fallback = InMemoryRateLimiter(settings.FALLBACK_MAX_BUCKETS, clock)
+        
+        # Single-host deployments: bucket state in shared memory instead of Redis
+        self.shared: Optional[SharedMemoryRateLimiter] = None
+        if settings.RATE_LIMIT_BACKEND == "shared_memory":
+            self.shared = SharedMemoryRateLimiter(
+                settings.SHARED_LIMITER_PATH, settings.SHARED_LIMITER_SLOTS, settings.SHARED_LIMITER_STRIPES, clock
+            )
+        elif settings.RATE_LIMIT_BACKEND != "redis":
+            raise ValueError(f"Unknown rate limit backend: {settings.RATE_LIMIT_BACKEND}")
     
-    async def update_config(self, new_config: Dict[str, Any]):
+    def use_clock(self, clock: Callable[[], float]):
+        """Take the current time from `clock` in every engine and in-process limiter (replays pass the log's).
+
+        Lease ages in local-first mode follow it too; with the wall clock they use the monotonic clock.
+        """
+        self.clock = clock
+        self.lease_clock = time.monotonic if clock is time.time else clock
+        for engine in self.engines.values():
+            engine.clock = clock
+        self.multi_limit.clock = clock
+        self.fallback.clock = clock
+        if self.shared is not None:
+            self.shared.clock = clock
+    
+    def _user_prefix(self, user_id: str) -> str:
+        """Prefix of every bucket key belonging to a user"""
+        return f"{self.bucket_prefix}{{{user_id}}}:"
+    
+    def _index_key(self, user_id: str) -> str:
+        return f"{self.index_prefix}{{{user_id}}}"
+    
+    async def update_config(self, new_config: Dict[str, Any], version: Optional[int] = None):
         """Update rate limiting configuration"""
+        # Compile first so a bad config leaves the current one in place
+        self.resolver = RouteResolver(new_config, settings.ROUTE_CACHE_SIZE)
         self.config = new_config
+        self.config_version = version
+        if self.local_cache is not None:
+            # Leases were sized under the old limits
+            self.local_cache.clear()
         logger.info("Rate limiting configuration updated")
     
     async def get_config(self) -> Dict[str, Any]:
@@ -27,7 +121,7 @@ class TokenBucketRateLimiter:
         try:
             config_str = await self.redis.get(self.config_key)
             if config_str:
-                self.config = json.loads(config_str)
+                await self.update_config(json.loads(config_str))
                 return self.config
         except Exception as e:
             logger.error(f"Error getting config from Redis: {e}")
@@ -36,228 +130,432 @@ class TokenBucketRateLimiter:
     
     def _get_rate_limit_for_endpoint(self, endpoint: str, method: str, user_id: str) -> Tuple[int, int]:
         """Get rate limit configuration for specific endpoint and user"""
-        # Check for user-specific overrides first
-        user_overrides = self.config.get("user_overrides", {})
-        if user_id in user_overrides:
-            user_config = user_overrides[user_id]
-            return (
-                user_config.get("requests_per_minute", self.config["default_requests_per_minute"]),
-                user_config.get("burst_size", self.config.get("default_burst_size", 10))
-            )
-        
-        # Check for endpoint-specific limits
-        endpoints = self.config.get("endpoints", {})
-        if endpoint in endpoints:
-            endpoint_config = endpoints[endpoint]
-            if method in endpoint_config:
-                method_config = endpoint_config[method]
-                return (
-                    method_config.get("requests_per_minute", self.config["default_requests_per_minute"]),
-                    method_config.get("burst_size", self.config.get("default_burst_size", 10))
-                )
-        
-        # Return default limits
-        return (
-            self.config["default_requests_per_minute"],
-            self.config.get("default_burst_size", 10)
-        )
+        limit = self.resolver.resolve(user_id, endpoint, method)
+        return limit.requests_per_minute, limit.burst_size
     
     async def _get_token_bucket(self, bucket_key: str, max_tokens: int, refill_rate: float) -> Tuple[int, float]:
         """Get current state of token bucket"""
         try:
-            bucket_data = await self.redis.hgetall(bucket_key)
+            engine: TokenBucketEngine = self.engines[TokenBucketEngine.name]
+            state = await engine.read(engine.key_for(bucket_key))
             
-            if not bucket_data:
-                # Initialize new bucket
-                current_time = time.time()
-                await self.redis.hset(bucket_key, "tokens", str(max_tokens))
-                await self.redis.hset(bucket_key, "last_refill", str(current_time))
-                await self.redis.expire(bucket_key, 3600)  # Expire after 1 hour of inactivity
-                return max_tokens, current_time
+            if state is None:
+                # A missing bucket is a full one; the next admission creates it
+                return max_tokens, self.clock()
             
-            tokens = float(bucket_data.get("tokens", max_tokens))
-            last_refill = float(bucket_data.get("last_refill", time.time()))
-            
-            return tokens, last_refill
+            return state
             
         except Exception as e:
             logger.error(f"Error getting token bucket {bucket_key}: {e}")
-            return max_tokens, time.time()
+            return max_tokens, self.clock()
     
-    async def _update_token_bucket(self, bucket_key: str, tokens: int, timestamp: float):
-        """Update token bucket state"""
+    async def _consume_local(self, bucket_key: str, requests_per_minute: int, burst_size: int, cost: int = 1,
+                             index_key: Optional[str] = None) -> Admission:
+        """Admit from this worker's lease, going to Redis only when it is empty or expired.
+
+        Remaining budget is this lease plus what the shared bucket held when it
+        was taken, so it is approximate while other workers spend too.
+        """
+        while True:
+            now = self.lease_clock()
+            lease = self.local_cache.get(bucket_key)
+            
+            if lease is not None and not lease.is_expired(now):
+                if lease.tokens >= cost:
+                    lease.tokens -= cost
+                    return bucket_admission(
+                        True, lease.tokens + lease.shared_remaining, requests_per_minute, burst_size, cost
+                    )
+                if now < lease.denied_until:
+                    # Shared bucket was empty and cannot have refilled a token yet
+                    return bucket_admission(
+                        False, lease.tokens + lease.shared_remaining, requests_per_minute, burst_size, cost
+                    )
+            
+            pending = self.lease_refreshes.get(bucket_key)
+            if pending is None:
+                break
+            # Another request is already renewing this lease; wait and re-check
+            await pending
+        
+        refresh = asyncio.get_running_loop().create_future()
+        self.lease_refreshes[bucket_key] = refresh
         try:
-            await self.redis.hset(bucket_key, "tokens", str(tokens))
-            await self.redis.hset(bucket_key, "last_refill", str(timestamp))
-            await self.redis.expire(bucket_key, 3600)  # Reset expiration
-        except Exception as e:
-            logger.error(f"Error updating token bucket {bucket_key}: {e}")
+            # Return what is left of the old lease and borrow a fresh slice in one trip
+            refund = 0
+            if lease is not None:
+                refund, lease.tokens = lease.tokens, 0
+            engine: TokenBucketEngine = self.engines[TokenBucketEngine.name]
+            granted, remaining = await engine.lease(
+                bucket_key, requests_per_minute, burst_size, refund, max(self.lease_size, cost), index_key
+            )
+            now = self.lease_clock()
+            new_lease = BucketLease(granted, now + self.lease_ttl, shared_remaining=remaining)
+            
+            if granted < cost:
+                # Not enough for this request: keep what was granted for cheaper ones
+                if granted < 1 and requests_per_minute > 0:
+                    wait = (1 - remaining) * 60.0 / requests_per_minute
+                    new_lease.denied_until = now + min(self.lease_ttl, wait)
+                self.local_cache.put(bucket_key, new_lease)
+                return bucket_admission(False, granted + remaining, requests_per_minute, burst_size, cost)
+            
+            new_lease.tokens -= cost
+            self.local_cache.put(bucket_key, new_lease)
+            return bucket_admission(True, new_lease.tokens + remaining, requests_per_minute, burst_size, cost)
+        finally:
+            del self.lease_refreshes[bucket_key]
+            refresh.set_result(None)
     
     async def is_allowed(self, user_id: str, endpoint: str, method: str) -> bool:
         """Check if request is allowed based on rate limits"""
+        return (await self.admit(user_id, endpoint, method)).allowed
+    
+    async def admit(self, user_id: str, endpoint: str, method: str) -> Admission:
+        """Admit or reject a request, with the remaining budget and timings from the same operation"""
+        start = time.perf_counter()
         try:
-            # Get rate limit configuration
-            requests_per_minute, burst_size = self._get_rate_limit_for_endpoint(endpoint, method, user_id)
-            
-            # Calculate refill rate (tokens per second)
-            refill_rate = requests_per_minute / 60.0
-            max_tokens = burst_size
+            # Get rate limit configuration; templated and wildcard rules share one bucket per route
+            limit = self.resolver.resolve(user_id, endpoint, method)
+            engine = self.engines[limit.algorithm]
             
             # Create bucket key
-            bucket_key = f"{self.bucket_prefix}{user_id}:{endpoint}:{method}"
+            bucket_key = engine.key_for(f"{self._user_prefix(user_id)}{limit.route}:{method}")
+            index_key = self._index_key(user_id)
             
-            # Get current bucket state
-            current_tokens, last_refill = await self._get_token_bucket(bucket_key, max_tokens, refill_rate)
-            
-            # Calculate time elapsed and refill tokens
-            current_time = time.time()
-            time_elapsed = current_time - last_refill
+            if self.shared is not None:
+                admission = self.shared.consume(
+                    bucket_key, limit.requests_per_minute, limit.burst_size, limit.cost, owner=self._user_prefix(user_id)
+                )
+            elif not self.redis.available():
+                # Redis is down: enforce locally instead of waiting on dead sockets
+                admission = self.fallback.consume(
+                    bucket_key, limit.requests_per_minute, limit.burst_size, limit.cost
+                )
+            elif self.local_cache is not None and engine.name == TokenBucketEngine.name:
+                admission = await self._consume_local(
+                    bucket_key, limit.requests_per_minute, limit.burst_size, limit.cost, index_key
+                )
+            elif self.coalescer is not None and engine.name == TokenBucketEngine.name:
+                # Share one round trip with concurrent requests on the same bucket
+                admission = await self.coalescer.consume(
+                    bucket_key, limit.requests_per_minute, limit.burst_size, limit.cost, index_key
+                )
+            else:
+                # Evaluate and consume in one atomic round trip
+                admission = await engine.consume(
+                    bucket_key, limit.requests_per_minute, limit.burst_size, limit.cost, index_key
+                )
             
-            # Add tokens based on time elapsed
-            tokens_to_add = time_elapsed * refill_rate
-            new_tokens = min(max_tokens, current_tokens + tokens_to_add)
+            # Update statistics (buffered, flushed in the background)
+            self._record(user_id, limit.route, method, admission.allowed)
+            if self.shadow.active:
+                self.shadow.observe(user_id, endpoint, method, admission.allowed)
             
-            # Check if we have at least 1 token
-            if new_tokens >= 1:
-                # Consume 1 token
-                new_tokens -= 1
-                await self._update_token_bucket(bucket_key, int(new_tokens), current_time)
-                
-                # Update statistics
-                await self._update_stats(user_id, endpoint, method, True)
-                
-                return True
-            else:
-                # Rate limit exceeded
-                await self._update_token_bucket(bucket_key, int(new_tokens), current_time)
-                await self._update_stats(user_id, endpoint, method, False)
-                
-                return False
+            return admission
                 
         except Exception as e:
             logger.error(f"Error in rate limiting check: {e}")
             # In case of error, allow the request (fail open)
-            return True
+            FAIL_OPEN_TOTAL.inc()
+            return FAIL_OPEN
+        finally:
+            ADMISSION_SECONDS.observe(time.perf_counter() - start)
     
-    async def _update_stats(self, user_id: str, endpoint: str, method: str, allowed: bool):
-        """Update statistics for monitoring"""
+    def _record(self, user_id: str, route: str, method: str, allowed: bool):
+        """Count a decision in the Redis statistics and the process metrics"""
+        self.stats_recorder.record(user_id, route, method, allowed)
+        REQUESTS_TOTAL.inc(self._route_label(route), method, "allowed" if allowed else "blocked")
+    
+    def _route_label(self, route: str) -> str:
+        # Unconfigured paths share one label so arbitrary URLs cannot blow up metric cardinality
+        return route if route in self.resolver.routes else "other"
+    
+    def has_concurrency_limits(self) -> bool:
+        """Whether any in-flight cap is configured"""
+        return self.resolver.has_concurrency_limits
+    
+    async def acquire_concurrency(self, user_id: str, endpoint: str, method: str) -> Tuple[bool, Optional[Lease]]:
+        """Take the request's in-flight slots: (allowed, lease to release once the response is sent)"""
         try:
-            current_time = time.time()
-            minute_key = int(current_time // 60)  # Current minute
+            limit = self.resolver.resolve(user_id, endpoint, method)
+            caps = []
+            user_cap = self.resolver.concurrency_limit(user_id)
+            if user_cap:
+                caps.append((f"{self.inflight_prefix}{{{user_id}}}", user_cap))
+            if limit.max_concurrent:
+                caps.append((f"{self.inflight_prefix}{{{user_id}}}:{limit.route}:{method}", limit.max_concurrent))
+            if not caps:
+                return True, None
             
-            # Global stats
-            global_stats_key = f"{self.stats_prefix}global:{minute_key}"
-            await self.redis.incr(f"{global_stats_key}:total")
-            if allowed:
-                await self.redis.incr(f"{global_stats_key}:allowed")
-            else:
-                await self.redis.incr(f"{global_stats_key}:blocked")
-            await self.redis.expire(f"{global_stats_key}:total", 3600)
-            await self.redis.expire(f"{global_stats_key}:allowed", 3600)
-            await self.redis.expire(f"{global_stats_key}:blocked", 3600)
-            
-            # User stats
-            user_stats_key = f"{self.stats_prefix}user:{user_id}:{minute_key}"
-            await self.redis.incr(f"{user_stats_key}:total")
-            if allowed:
-                await self.redis.incr(f"{user_stats_key}:allowed")
-            else:
-                await self.redis.incr(f"{user_stats_key}:blocked")
-            await self.redis.expire(f"{user_stats_key}:total", 3600)
-            await self.redis.expire(f"{user_stats_key}:allowed", 3600)
-            await self.redis.expire(f"{user_stats_key}:blocked", 3600)
-            
-            # Endpoint stats
-            endpoint_stats_key = f"{self.stats_prefix}endpoint:{endpoint}:{method}:{minute_key}"
-            await self.redis.incr(f"{endpoint_stats_key}:total")
-            if allowed:
-                await self.redis.incr(f"{endpoint_stats_key}:allowed")
+            lease = await self.concurrency.acquire(caps)
+            if lease is None:
+                CONCURRENCY_REJECTED_TOTAL.inc(self._route_label(limit.route), method)
+                return False, None
+            return True, lease
+            
+        except Exception as e:
+            logger.error(f"Error in concurrency check: {e}")
+            # In case of error, allow the request (fail open)
+            FAIL_OPEN_TOTAL.inc()
+            return True, None
+    
+    async def release_concurrency(self, lease: Lease):
+        """Give back the slots taken by acquire_concurrency"""
+        try:
+            await self.concurrency.release(lease)
+        except Exception as e:
+            logger.error(f"Error releasing concurrency lease: {e}")
+    
+    def has_dimensions(self) -> bool:
+        """Whether any limit beyond the per-endpoint one (dimension or plan quota) is configured"""
+        return bool(self.resolver.dimensions) or self.resolver.has_quotas
+    
+    def limit_checks(self, user_id: str, endpoint: str, method: str,
+                     tenant_id: Optional[str] = None, client_ip: Optional[str] = None,
+                     resolver: Optional[RouteResolver] = None, key_prefix: str = "") -> List[LimitCheck]:
+        """Build every limit a request is subject to: endpoint first, then plan quotas and dimensions.
+
+        `resolver` and `key_prefix` evaluate another config against its own keys (shadow mode).
+        """
+        resolver = resolver or self.resolver
+        limit = resolver.resolve(user_id, endpoint, method)
+        engine = self.engines[limit.algorithm]
+        user_prefix = f"{key_prefix}{self._user_prefix(user_id)}"
+        checks = [LimitCheck(
+            engine.key_for(f"{user_prefix}{limit.route}:{method}"),
+            limit.requests_per_minute, limit.burst_size, limit.algorithm, limit.cost, indexed=True
+        )]
+        
+        # Plan quotas: approximate sliding windows (two counters each, whatever the window length);
+        # not indexed, so resetting a user's rate limits leaves their quota usage alone
+        quota_engine = self.engines[SlidingWindowCounterEngine.name]
+        for quota in resolver.quotas(user_id):
+            checks.append(LimitCheck(
+                quota_engine.key_for(f"{user_prefix}quota:{quota.name}"),
+                quota.requests, quota.requests, SlidingWindowCounterEngine.name, limit.cost, window=quota.window
+            ))
+        
+        # The user-wide bucket lives under the user's prefix so reset_user_limits covers it
+        dimension_keys = {
+            "user": f"{user_prefix}*:*",
+            "tenant": f"{key_prefix}{self.dimension_prefix}tenant:{tenant_id}" if tenant_id else None,
+            "ip": f"{key_prefix}{self.dimension_prefix}ip:{client_ip}" if client_ip else None
+        }
+        for dimension, dimension_limit in resolver.dimensions.items():
+            key = dimension_keys[dimension]
+            if key is None:
+                continue
+            checks.append(LimitCheck(
+                self.engines[dimension_limit.algorithm].key_for(key),
+                dimension_limit.requests_per_minute, dimension_limit.burst_size,
+                dimension_limit.algorithm, resolver.dimension_costs.get(dimension, limit.cost),
+                indexed=dimension == "user"
+            ))
+        
+        return checks
+    
+    async def is_allowed_many(self, checks: List[LimitCheck], index_key: Optional[str] = None) -> bool:
+        """Admit only if every limit admits, consuming from all of them in one atomic round trip"""
+        return (await self.admit_many(checks, index_key)).allowed
+    
+    async def admit_many(self, checks: List[LimitCheck], index_key: Optional[str] = None) -> Admission:
+        """Like is_allowed_many, reporting the most restrictive limit"""
+        try:
+            if self.shared is not None:
+                return self.shared.consume_many(checks)
+            if not self.redis.available():
+                return self.fallback.consume_many(checks)
+            _, admissions = await self.multi_limit.consume_many(checks, index_key)
+            return most_restrictive(admissions)
+        except Exception as e:
+            logger.error(f"Error in multi-key rate limiting check: {e}")
+            # In case of error, allow the request (fail open)
+            FAIL_OPEN_TOTAL.inc()
+            return FAIL_OPEN
+    
+    async def is_allowed_dimensions(self, user_id: str, endpoint: str, method: str,
+                                    tenant_id: Optional[str] = None, client_ip: Optional[str] = None) -> bool:
+        """Check a request against its endpoint limit and every configured dimension at once"""
+        return (await self.admit_dimensions(user_id, endpoint, method, tenant_id, client_ip)).allowed
+    
+    async def admit_dimensions(self, user_id: str, endpoint: str, method: str,
+                               tenant_id: Optional[str] = None, client_ip: Optional[str] = None) -> Admission:
+        """Like is_allowed_dimensions, reporting the most restrictive limit"""
+        start = time.perf_counter()
+        try:
+            checks = self.limit_checks(user_id, endpoint, method, tenant_id, client_ip)
+            if self.shared is not None:
+                admission = self.shared.consume_many(checks, owner=self._user_prefix(user_id))
+            elif not self.redis.available():
+                admission = self.fallback.consume_many(checks)
             else:
-                await self.redis.incr(f"{endpoint_stats_key}:blocked")
-            await self.redis.expire(f"{endpoint_stats_key}:total", 3600)
-            await self.redis.expire(f"{endpoint_stats_key}:allowed", 3600)
-            await self.redis.expire(f"{endpoint_stats_key}:blocked", 3600)
+                _, admissions = await self.multi_limit.consume_many(checks, self._index_key(user_id))
+                admission = most_restrictive(admissions)
+            
+            route = self.resolver.resolve(user_id, endpoint, method).route
+            self._record(user_id, route, method, admission.allowed)
+            if self.shadow.active:
+                self.shadow.observe(user_id, endpoint, method, admission.allowed, tenant_id, client_ip)
+            
+            return admission
             
         except Exception as e:
-            logger.error(f"Error updating stats: {e}")
+            logger.error(f"Error in rate limiting check: {e}")
+            # In case of error, allow the request (fail open)
+            FAIL_OPEN_TOTAL.inc()
+            return FAIL_OPEN
+        finally:
+            ADMISSION_SECONDS.observe(time.perf_counter() - start)
+    
+    def get_backend_status(self) -> Dict[str, Any]:
+        """Circuit breaker state and fallback limiter counters"""
+        status = {
+            "redis_circuit": self.redis.breaker.snapshot(),
+            "fallback": {
+                "active": self.shared is None and not self.redis.available(),
+                "buckets": len(self.fallback),
+                "admitted_total": self.fallback.admitted,
+                "rejected_total": self.fallback.rejected
+            }
+        }
+        if self.shared is not None:
+            status["shared_memory"] = {
+                "path": self.shared.path,
+                "admitted_total": self.shared.admitted,
+                "rejected_total": self.shared.rejected
+            }
+        return status
+    
+    def _engine_for_key(self, bucket_key: str) -> LimiterEngine:
+        """Find the engine that owns a bucket key from its suffix"""
+        for engine in self.engines.values():
+            if engine.key_suffix and bucket_key.endswith(engine.key_suffix):
+                return engine
+        return self.engines[TokenBucketEngine.name]
+    
+    async def _read_series(self, scope: str, minutes: int) -> Tuple[str, List[Dict[str, int]]]:
+        """Counters for one stats scope over the last `minutes` minutes, newest first, in one round trip"""
+        resolution, buckets = self.stats_recorder.window(minutes)
+        rows = await self.stats_redis.hmget_many(
+            [self.stats_recorder.scope_key(scope, suffix) for _, suffix in buckets],
+            ["total", "allowed", "blocked"]
+        )
+        return resolution, [
+            {"minute": minute, "total": int(total or 0), "allowed": int(allowed or 0), "blocked": int(blocked or 0)}
+            for (minute, _), (total, allowed, blocked) in zip(buckets, rows)
+        ]
+    
+    async def _read_top(self, board: str, minutes: int, count: int) -> List[Tuple[str, int]]:
+        """Top members of a top-N board over the last `minutes` minutes"""
+        _, buckets = self.stats_recorder.window(minutes)
+        # Merging windows writes a scratch key, so this always goes to the primary
+        top = await self.redis.top_members(
+            [self.stats_recorder.top_key(board, suffix) for _, suffix in buckets],
+            count,
+            self.stats_recorder.top_key("scratch", uuid.uuid4().hex)
+        )
+        return [(member, int(score)) for member, score in top]
     
-    async def get_stats(self) -> Dict[str, Any]:
-        """Get overall statistics"""
+    async def _read_user_estimates(self, user_id: str, minutes: int) -> Tuple[str, List[Dict[str, int]]]:
+        """Like _read_series for one user, estimated from the Count-Min Sketches (sketch stats mode)"""
+        recorder = self.stats_recorder
+        resolution, buckets = recorder.window(minutes)
+        rows = await self.stats_redis.counters_many(
+            [recorder.sketch_key(board, suffix) for _, suffix in buckets for board in USER_BOARDS],
+            recorder.sketch_indexes(user_id)
+        )
+        series = []
+        for i, (minute, _) in enumerate(buckets):
+            # Each estimate is the smallest of the user's counters (never below the true count)
+            total, blocked = (min(row) for row in rows[2 * i:2 * i + 2])
+            blocked = min(blocked, total)
+            series.append({"minute": minute, "total": total, "allowed": total - blocked, "blocked": blocked})
+        return resolution, series
+    
+    @staticmethod
+    def _endpoint_entries(top: List[Tuple[str, int]], count_field: str) -> List[Dict[str, Any]]:
+        entries = []
+        for member, count in top:
+            # Members are "<METHOD> <route>"
+            method, _, endpoint = member.partition(" ")
+            entries.append({"method": method, "endpoint": endpoint, count_field: count})
+        return entries
+    
+    async def get_stats(self, minutes: int = 5, top: int = settings.STATS_TOP_SIZE) -> Dict[str, Any]:
+        """Get overall statistics for the last `minutes` minutes"""
         try:
-            current_time = time.time()
-            current_minute = int(current_time // 60)
+            current_minute = int(time.time() // 60)
+            
+            (resolution, global_stats), top_users, top_endpoints, top_offenders, top_blocked = await asyncio.gather(
+                self._read_series("global", minutes),
+                self._read_top("users", minutes, top),
+                self._read_top("endpoints", minutes, top),
+                self._read_top("blocked_users", minutes, top),
+                self._read_top("blocked_endpoints", minutes, top)
+            )
             
-            # Get stats for last 5 minutes
             stats = {
                 "current_minute": current_minute,
-                "global_stats": [],
-                "top_users": [],
-                "top_endpoints": []
+                "resolution": resolution,
+                "global_stats": global_stats,
+                # Sketch mode: user rankings and counts are heavy-hitter estimates
+                "approximate": self.stats_recorder.sketch_enabled,
+                "top_users": [{"user_id": user_id, "requests": requests} for user_id, requests in top_users],
+                "top_endpoints": self._endpoint_entries(top_endpoints, "requests"),
+                "top_offenders": [{"user_id": user_id, "blocked": blocked} for user_id, blocked in top_offenders],
+                "top_blocked_endpoints": self._endpoint_entries(top_blocked, "blocked")
             }
             
-            # Global stats for last 5 minutes
-            for i in range(5):
-                minute_key = current_minute - i
-                global_stats_key = f"{self.stats_prefix}global:{minute_key}"
-                
-                total = await self.redis.get(f"{global_stats_key}:total") or "0"
-                allowed = await self.redis.get(f"{global_stats_key}:allowed") or "0"
-                blocked = await self.redis.get(f"{global_stats_key}:blocked") or "0"
-                
-                stats["global_stats"].append({
-                    "minute": minute_key,
-                    "total": int(total),
-                    "allowed": int(allowed),
-                    "blocked": int(blocked)
-                })
-            
             return stats
             
         except Exception as e:
             logger.error(f"Error getting stats: {e}")
             return {"error": "Failed to get statistics"}
     
-    async def get_user_stats(self, user_id: str) -> Dict[str, Any]:
+    async def get_user_stats(self, user_id: str, minutes: int = 5) -> Dict[str, Any]:
         """Get statistics for a specific user"""
         try:
             current_time = time.time()
             current_minute = int(current_time // 60)
             
+            if self.stats_recorder.sketch_enabled:
+                resolution, user_stats = await self._read_user_estimates(user_id, minutes)
+            else:
+                resolution, user_stats = await self._read_series(f"user:{{{user_id}}}", minutes)
             stats = {
                 "user_id": user_id,
                 "current_minute": current_minute,
-                "user_stats": [],
+                "resolution": resolution,
+                "approximate": self.stats_recorder.sketch_enabled,
+                "user_stats": user_stats,
                 "current_buckets": {}
             }
             
-            # User stats for last 5 minutes
-            for i in range(5):
-                minute_key = current_minute - i
-                user_stats_key = f"{self.stats_prefix}user:{user_id}:{minute_key}"
-                
-                total = await self.redis.get(f"{user_stats_key}:total") or "0"
-                allowed = await self.redis.get(f"{user_stats_key}:allowed") or "0"
-                blocked = await self.redis.get(f"{user_stats_key}:blocked") or "0"
-                
-                stats["user_stats"].append({
-                    "minute": minute_key,
-                    "total": int(total),
-                    "allowed": int(allowed),
-                    "blocked": int(blocked)
-                })
-            
-            # Current token bucket states
-            bucket_pattern = f"{self.bucket_prefix}{user_id}:*"
-            bucket_keys = await self.redis.keys(bucket_pattern)
-            
-            for bucket_key in bucket_keys:
-                bucket_data = await self.redis.hgetall(bucket_key)
-                if bucket_data:
-                    endpoint_method = bucket_key.replace(f"{self.bucket_prefix}{user_id}:", "")
-                    stats["current_buckets"][endpoint_method] = {
-                        "tokens": float(bucket_data.get("tokens", 0)),
-                        "last_refill": float(bucket_data.get("last_refill", 0))
-                    }
+            # Current bucket states: the user's index, then one pipelined read for all of them
+            index_key = self._index_key(user_id)
+            bucket_keys = sorted(await self.stats_redis.smembers(index_key))
+            engines = [self._engine_for_key(bucket_key) for bucket_key in bucket_keys]
+            
+            def queue_reads(pipe):
+                for engine, bucket_key in zip(engines, bucket_keys):
+                    engine.queue_inspect(pipe, bucket_key, read_only=self.stats_redis.replica)
+            
+            replies = await self.stats_redis.execute_pipeline(queue_reads, operation="bucket_inspect") \
+                if bucket_keys else []
+            
+            expired = []
+            for engine, bucket_key, raw in zip(engines, bucket_keys, replies):
+                bucket_data = engine.parse_inspect(raw)
+                if bucket_data is None:
+                    expired.append(bucket_key)
+                    continue
+                endpoint_method = bucket_key.replace(self._user_prefix(user_id), "")
+                stats["current_buckets"][endpoint_method] = {"algorithm": engine.name, **bucket_data}
+            
+            if expired:
+                # Buckets that idled out since they were indexed
+                await self.redis.srem(index_key, *expired)
             
             return stats
             
@@ -268,11 +566,17 @@ class TokenBucketRateLimiter:
     async def reset_user_limits(self, user_id: str):
         """Reset all rate limits for a specific user"""
         try:
-            bucket_pattern = f"{self.bucket_prefix}{user_id}:*"
-            bucket_keys = await self.redis.keys(bucket_pattern)
+            index_key = self._index_key(user_id)
+            bucket_keys = await self.redis.smembers(index_key)
+            
+            # Buckets and their index go in a single DEL
+            await self.redis.delete(index_key, *bucket_keys)
             
-            for bucket_key in bucket_keys:
-                await self.redis.delete(bucket_key)
+            if self.local_cache is not None:
+                self.local_cache.invalidate_prefix(self._user_prefix(user_id))
+            self.fallback.clear_prefix(self._user_prefix(user_id))
+            if self.shared is not None:
+                self.shared.clear_owner(self._user_prefix(user_id))
             
             logger.info(f"Reset rate limits for user {user_id}")
             
@@ -282,11 +586,12 @@ class TokenBucketRateLimiter:
     async def get_remaining_tokens(self, user_id: str, endpoint: str, method: str) -> Dict[str, Any]:
         """Get remaining tokens for a specific user/endpoint combination"""
         try:
-            requests_per_minute, burst_size = self._get_rate_limit_for_endpoint(endpoint, method, user_id)
+            limit = self.resolver.resolve(user_id, endpoint, method)
+            route, requests_per_minute, burst_size = limit.route, limit.requests_per_minute, limit.burst_size
             refill_rate = requests_per_minute / 60.0
             max_tokens = burst_size
             
-            bucket_key = f"{self.bucket_prefix}{user_id}:{endpoint}:{method}"
+            bucket_key = f"{self._user_prefix(user_id)}{route}:{method}"
             current_tokens, last_refill = await self._get_token_bucket(bucket_key, max_tokens, refill_rate)
             
             # Calculate current tokens after refill
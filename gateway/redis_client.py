@@ -1,28 +1,110 @@
 import redis.asyncio as redis
+from redis.asyncio.cluster import RedisCluster, ClusterNode
+from redis.crc import key_slot
+from redis.exceptions import NoScriptError, ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
 import json
-from typing import Optional, Any, Dict
+import asyncio
+import hashlib
+import time
+from typing import Optional, Any, Dict, List, Set, Tuple, Callable, Awaitable
 import logging
 
 from config import settings
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import REDIS_COMMAND_SECONDS
 
 logger = logging.getLogger(__name__)
 
+# Errors that mean Redis is unreachable or too slow; they count against the circuit breaker.
+# Command errors (bad arguments, script errors) do not.
+UNAVAILABLE_ERRORS = (RedisConnectionError, RedisTimeoutError, asyncio.TimeoutError, OSError)
+
+# Store a value (or delete it when no value is given) and bump its version counter in one
+# atomic step; a transaction pipeline is not atomic on a cluster, a script is.
+# KEYS = value key, version key (same hash slot); ARGV = optional value
+# Returns the new version
+SET_VERSIONED_SCRIPT = """
+if #ARGV == 0 then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return redis.call('INCR', KEYS[2])
+"""
+
 class RedisClient:
-    def __init__(self):
+    def __init__(self, replica: bool = False):
         self.redis = None
         self.connected = False
+        self.cluster = settings.REDIS_CLUSTER_ENABLED
+        # Read-only client for admin views: reads go to replicas when available
+        self.replica = replica
+        # Cluster mode publishes to every node, so pub/sub uses one plain node connection
+        self.pubsub_redis = None
+        self.pool = None
+        # Stop calling Redis after repeated connection failures or timeouts
+        self.breaker = CircuitBreaker(
+            "redis-replica" if replica else "redis",
+            settings.REDIS_CIRCUIT_FAILURE_THRESHOLD,
+            settings.REDIS_CIRCUIT_RESET_TIMEOUT_MS / 1000.0
+        )
+        # Lua scripts registered by name; preloaded into the script cache on connect
+        self.scripts: Dict[str, str] = {}
+        self.script_shas: Dict[str, str] = {}
+        self.register_script("set_versioned", SET_VERSIONED_SCRIPT)
+
+    def register_script(self, name: str, source: str):
+        """Register a Lua script to be preloaded on connect and run with evalsha"""
+        self.scripts[name] = source
+        self.script_shas[name] = hashlib.sha1(source.encode("utf-8")).hexdigest()
+    
+    def _connection_options(self) -> Dict[str, Any]:
+        """Socket timeouts and health checks shared by every connection"""
+        return {
+            "password": settings.REDIS_PASSWORD,
+            "decode_responses": True,
+            "socket_timeout": settings.REDIS_SOCKET_TIMEOUT_MS / 1000.0,
+            "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT_MS / 1000.0,
+            "health_check_interval": settings.REDIS_HEALTH_CHECK_INTERVAL
+        }
     
     async def connect(self):
         """Connect to Redis"""
         try:
-            self.redis = redis.from_url(
-                f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
-                password=settings.REDIS_PASSWORD,
-                encoding="utf-8",
-                decode_responses=True
-            )
+            options = self._connection_options()
+            if self.cluster:
+                startup_nodes = [
+                    ClusterNode(host, int(port))
+                    for host, port in (node.strip().rsplit(":", 1) for node in settings.REDIS_CLUSTER_NODES.split(","))
+                ]
+                self.redis = RedisCluster(
+                    startup_nodes=startup_nodes,
+                    read_from_replicas=self.replica,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,  # per node
+                    **options
+                )
+                # Pub/sub blocks on reads, so no command timeout on its connection
+                self.pubsub_redis = redis.Redis(
+                    host=startup_nodes[0].host,
+                    port=startup_nodes[0].port,
+                    **{**options, "socket_timeout": None}
+                )
+            else:
+                host, port = settings.REDIS_HOST, settings.REDIS_PORT
+                if self.replica and settings.REDIS_REPLICA_HOST:
+                    host, port = settings.REDIS_REPLICA_HOST, settings.REDIS_REPLICA_PORT
+                # Bounded pool: callers wait up to REDIS_POOL_TIMEOUT_MS for a free connection
+                self.pool = redis.BlockingConnectionPool.from_url(
+                    f"redis://{host}:{port}/{settings.REDIS_DB}",
+                    encoding="utf-8",
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT_MS / 1000.0,
+                    **options
+                )
+                self.redis = redis.Redis(connection_pool=self.pool)
             # Test connection
             await self.redis.ping()
+            await self.load_scripts()
             self.connected = True
             logger.info("✅ Connected to Redis successfully")
         except Exception as e:
@@ -33,13 +115,71 @@ class RedisClient:
         """Disconnect from Redis"""
         if self.redis:
             await self.redis.close()
+            if self.pubsub_redis:
+                await self.pubsub_redis.close()
+            if self.pool:
+                await self.pool.disconnect()
             self.connected = False
             logger.info("✅ Disconnected from Redis")
 
+    async def load_scripts(self):
+        """Load all registered Lua scripts into the Redis script cache"""
+        for name, source in self.scripts.items():
+            self.script_shas[name] = await self.redis.script_load(source)
+            logger.info(f"Loaded Lua script '{name}' ({self.script_shas[name]})")
+
+    def available(self) -> bool:
+        """Whether Redis calls are currently being attempted (circuit not open)"""
+        return self.breaker.is_available()
+    
+    async def _execute(self, command: Callable[..., Awaitable[Any]], *args,
+                       operation: Optional[str] = None, **kwargs) -> Any:
+        """Run one Redis call through the circuit breaker.
+
+        Raises CircuitOpenError without touching the network while the circuit
+        is open; connection errors and timeouts count as failures. Latency is
+        recorded under `operation` (default: the command's name).
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuit '{self.breaker.name}' is open")
+        start = time.perf_counter()
+        try:
+            result = await command(*args, **kwargs)
+        except UNAVAILABLE_ERRORS:
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release_probe()
+            raise
+        except Exception:
+            # Redis answered (e.g. a command error), so it is reachable
+            self.breaker.record_success()
+            raise
+        finally:
+            REDIS_COMMAND_SECONDS.observe(time.perf_counter() - start, operation or command.__name__)
+        self.breaker.record_success()
+        return result
+    
+    async def evalsha(self, name: str, keys: List[str], args: List[Any]) -> Optional[Any]:
+        """Run a registered Lua script, reloading it if Redis lost its script cache"""
+        async def run():
+            try:
+                return await self.redis.evalsha(self.script_shas[name], len(keys), *keys, *args)
+            except NoScriptError:
+                # Script cache was flushed (restart, failover, SCRIPT FLUSH): reload and retry once
+                self.script_shas[name] = await self.redis.script_load(self.scripts[name])
+                return await self.redis.evalsha(self.script_shas[name], len(keys), *keys, *args)
+        
+        try:
+            return await self._execute(run, operation=f"evalsha:{name}")
+        except Exception as e:
+            logger.error(f"Redis EVALSHA error for script {name}: {e}")
+            return None
+
     async def get(self, key: str) -> Optional[str]:
         """Get value from Redis"""
         try:
-            return await self.redis.get(key)
+            return await self._execute(self.redis.get, key)
         except Exception as e:
             logger.error(f"Redis GET error for key {key}: {e}")
             return None
@@ -47,14 +187,14 @@ class RedisClient:
     async def set(self, key: str, value: str, ex: Optional[int] = None):
         """Set value in Redis with optional expiration"""
         try:
-            await self.redis.set(key, value, ex=ex)
+            await self._execute(self.redis.set, key, value, ex=ex)
         except Exception as e:
             logger.error(f"Redis SET error for key {key}: {e}")
 
     async def incr(self, key: str) -> int:
         """Increment value in Redis"""
         try:
-            return await self.redis.incr(key)
+            return await self._execute(self.redis.incr, key)
         except Exception as e:
             logger.error(f"Redis INCR error for key {key}: {e}")
             return 0
@@ -62,21 +202,21 @@ class RedisClient:
     async def expire(self, key: str, seconds: int):
         """Set expiration for a key"""
         try:
-            await self.redis.expire(key, seconds)
+            await self._execute(self.redis.expire, key, seconds)
         except Exception as e:
             logger.error(f"Redis EXPIRE error for key {key}: {e}")
 
-    async def delete(self, key: str):
-        """Delete key from Redis"""
+    async def delete(self, *keys: str):
+        """Delete one or more keys from Redis"""
         try:
-            await self.redis.delete(key)
+            await self._execute(self.redis.delete, *keys)
         except Exception as e:
-            logger.error(f"Redis DELETE error for key {key}: {e}")
+            logger.error(f"Redis DELETE error for keys {keys}: {e}")
 
     async def hget(self, name: str, key: str) -> Optional[str]:
         """Get field from Redis hash"""
         try:
-            return await self.redis.hget(name, key)
+            return await self._execute(self.redis.hget, name, key)
         except Exception as e:
             logger.error(f"Redis HGET error for hash {name}, key {key}: {e}")
             return None
@@ -84,22 +224,210 @@ class RedisClient:
     async def hset(self, name: str, key: str, value: str):
         """Set field in Redis hash"""
         try:
-            await self.redis.hset(name, key, value)
+            await self._execute(self.redis.hset, name, key, value)
         except Exception as e:
             logger.error(f"Redis HSET error for hash {name}, key {key}: {e}")
 
     async def hgetall(self, name: str) -> Dict[str, str]:
         """Get all fields from Redis hash"""
         try:
-            return await self.redis.hgetall(name)
+            return await self._execute(self.redis.hgetall, name)
         except Exception as e:
             logger.error(f"Redis HGETALL error for hash {name}: {e}")
             return {}
 
+    async def increment_many(self, hashes: Dict[str, Dict[str, int]], sorted_sets: Dict[str, Dict[str, int]],
+                             ttls: Dict[str, int], counter_arrays: Optional[Dict[str, Dict[int, int]]] = None,
+                             caps: Optional[Dict[str, int]] = None) -> bool:
+        """Apply many increments in one MULTI/EXEC, with one EXPIRE per key.
+
+        `hashes` and `sorted_sets` map keys to HINCRBY/ZINCRBY amounts per
+        field/member; `counter_arrays` map keys to amounts per index of a
+        string of uint32 counters (BITFIELD, saturating). Sorted sets listed in
+        `caps` are trimmed to their highest-scoring members afterwards.
+        """
+        counter_arrays = counter_arrays or {}
+        caps = caps or {}
+        
+        async def run():
+            async with self.pipeline(transaction=True) as pipe:
+                for name, fields in hashes.items():
+                    for field, amount in fields.items():
+                        pipe.hincrby(name, field, amount)
+                    pipe.expire(name, ttls[name])
+                for name, members in sorted_sets.items():
+                    for member, amount in members.items():
+                        pipe.zincrby(name, amount, member)
+                    if name in caps:
+                        pipe.zremrangebyrank(name, 0, -caps[name] - 1)
+                    pipe.expire(name, ttls[name])
+                for name, counters in counter_arrays.items():
+                    args = ["OVERFLOW", "SAT"]
+                    for index, amount in counters.items():
+                        args += ["INCRBY", "u32", f"#{index}", amount]
+                    pipe.execute_command("BITFIELD", name, *args)
+                    pipe.expire(name, ttls[name])
+                await pipe.execute()
+        
+        try:
+            await self._execute(run, operation="increment_many")
+            return True
+        except Exception as e:
+            logger.error(f"Redis increment batch error for {len(hashes) + len(sorted_sets) + len(counter_arrays)} keys: {e}")
+            return False
+
+    async def hmget(self, name: str, keys: List[str]) -> List[Optional[str]]:
+        """Get several fields from Redis hash"""
+        try:
+            return await self._execute(self.redis.hmget, name, keys)
+        except Exception as e:
+            logger.error(f"Redis HMGET error for hash {name}: {e}")
+            return [None] * len(keys)
+
+    async def hmget_many(self, names: List[str], keys: List[str]) -> List[List[Optional[str]]]:
+        """Get the same fields from many hashes in one pipelined round trip"""
+        async def run():
+            async with self.pipeline() as pipe:
+                for name in names:
+                    pipe.hmget(name, keys)
+                return await pipe.execute()
+        
+        try:
+            return await self._execute(run, operation="hmget_many") if names else []
+        except Exception as e:
+            logger.error(f"Redis HMGET batch error for {len(names)} hashes: {e}")
+            return [[None] * len(keys) for _ in names]
+
+    async def top_members(self, names: List[str], count: int, scratch_key: str) -> List[Tuple[str, float]]:
+        """Highest-scoring members across sorted sets, scores summed, in one round trip.
+
+        Several sets are merged with ZUNIONSTORE into `scratch_key`, which is
+        read and deleted in the same MULTI/EXEC; in cluster mode it must share
+        a hash tag with `names`.
+        """
+        async def run():
+            if len(names) == 1:
+                return await self.redis.zrevrange(names[0], 0, count - 1, withscores=True)
+            async with self.pipeline(transaction=True) as pipe:
+                pipe.zunionstore(scratch_key, names)
+                pipe.zrevrange(scratch_key, 0, count - 1, withscores=True)
+                pipe.delete(scratch_key)
+                _, top, _ = await pipe.execute()
+            return top
+        
+        try:
+            return await self._execute(run, operation="top_members") if names and count > 0 else []
+        except Exception as e:
+            logger.error(f"Redis top members error for {len(names)} sorted sets: {e}")
+            return []
+
+    async def counters_many(self, names: List[str], indexes: List[int]) -> List[List[int]]:
+        """Read the same uint32 counters (see increment_many) from many keys in one round trip"""
+        async def run():
+            args = []
+            for index in indexes:
+                args += ["GET", "u32", f"#{index}"]
+            async with self.pipeline() as pipe:
+                for name in names:
+                    pipe.execute_command("BITFIELD_RO" if self.replica else "BITFIELD", name, *args)
+                return await pipe.execute()
+        
+        try:
+            return await self._execute(run, operation="counters_many") if names else []
+        except Exception as e:
+            logger.error(f"Redis BITFIELD batch error for {len(names)} keys: {e}")
+            return [[0] * len(indexes) for _ in names]
+
+    async def zcount(self, name: str, min_score: Any, max_score: Any) -> int:
+        """Count sorted set members with scores in range"""
+        try:
+            return await self._execute(self.redis.zcount, name, min_score, max_score)
+        except Exception as e:
+            logger.error(f"Redis ZCOUNT error for key {name}: {e}")
+            return 0
+
+    async def zrem_many(self, names: List[str], member: str):
+        """Remove one member from several sorted sets in one round trip"""
+        async def run():
+            async with self.pipeline() as pipe:
+                for name in names:
+                    pipe.zrem(name, member)
+                await pipe.execute()
+
+        try:
+            await self._execute(run, operation="zrem_many")
+        except Exception as e:
+            logger.error(f"Redis ZREM error for {len(names)} keys: {e}")
+
+    async def zadd_existing_many(self, members: Dict[str, List[str]], score: float, ttl_ms: int):
+        """Set a new score on members that are still present (ZADD XX) and refresh each key's TTL"""
+        async def run():
+            async with self.pipeline() as pipe:
+                for name, names in members.items():
+                    pipe.zadd(name, {member: score for member in names}, xx=True)
+                    pipe.pexpire(name, ttl_ms)
+                await pipe.execute()
+
+        try:
+            await self._execute(run, operation="zadd_existing_many")
+        except Exception as e:
+            logger.error(f"Redis ZADD XX error for {len(members)} keys: {e}")
+
+    async def smembers(self, name: str) -> Set[str]:
+        """Get all members of a Redis set"""
+        try:
+            return await self._execute(self.redis.smembers, name)
+        except Exception as e:
+            logger.error(f"Redis SMEMBERS error for key {name}: {e}")
+            return set()
+
+    async def srem(self, name: str, *members: str):
+        """Remove members from a Redis set"""
+        try:
+            await self._execute(self.redis.srem, name, *members)
+        except Exception as e:
+            logger.error(f"Redis SREM error for key {name}: {e}")
+
+    def pipeline(self, transaction: bool = False):
+        """Create a command pipeline; errors surface from execute().
+
+        Cluster pipelines are split per node and cannot be transactional, so
+        transaction is ignored there. Run it inside _execute (or use
+        execute_pipeline) so the round trip goes through the circuit breaker.
+        """
+        if self.cluster:
+            return self.redis.pipeline()
+        return self.redis.pipeline(transaction=transaction)
+
+    async def execute_pipeline(self, queue: Callable[[Any], None], operation: str,
+                               transaction: bool = False) -> List[Any]:
+        """Queue commands with queue(pipe) and run them in one round trip through the circuit breaker.
+
+        Errors propagate to the caller, CircuitOpenError included.
+        """
+        async def run():
+            async with self.pipeline(transaction=transaction) as pipe:
+                queue(pipe)
+                return await pipe.execute()
+        
+        return await self._execute(run, operation=operation)
+
+    def pool_usage(self) -> Optional[Dict[str, int]]:
+        """Connections in use, idle and allowed in the pool; None in cluster mode (one pool per node)"""
+        if self.pool is None:
+            return None
+        in_use = len(self.pool._in_use_connections)
+        idle = len(self.pool._available_connections)
+        return {"in_use": in_use, "idle": idle, "max": self.pool.max_connections}
+
+    def key_slot(self, key: str) -> int:
+        """Cluster hash slot of a key (honours {hash tags})"""
+        return key_slot(key.encode("utf-8"))
+
     async def exists(self, key: str) -> bool:
         """Check if key exists in Redis"""
         try:
-            return await self.redis.exists(key) > 0
+            return await self._execute(self.redis.exists, key) > 0
         except Exception as e:
             logger.error(f"Redis EXISTS error for key {key}: {e}")
             return False
@@ -107,11 +435,30 @@ class RedisClient:
     async def keys(self, pattern: str = "*"):
         """Get keys matching pattern"""
         try:
-            return await self.redis.keys(pattern)
+            return await self._execute(self.redis.keys, pattern)
         except Exception as e:
             logger.error(f"Redis KEYS error for pattern {pattern}: {e}")
             return []
 
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """Get several values from Redis in one round trip"""
+        try:
+            return await self._execute(self.redis.mget, keys)
+        except Exception as e:
+            logger.error(f"Redis MGET error for keys {keys}: {e}")
+            return [None] * len(keys)
+
+    async def publish(self, channel: str, message: str):
+        """Publish a message on a pub/sub channel"""
+        try:
+            await self._execute(self.redis.publish, channel, message)
+        except Exception as e:
+            logger.error(f"Redis PUBLISH error for channel {channel}: {e}")
+
+    def pubsub(self):
+        """Create a pub/sub handle on the underlying connection pool"""
+        return (self.pubsub_redis or self.redis).pubsub()
+
     async def get_json(self, key: str) -> Optional[Dict[str, Any]]:
         """Get JSON value from Redis"""
         try:
@@ -131,6 +478,17 @@ class RedisClient:
         except Exception as e:
             logger.error(f"Redis SET_JSON error for key {key}: {e}")
 
+    async def set_json_versioned(self, key: str, version_key: str,
+                                 value: Optional[Dict[str, Any]]) -> Optional[int]:
+        """Store a JSON value (None deletes it) and bump its version counter atomically; returns the new version.
+
+        Both keys must share a hash slot (e.g. `x` and `{x}:version`) on a cluster.
+        """
+        version = await self.evalsha(
+            "set_versioned", [key, version_key], [] if value is None else [json.dumps(value)]
+        )
+        return int(version) if version is not None else None
+
     def is_connected(self) -> bool:
         """Check if Redis is connected"""
         return self.connected
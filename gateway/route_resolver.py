@@ -0,0 +1,303 @@
+from functools import lru_cache
+from typing import Dict, Any, NamedTuple, Optional, Tuple
+
+from engines import ENGINES, DEFAULT_ENGINE
+
+# Limit dimensions that can be configured under `global_limits`, checked together
+# with the endpoint limit: per user across all endpoints, per tenant claim, per client IP
+DIMENSIONS = ("user", "tenant", "ip")
+
+# Quota windows a tier may set, in seconds
+QUOTA_WINDOWS = {"minute": 60, "hour": 3600, "day": 86400}
+
+class Limit(NamedTuple):
+    requests_per_minute: int
+    burst_size: int
+    algorithm: str
+    cost: int = 1  # tokens consumed per request
+    max_concurrent: int = 0  # requests a user may have in flight on the route (0 = no cap)
+
+class Resolution(NamedTuple):
+    route: str  # matched path pattern, or the request path when the default applies
+    requests_per_minute: int
+    burst_size: int
+    algorithm: str
+    cost: int
+    max_concurrent: int
+
+class Quota(NamedTuple):
+    name: str  # window name from QUOTA_WINDOWS
+    window: int  # seconds
+    requests: int  # tokens allowed per window
+
+class Tier(NamedTuple):
+    quotas: Tuple[Quota, ...]  # shortest window first
+    costs: Dict[Tuple[str, str], int]  # (route, method) -> tokens per request on this plan
+
+class _RouteNode:
+    """One path segment in the route trie"""
+    __slots__ = ("children", "param", "methods", "wildcard_methods", "route", "wildcard_route")
+
+    def __init__(self):
+        self.children: Dict[str, "_RouteNode"] = {}
+        self.param: Optional["_RouteNode"] = None  # `{name}` segment, matches any single segment
+        self.methods: Optional[Dict[str, Limit]] = None  # rule ending exactly here
+        self.wildcard_methods: Optional[Dict[str, Limit]] = None  # `.../*` rule below here
+        self.route: Optional[str] = None
+        self.wildcard_route: Optional[str] = None
+
+def _split(path: str):
+    return [segment for segment in path.split("/") if segment]
+
+class RouteResolver:
+    """Immutable lookup structure compiled from a rate limit configuration.
+
+    Endpoint keys in the config may be exact paths (`/api/users`), templates
+    with `{param}` segments (`/api/users/{id}`) or prefix wildcards
+    (`/api/admin/*`). Matching prefers exact paths, then the most specific
+    template (literal segments win over parameters), then the longest
+    wildcard prefix. User overrides still take precedence over everything.
+
+    Each rule may name its `algorithm` (see engines.ENGINES); rules without one
+    use the config's `default_algorithm`, and user overrides without one keep
+    the algorithm of the route they hit. Rules may also set a `cost` in tokens
+    per request for expensive endpoints (default 1). A user override's `cost`
+    applies on every route that user hits; a `global_limits` dimension with
+    its own `cost` is charged that instead of the endpoint's.
+
+    In-flight caps: endpoint rules may set `max_concurrent`, the requests one
+    user may have in progress on that route at once; `default_max_concurrent`
+    and a user override's `max_concurrent` cap a user's requests in flight
+    across all routes. Absent or 0 means no cap.
+
+    Plans: `tiers` maps a plan name to its `quotas` (requests per `minute`,
+    `hour` and/or `day`; a longer window may not allow less than a shorter
+    one) and optional per-endpoint `costs` (`{route: {method: tokens}}`) that
+    replace the rule's cost for the plan's users. Users are assigned with
+    `user_tiers`; everyone else is on `default_tier`, if set.
+    """
+
+    def __init__(self, config: Dict[str, Any], cache_size: int = 10000):
+        self.default_limit = Limit(
+            self._rate(config["default_requests_per_minute"]),
+            config.get("default_burst_size", 10),
+            self._algorithm(config.get("default_algorithm", DEFAULT_ENGINE))
+        )
+        # Overrides without an explicit algorithm or cost inherit the route's (None)
+        self.user_limits: Dict[str, Tuple[int, int, Optional[str], Optional[int]]] = {
+            user_id: (
+                *self._limit(user_config)[:2],
+                self._algorithm(user_config["algorithm"]) if "algorithm" in user_config else None,
+                self._cost(user_config["cost"]) if "cost" in user_config else None
+            )
+            for user_id, user_config in config.get("user_overrides", {}).items()
+        }
+        # Per-user cap on requests in flight across all routes
+        self.default_concurrency = self._concurrency(config.get("default_max_concurrent", 0))
+        self.user_concurrency: Dict[str, int] = {
+            user_id: self._concurrency(user_config["max_concurrent"])
+            for user_id, user_config in config.get("user_overrides", {}).items()
+            if "max_concurrent" in user_config
+        }
+        self.tiers: Dict[str, Tier] = {
+            name: self._tier(name, tier_config) for name, tier_config in config.get("tiers", {}).items()
+        }
+        self.default_tier = self._tier_name(config.get("default_tier"))
+        self.user_tiers: Dict[str, str] = {
+            user_id: self._tier_name(tier) for user_id, tier in config.get("user_tiers", {}).items()
+        }
+        self.has_quotas = any(tier.quotas for tier in self.tiers.values())
+        self.dimensions: Dict[str, Limit] = {}
+        # Dimensions with their own `cost`; the others charge what the endpoint does
+        self.dimension_costs: Dict[str, int] = {}
+        for dimension, limit_config in config.get("global_limits", {}).items():
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown limit dimension: {dimension}")
+            self.dimensions[dimension] = self._limit(limit_config)
+            if "cost" in limit_config:
+                self.dimension_costs[dimension] = self.dimensions[dimension].cost
+        self.exact: Dict[str, Dict[str, Limit]] = {}
+        self.root = _RouteNode()
+        # Configured route patterns; anything else resolved to the default limit
+        self.routes = frozenset(config.get("endpoints", {}))
+
+        # Whether any in-flight cap is configured; if not, requests skip that check entirely
+        self.has_concurrency_limits = bool(self.default_concurrency or any(self.user_concurrency.values()))
+
+        for endpoint, methods in config.get("endpoints", {}).items():
+            compiled = {method: self._limit(method_config) for method, method_config in methods.items()}
+            if "{" not in endpoint and not endpoint.endswith("*"):
+                self.exact[endpoint] = compiled
+            self._insert(endpoint, compiled)
+            if any(limit.max_concurrent for limit in compiled.values()):
+                self.has_concurrency_limits = True
+
+        # Memoize per (path, method); rebuilt together with the resolver on config changes
+        self._resolve_route = lru_cache(maxsize=cache_size)(self._match)
+
+    def _algorithm(self, name: str) -> str:
+        if name not in ENGINES:
+            raise ValueError(f"Unknown rate limit algorithm: {name}")
+        return name
+
+    @staticmethod
+    def _concurrency(value: Any) -> int:
+        cap = int(value or 0)
+        if cap < 0:
+            raise ValueError(f"max_concurrent cannot be negative, got {cap}")
+        return cap
+
+    @staticmethod
+    def _rate(value: Any) -> int:
+        # GCRA spaces requests 60 / requests_per_minute seconds apart
+        rate = int(value)
+        if rate < 1:
+            raise ValueError(f"requests_per_minute must be at least 1, got {rate}")
+        return rate
+
+    @staticmethod
+    def _cost(value: Any) -> int:
+        cost = int(value)
+        if cost < 1:
+            raise ValueError(f"Request cost must be at least 1, got {cost}")
+        return cost
+
+    def _limit(self, limit_config: Dict[str, Any]) -> Limit:
+        return Limit(
+            self._rate(limit_config.get("requests_per_minute", self.default_limit.requests_per_minute)),
+            limit_config.get("burst_size", self.default_limit.burst_size),
+            self._algorithm(limit_config.get("algorithm", self.default_limit.algorithm)),
+            self._cost(limit_config.get("cost", 1)),
+            self._concurrency(limit_config.get("max_concurrent", 0))
+        )
+
+    def _tier(self, name: str, tier_config: Dict[str, Any]) -> Tier:
+        quotas = []
+        for window_name, requests in tier_config.get("quotas", {}).items():
+            if window_name not in QUOTA_WINDOWS:
+                raise ValueError(f"Unknown quota window in tier {name}: {window_name}")
+            if int(requests) < 1:
+                raise ValueError(f"Tier {name} {window_name} quota must be at least 1, got {requests}")
+            quotas.append(Quota(window_name, QUOTA_WINDOWS[window_name], int(requests)))
+        quotas.sort(key=lambda quota: quota.window)
+        # Nested windows: a smaller long-window quota would make the shorter one unreachable
+        for shorter, longer in zip(quotas, quotas[1:]):
+            if longer.requests < shorter.requests:
+                raise ValueError(
+                    f"Tier {name} {longer.name} quota ({longer.requests}) is below its {shorter.name} quota ({shorter.requests})"
+                )
+        costs = {
+            (route, method): self._cost(cost)
+            for route, methods in tier_config.get("costs", {}).items()
+            for method, cost in methods.items()
+        }
+        return Tier(tuple(quotas), costs)
+
+    def _tier_name(self, name: Optional[str]) -> Optional[str]:
+        if name is not None and name not in self.tiers:
+            raise ValueError(f"Unknown tier: {name}")
+        return name
+
+    def _insert(self, endpoint: str, methods: Dict[str, Limit]):
+        segments = _split(endpoint)
+        wildcard = bool(segments) and segments[-1] == "*"
+        if wildcard:
+            segments = segments[:-1]
+
+        node = self.root
+        for segment in segments:
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _RouteNode())
+
+        if wildcard:
+            node.wildcard_methods = methods
+            node.wildcard_route = endpoint
+        else:
+            node.methods = methods
+            node.route = endpoint
+
+    def _search(self, node: _RouteNode, segments, index: int, method: str) -> Optional[Tuple[str, Limit]]:
+        """Depth-first search for a full template match, preferring literal segments over parameters"""
+        if index == len(segments):
+            if node.methods is not None and method in node.methods:
+                return node.route, node.methods[method]
+            return None
+
+        child = node.children.get(segments[index])
+        if child is not None:
+            found = self._search(child, segments, index + 1, method)
+            if found is not None:
+                return found
+        if node.param is not None:
+            return self._search(node.param, segments, index + 1, method)
+        return None
+
+    def _search_wildcard(self, node: _RouteNode, segments, index: int,
+                         method: str) -> Optional[Tuple[int, str, Limit]]:
+        """Deepest wildcard prefix covering the path, as (depth, route, limit); literals win ties"""
+        best = None
+        if index == len(segments):
+            return best
+        if node.wildcard_methods is not None and method in node.wildcard_methods:
+            best = (index, node.wildcard_route, node.wildcard_methods[method])
+        for child in (node.children.get(segments[index]), node.param):
+            if child is not None:
+                found = self._search_wildcard(child, segments, index + 1, method)
+                if found is not None and (best is None or found[0] > best[0]):
+                    best = found
+        return best
+
+    def _match(self, path: str, method: str) -> Resolution:
+        exact = self.exact.get(path)
+        if exact is not None and method in exact:
+            return Resolution(path, *exact[method])
+
+        # Any exact or template match beats every wildcard
+        segments = _split(path)
+        found = self._search(self.root, segments, 0, method)
+        if found is not None:
+            route, limit = found
+            return Resolution(route, *limit)
+        wildcard = self._search_wildcard(self.root, segments, 0, method)
+        if wildcard is not None:
+            _, route, limit = wildcard
+            return Resolution(route, *limit)
+
+        return Resolution(path, *self.default_limit)
+
+    def resolve(self, user_id: str, path: str, method: str) -> Resolution:
+        """Resolve the route, limits and algorithm for a request"""
+        resolution = self._resolve_route(path, method)
+        tier = self.tier_for(user_id)
+        if tier is not None and tier.costs:
+            cost = tier.costs.get((resolution.route, method))
+            if cost is not None:
+                resolution = resolution._replace(cost=cost)
+        user_limit = self.user_limits.get(user_id)
+        if user_limit is not None:
+            requests_per_minute, burst_size, algorithm, cost = user_limit
+            return resolution._replace(
+                requests_per_minute=requests_per_minute,
+                burst_size=burst_size,
+                algorithm=algorithm or resolution.algorithm,
+                cost=cost or resolution.cost
+            )
+        return resolution
+
+    def tier_for(self, user_id: str) -> Optional[Tier]:
+        """The user's plan, if they have one"""
+        name = self.user_tiers.get(user_id, self.default_tier)
+        return self.tiers[name] if name is not None else None
+
+    def quotas(self, user_id: str) -> Tuple[Quota, ...]:
+        """The user's plan quotas, shortest window first (empty without a plan)"""
+        tier = self.tier_for(user_id)
+        return tier.quotas if tier is not None else ()
+
+    def concurrency_limit(self, user_id: str) -> int:
+        """Cap on a user's requests in flight across all routes (0 = none)"""
+        return self.user_concurrency.get(user_id, self.default_concurrency)
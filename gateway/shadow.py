@@ -0,0 +1,223 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+from redis_client import RedisClient
+from route_resolver import RouteResolver
+from engines import LimitCheck, MultiLimitEvaluator
+
+logger = logging.getLogger(__name__)
+
+# Decisions where the candidate config disagrees with the live one
+DIFFERENCES = ("would_block", "would_allow")
+
+class ShadowEvaluator:
+    """Evaluates a candidate rate limit config on live traffic without affecting admission.
+
+    The live limiter hands every decided request to observe(), which only puts
+    it on a bounded queue (a full queue drops the request and counts it), so the
+    request path pays one put_nowait. Background workers replay the queued
+    requests against the candidate config, with separate buckets under
+    `shadow:`, and count per endpoint and per user how often the decision would
+    differ: `would_block` (admitted now, rejected by the candidate) and
+    `would_allow` (the reverse). Requests are evaluated when dequeued, so a
+    backlog shifts the candidate buckets' refill timing slightly.
+
+    Counts are buffered and flushed to Redis under the run id
+    (`shadow:{<run>}:<outcome>` hashes per endpoint, `shadow:{<run>}:users:<outcome>`
+    sorted sets per user), so a report covers every gateway worker.
+    """
+
+    def __init__(self, redis_client: RedisClient, multi_limit: MultiLimitEvaluator,
+                 limit_checks: Callable[..., List[LimitCheck]]):
+        self.redis = redis_client
+        self.multi_limit = multi_limit
+        self.limit_checks = limit_checks
+        self.key_prefix = "shadow:"
+        self.worker_count = settings.SHADOW_WORKERS
+        self.flush_interval = settings.SHADOW_FLUSH_INTERVAL_MS / 1000.0
+        self.report_ttl = settings.SHADOW_REPORT_TTL_SECONDS
+        self.top_users = settings.SHADOW_TOP_USERS
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SHADOW_QUEUE_SIZE)
+        self.run_id: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.resolver: Optional[RouteResolver] = None
+        self.last_run: Optional[Tuple[str, float]] = None  # (id, started_at) of the latest run, kept after it stops
+        # (run, outcome, "<method> <route>") -> requests; outcome is "evaluated" or a difference
+        self.pending: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        # (run, difference, user) -> requests
+        self.pending_users: Dict[Tuple[str, str, str], int] = defaultdict(int)
+        self.pending_dropped: Dict[str, int] = defaultdict(int)
+        self.dropped = 0
+        self._tasks: List[asyncio.Task] = []
+        self._running = False
+
+    @property
+    def active(self) -> bool:
+        return self.resolver is not None
+
+    def apply(self, run: Optional[Dict[str, Any]]):
+        """Switch to a shadow run ({"id", "started_at", "config"}), or stop shadowing (None)"""
+        if run is None:
+            self.resolver = self.run_id = self.started_at = None
+            logger.info("Shadow evaluation stopped")
+            return
+        # Compile first so a bad candidate leaves the current run in place
+        resolver = RouteResolver(run["config"], settings.ROUTE_CACHE_SIZE)
+        self.resolver, self.run_id, self.started_at = resolver, run["id"], run["started_at"]
+        self.last_run = (self.run_id, self.started_at)
+        logger.info(f"Shadow evaluation {self.run_id} started")
+
+    def observe(self, user_id: str, endpoint: str, method: str, live_allowed: bool,
+                tenant_id: Optional[str] = None, client_ip: Optional[str] = None):
+        """Queue a live decision for evaluation under the candidate config (no I/O)"""
+        try:
+            self.queue.put_nowait((self.run_id, user_id, endpoint, method, tenant_id, client_ip, live_allowed))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.pending_dropped[self.run_id] += 1
+
+    def report_key(self, run_id: str, name: str) -> str:
+        return f"{self.key_prefix}{{{run_id}}}:{name}"
+
+    async def _evaluate(self, run_id: str, user_id: str, endpoint: str, method: str,
+                        tenant_id: Optional[str], client_ip: Optional[str], live_allowed: bool):
+        resolver = self.resolver
+        if run_id != self.run_id or resolver is None or not self.redis.available():
+            # Queued under a run that has since ended, or Redis is down
+            return
+        checks = self.limit_checks(user_id, endpoint, method, tenant_id, client_ip,
+                                   resolver=resolver, key_prefix=self.key_prefix)
+        allowed, _ = await self.multi_limit.consume_many(checks)
+
+        route = resolver.resolve(user_id, endpoint, method).route
+        label = f"{method} {route if route in resolver.routes else 'other'}"
+        self.pending[(run_id, "evaluated", label)] += 1
+        if allowed != live_allowed:
+            difference = "would_allow" if allowed else "would_block"
+            self.pending[(run_id, difference, label)] += 1
+            self.pending_users[(run_id, difference, user_id)] += 1
+
+    async def _work(self):
+        # Also checked between items: some clients swallow a cancellation that lands mid-command
+        while self._running:
+            item = await self.queue.get()
+            try:
+                await self._evaluate(*item)
+            except Exception as e:
+                logger.error(f"Shadow evaluation error: {e}")
+
+    async def flush(self):
+        """Write the buffered counts to Redis in one transaction"""
+        if not self.pending and not self.pending_dropped:
+            return
+
+        pending, self.pending = self.pending, defaultdict(int)
+        pending_users, self.pending_users = self.pending_users, defaultdict(int)
+        pending_dropped, self.pending_dropped = self.pending_dropped, defaultdict(int)
+
+        hashes: Dict[str, Dict[str, int]] = {}
+        sorted_sets: Dict[str, Dict[str, int]] = {}
+        caps: Dict[str, int] = {}
+        ttls: Dict[str, int] = {}
+        for (run_id, outcome, label), count in pending.items():
+            key = self.report_key(run_id, outcome)
+            hashes.setdefault(key, {})[label] = count
+            ttls[key] = self.report_ttl
+        for (run_id, difference, user_id), count in pending_users.items():
+            key = self.report_key(run_id, f"users:{difference}")
+            sorted_sets.setdefault(key, {})[user_id] = count
+            caps[key] = self.top_users
+            ttls[key] = self.report_ttl
+        for run_id, count in pending_dropped.items():
+            if run_id is not None:
+                key = self.report_key(run_id, "dropped")
+                hashes.setdefault(key, {})["requests"] = count
+                ttls[key] = self.report_ttl
+
+        if not await self.redis.increment_many(hashes, sorted_sets, ttls, caps=caps):
+            # Keep the counts for the next flush rather than dropping them
+            for key, count in pending.items():
+                self.pending[key] += count
+            for key, count in pending_users.items():
+                self.pending_users[key] += count
+            for key, count in pending_dropped.items():
+                self.pending_dropped[key] += count
+
+    async def _run_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing shadow counts: {e}")
+
+    async def report(self, top: int = 20) -> Dict[str, Any]:
+        """Differences found by the current (or last) run, per endpoint and for the top users"""
+        if self.last_run is None:
+            return {"active": False}
+        run_id, started_at = self.last_run
+
+        def queue_reads(pipe):
+            for outcome in ("evaluated", *DIFFERENCES):
+                pipe.hgetall(self.report_key(run_id, outcome))
+            pipe.hget(self.report_key(run_id, "dropped"), "requests")
+            for difference in DIFFERENCES:
+                pipe.zrevrange(self.report_key(run_id, f"users:{difference}"), 0, top - 1, withscores=True)
+
+        try:
+            evaluated, would_block, would_allow, dropped, *top_users = await self.redis.execute_pipeline(
+                queue_reads, operation="shadow_report"
+            )
+        except Exception as e:
+            logger.error(f"Error reading shadow report {run_id}: {e}")
+            return {"error": f"Failed to read shadow report {run_id}"}
+
+        endpoints = [
+            {
+                "endpoint": label,
+                "evaluated": int(count),
+                "would_block": int(would_block.get(label, 0)),
+                "would_allow": int(would_allow.get(label, 0))
+            }
+            for label, count in evaluated.items()
+        ]
+        endpoints.sort(key=lambda entry: entry["would_block"] + entry["would_allow"], reverse=True)
+        return {
+            "active": run_id == self.run_id,
+            "id": run_id,
+            "started_at": started_at,
+            "totals": {
+                "evaluated": sum(entry["evaluated"] for entry in endpoints),
+                "would_block": sum(entry["would_block"] for entry in endpoints),
+                "would_allow": sum(entry["would_allow"] for entry in endpoints),
+                "dropped": int(dropped or 0)
+            },
+            "endpoints": endpoints,
+            **{
+                f"top_users_{difference}": [{"user_id": user_id, "requests": int(count)} for user_id, count in users]
+                for difference, users in zip(DIFFERENCES, top_users)
+            }
+        }
+
+    async def start(self):
+        """Start the evaluation workers and the flush task"""
+        if not self._tasks:
+            self._running = True
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+            self._tasks.append(asyncio.create_task(self._run_flush()))
+
+    async def stop(self):
+        """Stop the background tasks and write out the buffered counts"""
+        self._running = False
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await self.flush()
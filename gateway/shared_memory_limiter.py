@@ -0,0 +1,172 @@
+import os
+import mmap
+import time
+import fcntl
+import struct
+import hashlib
+import logging
+from contextlib import contextmanager
+from typing import Callable, Optional, Sequence, Tuple
+
+from engines import LimitCheck, Admission, bucket_admission, most_restrictive, refill_per_minute
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x47574C4D31  # "GWLM1"
+HEADER = struct.Struct("<QII")  # magic, stripes, slots per stripe
+HEADER_SIZE = 64
+# key fingerprint, owner fingerprint, tokens, last refill, time the bucket is full again
+SLOT = struct.Struct("<QQddd")
+# Probe window within a stripe before evicting the stalest slot
+MAX_PROBE = 16
+
+def fingerprint(value: str) -> int:
+    """Stable non-zero 64-bit hash (0 marks an empty slot)"""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+class SharedMemoryRateLimiter:
+    """Token buckets in a memory-mapped file shared by every worker process on the host.
+
+    The file holds a fixed-size open-addressing hash table split into stripes;
+    a key hashes to one stripe and probes linearly within it. Each stripe has a
+    POSIX byte-range lock (fcntl) on the same file, held for the whole
+    read-modify-write, so workers never need a network round trip to agree on
+    limits. Slots whose bucket has refilled completely are free for reuse; when
+    a probe window is full the slot that refilled longest ago is evicted.
+
+    Like the fallback limiter, every algorithm is enforced as a token bucket.
+    Locks are per process, which matches the one event loop thread per worker.
+    """
+
+    def __init__(self, path: str, slots: int, stripes: int, clock: Callable[[], float] = time.time):
+        self.stripes = stripes
+        self.clock = clock
+        self.slots_per_stripe = max(1, slots // stripes)
+        self.path = path
+        table_size = HEADER_SIZE + SLOT.size * self.stripes * self.slots_per_stripe
+        # Lock bytes live past the table, so stripe locks never cover slot data
+        self.lock_base = table_size
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked(self.lock_base + self.stripes):  # initialization lock
+            if os.fstat(self.fd).st_size < table_size:
+                os.ftruncate(self.fd, table_size)
+            self.map = mmap.mmap(self.fd, table_size)
+            magic, stripes_found, slots_found = HEADER.unpack_from(self.map, 0)
+            if (magic, stripes_found, slots_found) != (MAGIC, self.stripes, self.slots_per_stripe):
+                # New file or a different layout: start from empty buckets
+                if magic == MAGIC:
+                    logger.warning(f"Resetting shared limiter table {path}: layout changed")
+                self.map[:] = bytes(table_size)
+                HEADER.pack_into(self.map, 0, MAGIC, self.stripes, self.slots_per_stripe)
+        self.admitted = 0
+        self.rejected = 0
+
+    @contextmanager
+    def _locked(self, offset: int):
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, offset)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, offset)
+
+    def _slot_offset(self, stripe: int, index: int) -> int:
+        return HEADER_SIZE + SLOT.size * (stripe * self.slots_per_stripe + index)
+
+    def _find(self, key_hash: int, now: float) -> Tuple[int, bool]:
+        """Offset of the key's slot in its (locked) stripe and whether it was just claimed.
+
+        Absent keys claim an empty slot, one whose bucket is back at full
+        capacity (the same as absent), or else the stalest slot in the window.
+        """
+        stripe = key_hash % self.stripes
+        home = (key_hash // self.stripes) % self.slots_per_stripe
+        free, victim, victim_full_at = None, None, None
+        # Scan the whole window: the key may sit past a slot that became free after it was placed
+        for probe in range(min(MAX_PROBE, self.slots_per_stripe)):
+            offset = self._slot_offset(stripe, (home + probe) % self.slots_per_stripe)
+            slot_hash, _, _, _, full_at = SLOT.unpack_from(self.map, offset)
+            if slot_hash == key_hash:
+                return offset, False
+            if slot_hash == 0:
+                # Keys are never removed from the middle of a window, so nothing lies beyond an empty slot
+                return self._claim(free if free is not None else offset, key_hash), True
+            if free is None and full_at <= now:
+                free = offset
+            elif victim is None or full_at < victim_full_at:
+                victim, victim_full_at = offset, full_at
+        return self._claim(free if free is not None else victim, key_hash), True
+
+    def _claim(self, offset: int, key_hash: int) -> int:
+        # A claimed slot is never reusable until written back (full_at = inf)
+        SLOT.pack_into(self.map, offset, key_hash, 0, 0.0, 0.0, float("inf"))
+        return offset
+
+    def consume(self, key: str, requests_per_minute: int, burst_size: int, cost: int = 1,
+                owner: Optional[str] = None) -> Admission:
+        """Try to admit a request of the given cost"""
+        return self.consume_many([LimitCheck(key, requests_per_minute, burst_size, "", cost, indexed=True)], owner)
+
+    def consume_many(self, checks: Sequence[LimitCheck], owner: Optional[str] = None) -> Admission:
+        """Admit only if every check has enough tokens; reports the most restrictive check.
+
+        `owner` (e.g. the user's key prefix) tags the checks marked `indexed` so
+        clear_owner can reset them later without storing key names.
+        """
+        hashes = [fingerprint(check.key) for check in checks]
+        owner_hash = fingerprint(owner) if owner else 0
+        stripes = sorted({key_hash % self.stripes for key_hash in hashes})
+        # Always lock stripes in ascending order so concurrent multi-key checks cannot deadlock
+        for stripe in stripes:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.lock_base + stripe)
+        try:
+            now = self.clock()
+            slots = []
+            for check, key_hash in zip(checks, hashes):
+                offset, fresh = self._find(key_hash, now)
+                _, _, tokens, last_refill, _ = SLOT.unpack_from(self.map, offset)
+                if fresh:
+                    tokens = float(check.burst_size)
+                else:
+                    tokens = min(float(check.burst_size),
+                                 tokens + (now - last_refill) * refill_per_minute(check) / 60.0)
+                slots.append((offset, key_hash, tokens))
+
+            allowed = all(tokens >= check.cost for (_, _, tokens), check in zip(slots, checks))
+            admissions = []
+            for (offset, key_hash, tokens), check in zip(slots, checks):
+                if allowed:
+                    tokens -= check.cost
+                rate = refill_per_minute(check) / 60.0
+                full_at = now + (check.burst_size - tokens) / rate if rate > 0 else float("inf")
+                SLOT.pack_into(self.map, offset, key_hash, owner_hash if check.indexed else 0, tokens, now, full_at)
+                admissions.append(bucket_admission(allowed or tokens >= check.cost, tokens,
+                                                   refill_per_minute(check), check.burst_size, check.cost))
+        finally:
+            for stripe in reversed(stripes):
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.lock_base + stripe)
+
+        if allowed:
+            self.admitted += 1
+        else:
+            self.rejected += 1
+        return most_restrictive(admissions)
+
+    def clear_owner(self, owner: str) -> int:
+        """Drop every bucket tagged with `owner`; returns how many were dropped"""
+        owner_hash = fingerprint(owner)
+        cleared = 0
+        for stripe in range(self.stripes):
+            with self._locked(self.lock_base + stripe):
+                for index in range(self.slots_per_stripe):
+                    offset = self._slot_offset(stripe, index)
+                    slot_hash, slot_owner, _, _, _ = SLOT.unpack_from(self.map, offset)
+                    if slot_owner == owner_hash:
+                        # Refilled and free for reuse, but left in place so probe windows stay intact
+                        SLOT.pack_into(self.map, offset, slot_hash, 0, float("inf"), 0.0, 0.0)
+                        cleared += 1
+        return cleared
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
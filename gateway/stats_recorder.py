@@ -0,0 +1,249 @@
+import time
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Tuple, Optional
+import logging
+
+from config import settings
+from redis_client import RedisClient
+from heavy_hitters import CountMinSketch, SpaceSaving, sketch_indexes
+
+logger = logging.getLogger(__name__)
+
+class _SketchPair(NamedTuple):
+    sketch: CountMinSketch
+    top: SpaceSaving
+
+    def add(self, user_id: str):
+        self.sketch.add(user_id)
+        self.top.add(user_id)
+
+# Top-N boards: request totals and blocked requests, per user and per endpoint
+USER_BOARDS = ("users", "blocked_users")
+ENDPOINT_BOARDS = ("endpoints", "blocked_endpoints")
+
+class StatsRecorder:
+    """Buffers per-minute request counters in memory and flushes them to Redis in batches.
+
+    Counts are keyed by (scope, minute, outcome) where scope is `global`,
+    `user:{user_id}` or `endpoint:{endpoint}:{method}` and outcome is one of
+    `total`, `allowed` or `blocked`. Each (scope, minute) pair maps to one Redis
+    hash `stats:{scope}:{minute}` with one field per outcome, and is also
+    added to the hourly rollup `stats:{scope}:h{hour}`, kept for longer.
+
+    Request totals and blocked requests per user and per endpoint are also
+    added to the sorted sets `stats:{top}:<board>:<bucket>` (see USER_BOARDS
+    and ENDPOINT_BOARDS; bucket being `<minute>` or `h<hour>`), so top-N lists
+    need no scan. They share one hash tag so any window of them can be merged
+    in one cluster slot.
+
+    With STATS_SKETCH_ENABLED nothing is stored per user: user boards are fed
+    from a Space-Saving top-K per flush and capped at STATS_SKETCH_TOP_K
+    members, and per-user counts go to Count-Min Sketches
+    `stats:cms:<board>:<bucket>` (uint32 counters in one string), so Redis
+    memory no longer grows with the number of users.
+    """
+
+    def __init__(self, redis_client: RedisClient, prefix: str = "stats:"):
+        self.redis = redis_client
+        self.prefix = prefix
+        self.top_prefix = f"{prefix}{{top}}:"
+        self.sketch_prefix = f"{prefix}cms:"
+        self.flush_interval = settings.STATS_FLUSH_INTERVAL_MS / 1000.0
+        self.max_pending = settings.STATS_FLUSH_MAX_PENDING
+        self.max_retained = settings.STATS_MAX_RETAINED
+        self.ttl = settings.STATS_TTL_SECONDS
+        self.rollup_ttl = settings.STATS_ROLLUP_TTL_SECONDS
+        self.sketch_enabled = settings.STATS_SKETCH_ENABLED
+        self.sketch_width = settings.STATS_SKETCH_WIDTH
+        self.sketch_depth = settings.STATS_SKETCH_DEPTH
+        self.top_k = settings.STATS_SKETCH_TOP_K
+        self.pending: Dict[Tuple[str, int, str], int] = defaultdict(int)
+        # (board, member, minute) -> requests, for the top-N sorted sets
+        self.pending_top: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        # Sketch mode: (board, minute) -> per-user summaries since the last flush
+        self.pending_sketches: Dict[Tuple[str, int], Tuple[CountMinSketch, SpaceSaving]] = {}
+        self.dropped = 0  # pending entries discarded after failed flushes
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, user_id: str, endpoint: str, method: str, allowed: bool):
+        """Count one admission decision (no I/O)"""
+        minute = int(time.time() // 60)
+        outcome = "allowed" if allowed else "blocked"
+        scopes = ("global", f"endpoint:{endpoint}:{method}") if self.sketch_enabled else \
+            ("global", f"user:{{{user_id}}}", f"endpoint:{endpoint}:{method}")
+        for scope in scopes:
+            self.pending[(scope, minute, "total")] += 1
+            self.pending[(scope, minute, outcome)] += 1
+
+        boards = ("users",) if allowed else USER_BOARDS
+        if self.sketch_enabled:
+            for board in boards:
+                self._sketch(board, minute).add(user_id)
+        else:
+            for board in boards:
+                self.pending_top[(board, user_id, minute)] += 1
+        route = f"{method} {endpoint}"
+        for board in (("endpoints",) if allowed else ENDPOINT_BOARDS):
+            self.pending_top[(board, route, minute)] += 1
+
+        if len(self.pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _sketch(self, board: str, minute: int) -> "_SketchPair":
+        pair = self.pending_sketches.get((board, minute))
+        if pair is None:
+            pair = self.pending_sketches[(board, minute)] = _SketchPair(
+                CountMinSketch(self.sketch_width, self.sketch_depth), SpaceSaving(self.top_k)
+            )
+        return pair
+
+    def window(self, minutes: int, now: Optional[float] = None) -> Tuple[str, List[Tuple[int, str]]]:
+        """Buckets covering the last `minutes` minutes, newest first, as (first minute, key suffix).
+
+        Windows up to the per-minute TTL are read per minute; longer ones from
+        the hourly rollups, the current hour included.
+        """
+        current_minute = int((now or time.time()) // 60)
+        if minutes * 60 <= self.ttl:
+            return "minute", [(minute, str(minute)) for minute in range(current_minute, current_minute - minutes, -1)]
+        current_hour = current_minute // 60
+        hours = min(-(-minutes // 60), self.rollup_ttl // 3600)
+        return "hour", [(hour * 60, f"h{hour}") for hour in range(current_hour, current_hour - hours, -1)]
+
+    def scope_key(self, scope: str, suffix: str) -> str:
+        return f"{self.prefix}{scope}:{suffix}"
+
+    def top_key(self, board: str, suffix: str) -> str:
+        return f"{self.top_prefix}{board}:{suffix}"
+
+    def sketch_key(self, board: str, suffix: str) -> str:
+        return f"{self.sketch_prefix}{board}:{suffix}"
+
+    def sketch_indexes(self, user_id: str) -> List[int]:
+        """Counter indexes holding a user's estimate in every sketch"""
+        return sketch_indexes(user_id, self.sketch_width, self.sketch_depth)
+
+    async def flush(self):
+        """Write all pending counters to Redis as one pipelined transaction"""
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, defaultdict(int)
+        pending_top, self.pending_top = self.pending_top, defaultdict(int)
+        pending_sketches, self.pending_sketches = self.pending_sketches, {}
+
+        hashes: Dict[str, Dict[str, int]] = {}
+        sorted_sets: Dict[str, Dict[str, int]] = {}
+        counter_arrays: Dict[str, Dict[int, int]] = {}
+        caps: Dict[str, int] = {}
+        ttls: Dict[str, int] = {}
+
+        def buckets(minute: int):
+            return ((str(minute), self.ttl), (f"h{minute // 60}", self.rollup_ttl))
+
+        for (scope, minute, outcome), count in pending.items():
+            for suffix, ttl in buckets(minute):
+                key = self.scope_key(scope, suffix)
+                fields = hashes.setdefault(key, {})
+                fields[outcome] = fields.get(outcome, 0) + count
+                ttls[key] = ttl
+        for (board, member, minute), count in pending_top.items():
+            for suffix, ttl in buckets(minute):
+                key = self.top_key(board, suffix)
+                members = sorted_sets.setdefault(key, {})
+                members[member] = members.get(member, 0) + count
+                ttls[key] = ttl
+        for (board, minute), pair in pending_sketches.items():
+            cells = pair.sketch.nonzero()
+            heavy = pair.top.top(self.top_k)
+            for suffix, ttl in buckets(minute):
+                key = self.sketch_key(board, suffix)
+                counters = counter_arrays.setdefault(key, {})
+                for index, count in cells.items():
+                    counters[index] = counters.get(index, 0) + count
+                ttls[key] = ttl
+                # Merging Space-Saving summaries by adding counts and keeping the top K is
+                # approximate, but heavy hitters stay heavy in every worker's summary
+                key = self.top_key(board, suffix)
+                members = sorted_sets.setdefault(key, {})
+                for member, count in heavy:
+                    members[member] = members.get(member, 0) + count
+                caps[key] = self.top_k
+                ttls[key] = ttl
+
+        if not await self.redis.increment_many(hashes, sorted_sets, ttls, counter_arrays, caps):
+            # Keep the counts for the next flush rather than dropping them
+            for key, count in pending.items():
+                self.pending[key] += count
+            for key, count in pending_top.items():
+                self.pending_top[key] += count
+            for key, pair in pending_sketches.items():
+                current = self.pending_sketches.get(key)
+                if current is None:
+                    self.pending_sketches[key] = pair
+                else:
+                    # Counts are kept; the failed batch's top-K candidates are not
+                    current.sketch.merge(pair.sketch)
+            self._trim()
+
+    def _trim(self):
+        """Drop the oldest minutes once failed flushes have left more than max_retained entries"""
+        retained = len(self.pending) + len(self.pending_top) + len(self.pending_sketches)
+        if retained <= self.max_retained:
+            return
+        per_minute: Dict[int, int] = defaultdict(int)
+        for _, minute, _ in self.pending:
+            per_minute[minute] += 1
+        for _, _, minute in self.pending_top:
+            per_minute[minute] += 1
+        for _, minute in self.pending_sketches:
+            per_minute[minute] += 1
+
+        dropped, cutoff = 0, None
+        for minute in sorted(per_minute):
+            if retained - dropped <= self.max_retained:
+                break
+            dropped += per_minute[minute]
+            cutoff = minute
+        self.pending = defaultdict(int, {key: count for key, count in self.pending.items() if key[1] > cutoff})
+        self.pending_top = defaultdict(int, {key: count for key, count in self.pending_top.items() if key[2] > cutoff})
+        self.pending_sketches = {key: pair for key, pair in self.pending_sketches.items() if key[1] > cutoff}
+        self.dropped += dropped
+        logger.warning(f"Dropped {dropped} pending stats entries up to minute {cutoff}: flushes keep failing")
+
+    async def _run(self):
+        """Flush every interval, or earlier when the pending buffer fills up"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing stats: {e}")
+
+    async def start(self):
+        """Start the background flush task"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info("Stats recorder started")
+
+    async def stop(self):
+        """Stop the background flush task and write out whatever is left"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+
+        await self.flush()
+        logger.info("Stats recorder stopped")
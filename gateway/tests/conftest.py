@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Gateway modules import each other as top-level modules (`from config import settings`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_client import RedisClient
+
+@pytest.fixture
+def connect_fake():
+    """Coroutine function returning a RedisClient backed by an in-memory fakeredis (with Lua)"""
+    async def connect(**options) -> RedisClient:
+        import fakeredis
+        client = RedisClient()
+        client.redis = fakeredis.FakeAsyncRedis(decode_responses=True, **options)
+        await client.load_scripts()
+        client.connected = True
+        return client
+    return connect
@@ -0,0 +1,53 @@
+import asyncio
+
+from engines import BUCKET_TTL, GCRAEngine
+from rate_limiter import TokenBucketRateLimiter
+
+class Clock:
+    def __init__(self, now: float = 1760000000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+async def advance(client, clock: Clock, seconds: float):
+    """Move the limiter's clock forward and age every key's TTL by as much, expiring what runs out"""
+    clock.now += seconds
+    for key in await client.redis.keys("*"):
+        ttl_ms = await client.redis.pttl(key)
+        if ttl_ms > 0:
+            if ttl_ms <= seconds * 1000:
+                await client.redis.delete(key)
+            else:
+                await client.redis.pexpire(key, int(ttl_ms - seconds * 1000))
+
+def test_reset_finds_buckets_touched_late_in_the_index_lifetime(connect_fake):
+    async def scenario(elapsed: float):
+        client = await connect_fake()
+        clock = Clock()
+        limiter = TokenBucketRateLimiter(client, clock=clock)
+        assert await limiter.is_allowed("alice", "/api/data", "GET")
+        # Touch the bucket again later on, then let it idle until just before it expires
+        await advance(client, clock, elapsed)
+        assert await limiter.is_allowed("alice", "/api/data", "GET")
+        await advance(client, clock, BUCKET_TTL - 1)
+        buckets = [key for key in await client.redis.keys("bucket:*")]
+        await limiter.reset_user_limits("alice")
+        return buckets, await client.redis.keys("bucket:*")
+
+    for elapsed in (60, BUCKET_TTL // 2 - 1, BUCKET_TTL - 1, BUCKET_TTL + 60):
+        live, left = asyncio.run(scenario(elapsed))
+        assert live, elapsed
+        assert left == [], elapsed
+
+def test_gcra_keys_never_outlive_the_bucket_ttl(connect_fake):
+    async def scenario():
+        client = await connect_fake()
+        limiter = TokenBucketRateLimiter(client)
+        engine = limiter.engines[GCRAEngine.name]
+        key = engine.key_for("bucket:{alice}:/api/slow:GET")
+        # One request per minute with a day's burst: repaying it takes far longer than an hour
+        await engine.consume(key, 1, 2000, cost=1000)
+        return await client.redis.pttl(key)
+
+    assert 0 < asyncio.run(scenario()) <= BUCKET_TTL * 1000
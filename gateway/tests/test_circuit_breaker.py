@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from circuit_breaker import CircuitOpenError
+from engines import TokenBucketEngine
+from rate_limiter import TokenBucketRateLimiter
+
+def test_pipelined_reads_are_refused_while_the_circuit_is_open(connect_fake, monkeypatch):
+    async def scenario():
+        client = await connect_fake()
+        limiter = TokenBucketRateLimiter(client)
+        assert await limiter.is_allowed("alice", "/api/data", "GET")
+        limiter.shadow.apply({"id": "run", "started_at": 0.0, "config": limiter.config})
+        engine = limiter.engines[TokenBucketEngine.name]
+        key = engine.key_for(f"{limiter._user_prefix('alice')}/api/data:GET")
+        assert await engine.read(key) is not None
+
+        for _ in range(client.breaker.failure_threshold):
+            client.breaker.record_failure()
+        pipelines = []
+        monkeypatch.setattr(client.redis, "pipeline", lambda *args, **kwargs: pipelines.append(args))
+
+        with pytest.raises(CircuitOpenError):
+            await engine.read(key)
+        user_stats = await limiter.get_user_stats("alice")
+        report = await limiter.shadow.report()
+        return pipelines, user_stats, report
+
+    pipelines, user_stats, report = asyncio.run(scenario())
+    assert pipelines == []
+    assert user_stats["current_buckets"] == {}
+    assert "error" in report
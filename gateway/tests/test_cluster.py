@@ -0,0 +1,199 @@
+import asyncio
+from typing import Any, List
+
+import fakeredis
+import pytest
+from redis.crc import key_slot, REDIS_CLUSTER_HASH_SLOTS
+from redis.exceptions import ResponseError
+
+import redis_client
+from config import settings
+from rate_limiter import TokenBucketRateLimiter
+
+def keys_of(command: str, args: tuple) -> List[str]:
+    """Keys a command touches, which a cluster requires to be in one slot"""
+    if command in ("evalsha", "eval"):
+        return list(args[2:2 + int(args[1])])
+    if command == "execute_command":
+        return [args[1]]
+    if command == "zunionstore":
+        return [args[0], *args[1]]
+    if command in ("delete", "unlink", "exists"):
+        return list(args)
+    return [args[0]]
+
+class FakeCluster:
+    """Cluster stand-in: the hash slots split across separate in-memory nodes.
+
+    Like redis-py's RedisCluster, each command goes to the node owning its
+    keys' slot and is refused with CROSSSLOT when they span slots; pipelines
+    route every queued command on its own, and scripts are loaded on every node.
+    """
+
+    def __init__(self, node_count: int = 3):
+        self.nodes = [fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+                      for _ in range(node_count)]
+
+    def node_for(self, command: str, args: tuple):
+        slots = {key_slot(key.encode("utf-8")) for key in keys_of(command, args)}
+        if len(slots) > 1:
+            raise ResponseError("CROSSSLOT Keys in request don't hash to the same slot")
+        return self.nodes[slots.pop() * len(self.nodes) // REDIS_CLUSTER_HASH_SLOTS]
+
+    def __getattr__(self, command: str):
+        async def call(*args, **kwargs):
+            return await getattr(self.node_for(command, args), command)(*args, **kwargs)
+        return call
+
+    async def script_load(self, source: str) -> str:
+        return [await node.script_load(source) for node in self.nodes][0]
+
+    async def ping(self) -> bool:
+        return all([await node.ping() for node in self.nodes])
+
+    async def close(self):
+        for node in self.nodes:
+            await node.aclose()
+
+    def pipeline(self, transaction: bool = False):
+        return FakeClusterPipeline(self)
+
+    async def all_keys(self) -> List[List[str]]:
+        return [await node.keys("*") for node in self.nodes]
+
+class FakeClusterPipeline:
+    def __init__(self, cluster: FakeCluster):
+        self.cluster = cluster
+        self.commands: List[Any] = []
+
+    def __getattr__(self, command: str):
+        def queue(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        commands, self.commands = self.commands, []
+        return [await getattr(self.cluster.node_for(command, args), command)(*args, **kwargs)
+                for command, args, kwargs in commands]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.commands = []
+
+def cluster_config():
+    return {
+        "default_requests_per_minute": 1,
+        "default_burst_size": 5,
+        "default_max_concurrent": 2,
+        "endpoints": {"/api/data": {"GET": {"requests_per_minute": 1, "burst_size": 5, "max_concurrent": 1}}},
+        "user_overrides": {},
+        "global_limits": {"user": {"requests_per_minute": 1, "burst_size": 10},
+                          "tenant": {"requests_per_minute": 1, "burst_size": 3}},
+        "tiers": {"free": {"quotas": {"minute": 20, "day": 100}}},
+        "default_tier": "free"
+    }
+
+async def cluster_client(monkeypatch) -> redis_client.RedisClient:
+    """RedisClient connected in cluster mode, with the FakeCluster behind RedisCluster"""
+    def connect_cluster(startup_nodes: list, **options):
+        connect_cluster.nodes = [(node.host, node.port) for node in startup_nodes]
+        return FakeCluster()
+
+    monkeypatch.setattr(settings, "REDIS_CLUSTER_ENABLED", True)
+    monkeypatch.setattr(settings, "REDIS_CLUSTER_NODES", "node-a:7000, node-b:7001")
+    monkeypatch.setattr(redis_client, "RedisCluster", connect_cluster)
+    monkeypatch.setattr(redis_client.redis, "Redis", lambda **options: fakeredis.FakeAsyncRedis(decode_responses=True))
+    client = redis_client.RedisClient()
+    await client.connect()
+    assert connect_cluster.nodes == [("node-a", 7000), ("node-b", 7001)]
+    return client
+
+def test_connect_loads_scripts_on_every_node(monkeypatch):
+    async def scenario():
+        client = await cluster_client(monkeypatch)
+        shas = list(client.script_shas.values())
+        return client.cluster, [[(await node.script_exists(sha))[0] for sha in shas] for node in client.redis.nodes]
+
+    cluster, loaded = asyncio.run(scenario())
+    assert cluster
+    assert all(all(node) for node in loaded)
+
+def test_user_keys_share_one_slot(monkeypatch):
+    async def scenario():
+        client = await cluster_client(monkeypatch)
+        limiter = TokenBucketRateLimiter(client)
+        await limiter.update_config(cluster_config())
+        for user_id in ("alice", "bob"):
+            await limiter.is_allowed_dimensions(user_id, "/api/data", "GET", tenant_id=f"tenant-{user_id}")
+            await limiter.is_allowed_dimensions(user_id, "/api/users", "POST", tenant_id=f"tenant-{user_id}")
+            allowed, lease = await limiter.acquire_concurrency(user_id, "/api/data", "GET")
+            assert allowed and lease is not None
+        await limiter.stats_recorder.flush()
+        stats = await limiter.get_user_stats("alice")
+        await limiter.concurrency.stop()
+        return await client.redis.all_keys(), stats
+
+    keys_by_node, stats = asyncio.run(scenario())
+    for user_id in ("alice", "bob"):
+        # Buckets, quota windows, the bucket index, stats and in-flight leases
+        user_keys = [key for keys in keys_by_node for key in keys if f"{{{user_id}}}" in key]
+        assert {prefix for prefix in ("bucket:", "bucket_index:", "stats:", "inflight:")
+                if any(key.startswith(prefix) for key in user_keys)} == {"bucket:", "bucket_index:", "stats:", "inflight:"}
+        assert any(":quota:" in key for key in user_keys)
+        assert len({key_slot(key.encode("utf-8")) for key in user_keys}) == 1
+    # Read back across the cluster from the user's slot
+    assert sum(minute["allowed"] for minute in stats["user_stats"]) == 2
+    assert len(stats["current_buckets"]) >= 2
+
+def test_multi_limit_admission_across_slots(monkeypatch):
+    async def scenario():
+        client = await cluster_client(monkeypatch)
+        limiter = TokenBucketRateLimiter(client)
+        await limiter.update_config(cluster_config())
+        checks = limiter.limit_checks("alice", "/api/data", "GET", tenant_id="acme")
+        slots = {client.key_slot(check.key) for check in checks}
+
+        # All at once, as on a single node, is refused by the cluster
+        with pytest.raises(RuntimeError):
+            await limiter.multi_limit._consume(checks, limiter._index_key("alice"))
+
+        # Tenant burst 3 is shared by alice and bob; alice's own buckets still hold tokens
+        alice = [await limiter.is_allowed_dimensions("alice", "/api/data", "GET", tenant_id="acme") for _ in range(2)]
+        bob = [await limiter.is_allowed_dimensions("bob", "/api/data", "GET", tenant_id="acme") for _ in range(2)]
+        other_tenant = await limiter.is_allowed_dimensions("alice", "/api/data", "GET", tenant_id="globex")
+        allowed, admissions = await limiter.multi_limit.consume_many(
+            limiter.limit_checks("carol", "/api/data", "GET", tenant_id="acme"), limiter._index_key("carol")
+        )
+        return slots, alice, bob, other_tenant, allowed, admissions
+
+    slots, alice, bob, other_tenant, allowed, admissions = asyncio.run(scenario())
+    assert len(slots) == 2
+    assert alice == [True, True]
+    assert bob == [True, False]
+    assert other_tenant is True
+    # Denied by the tenant slot after carol's own slot admitted (errs strict)
+    assert allowed is False
+    assert [admission.allowed for admission in admissions[:-1]] == [True] * (len(admissions) - 1)
+    assert admissions[-1].allowed is False
+
+def test_versioned_config_write_is_one_script_call(monkeypatch):
+    async def scenario():
+        client = await cluster_client(monkeypatch)
+        calls = []
+        evalsha = client.redis.evalsha
+
+        async def recording_evalsha(sha, numkeys, *args):
+            calls.append(args[:numkeys])
+            return await evalsha(sha, numkeys, *args)
+        client.redis.evalsha = recording_evalsha
+        stored = await client.set_json_versioned(settings.CONFIG_KEY, settings.CONFIG_VERSION_KEY, cluster_config())
+        deleted = await client.set_json_versioned(settings.CONFIG_KEY, settings.CONFIG_VERSION_KEY, None)
+        return stored, deleted, calls, await client.get(settings.CONFIG_KEY), await client.get(settings.CONFIG_VERSION_KEY)
+
+    stored, deleted, calls, config, version = asyncio.run(scenario())
+    assert (stored, deleted) == (1, 2)
+    assert calls == [(settings.CONFIG_KEY, settings.CONFIG_VERSION_KEY)] * 2
+    assert config is None and version == "2"
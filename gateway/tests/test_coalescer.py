@@ -0,0 +1,82 @@
+import asyncio
+
+from coalescer import AdmissionCoalescer
+from config import settings
+from engines import TokenBucketEngine
+from rate_limiter import TokenBucketRateLimiter
+
+NOW = 1_000_000.0
+KEY = "bucket:{alice}:/api/data:GET"
+
+async def coalescer(connect_fake, max_batch: int = 100):
+    """Coalescer over a fakeredis token bucket engine, with its batch sizes recorded"""
+    engine = TokenBucketEngine(await connect_fake(), clock=lambda: NOW)
+    batches = []
+    consume_batch = engine.consume_batch
+
+    async def recorded(key, requests_per_minute, burst_size, costs, index_key=None):
+        batches.append(len(costs))
+        return await consume_batch(key, requests_per_minute, burst_size, costs, index_key)
+
+    engine.consume_batch = recorded
+    return AdmissionCoalescer(engine, 0, max_batch), batches
+
+def test_concurrent_requests_admit_exactly_the_burst(connect_fake, monkeypatch):
+    monkeypatch.setattr(settings, "COALESCE_ENABLED", True)
+    monkeypatch.setattr(settings, "COALESCE_WINDOW_MS", 0)
+    monkeypatch.setattr(settings, "COALESCE_MAX_BATCH", 100)
+
+    async def scenario():
+        limiter = TokenBucketRateLimiter(await connect_fake(), clock=lambda: NOW)
+        await limiter.update_config({"default_requests_per_minute": 60, "default_burst_size": 50,
+                                     "endpoints": {}, "user_overrides": {}})
+        results = await asyncio.gather(*(limiter.is_allowed("alice", "/api/data", "GET") for _ in range(300)))
+        return results, await limiter.redis.redis.smembers("bucket_index:{alice}")
+
+    results, index = asyncio.run(scenario())
+    assert results.count(True) == 50
+    assert index == {KEY}
+
+def test_mixed_costs_are_decided_in_arrival_order(connect_fake):
+    costs = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3]
+
+    async def scenario():
+        batched, batches = await coalescer(connect_fake)
+        together = await asyncio.gather(*(batched.consume(KEY, 60, 10, cost) for cost in costs))
+        one_by_one = [await batched.engine.consume(f"{KEY}:single", 60, 10, cost) for cost in costs]
+        return together, one_by_one, batches
+
+    together, one_by_one, batches = asyncio.run(scenario())
+    assert batches == [len(costs)]
+    assert [admission.allowed for admission in together] == [True, True, True, True, False, False, False,
+                                                            False, False, False]
+    assert [(admission.allowed, admission.remaining) for admission in together] == \
+        [(admission.allowed, admission.remaining) for admission in one_by_one]
+
+def test_full_batches_are_split(connect_fake):
+    async def scenario():
+        batched, batches = await coalescer(connect_fake, max_batch=4)
+        results = await asyncio.gather(*(batched.consume(KEY, 60, 5) for _ in range(10)))
+        return results, batches, batched.pending
+
+    results, batches, pending = asyncio.run(scenario())
+    assert batches == [4, 4, 2]
+    assert [admission.allowed for admission in results] == [True] * 5 + [False] * 5
+    assert pending == {}
+
+def test_errors_reach_every_waiter(connect_fake):
+    async def scenario():
+        batched, _ = await coalescer(connect_fake)
+        # The circuit opens between the batch being queued and sent
+        breaker = batched.engine.redis.breaker
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        failed = await asyncio.gather(*(batched.consume(KEY, 60, 5) for _ in range(3)), return_exceptions=True)
+        breaker.record_success()
+        return failed, batched.pending, await batched.consume(KEY, 60, 5)
+
+    failed, pending, after = asyncio.run(scenario())
+    assert len(failed) == 3 and all(isinstance(error, RuntimeError) for error in failed)
+    assert failed[0] is failed[1] is failed[2]
+    assert pending == {}
+    assert after.allowed
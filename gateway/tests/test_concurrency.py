@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import pytest
+
+from auth import create_access_token
+from concurrency_limiter import ConcurrencyLimiter
+from rate_limit_middleware import RateLimitMiddleware
+from rate_limiter import TokenBucketRateLimiter
+
+USER_SET = "inflight:{alice}"
+ROUTE_SET = "inflight:{alice}:/api/data:GET"
+
+def config():
+    """Three requests in flight per user, one of them at most on /api/data"""
+    return {"default_requests_per_minute": 6000, "default_burst_size": 100, "default_max_concurrent": 3,
+            "endpoints": {"/api/data": {"GET": {"max_concurrent": 1}}}, "user_overrides": {}}
+
+async def concurrency_limiter(connect_fake) -> TokenBucketRateLimiter:
+    limiter = TokenBucketRateLimiter(await connect_fake())
+    await limiter.update_config(config())
+    return limiter
+
+def test_caps_are_taken_all_or_nothing(connect_fake):
+    async def scenario():
+        limiter = await concurrency_limiter(connect_fake)
+        redis = limiter.redis.redis
+        others = [await limiter.acquire_concurrency("alice", "/api/other", "GET") for _ in range(4)]
+        # The user-wide set is full: the free route slot is not taken either
+        user_full, _ = await limiter.acquire_concurrency("alice", "/api/data", "GET")
+        route_after_user_full = await redis.zcard(ROUTE_SET)
+        await limiter.release_concurrency(others[0][1])
+        admitted, _ = await limiter.acquire_concurrency("alice", "/api/data", "GET")
+        # Now the route set is full: the user-wide slot freed below stays free
+        await limiter.release_concurrency(others[1][1])
+        route_full, _ = await limiter.acquire_concurrency("alice", "/api/data", "GET")
+        user_after_route_full = await redis.zcard(USER_SET)
+        bob, _ = await limiter.acquire_concurrency("bob", "/api/data", "GET")
+        await limiter.concurrency.stop()
+        return ([allowed for allowed, _ in others], user_full, route_after_user_full, admitted,
+                route_full, user_after_route_full, bob)
+
+    others, user_full, route_after_user_full, admitted, route_full, user_after_route_full, bob = asyncio.run(scenario())
+    assert others == [True, True, True, False]
+    assert user_full is False and route_after_user_full == 0
+    assert admitted is True
+    assert route_full is False and user_after_route_full == 2
+    assert bob is True
+
+def test_expired_leases_are_reaped(connect_fake):
+    async def scenario():
+        client = await connect_fake()
+        concurrency = ConcurrencyLimiter(client, lease_ttl=30)
+        crashed = await concurrency.acquire([(USER_SET, 1)])
+        blocked = await concurrency.acquire([(USER_SET, 1)])
+        # The worker holding it died: nothing renews the lease, so its expiry passes
+        await concurrency.stop()
+        concurrency.held.clear()
+        await client.redis.zadd(USER_SET, {crashed.lease_id: time.time() - 1})
+        lease = await concurrency.acquire([(USER_SET, 1)])
+        members = await client.redis.zrange(USER_SET, 0, -1)
+        await concurrency.stop()
+        return blocked, lease, members
+
+    blocked, lease, members = asyncio.run(scenario())
+    assert blocked is None
+    assert lease is not None and members == [lease.lease_id]
+
+def test_renew_does_not_revive_released_leases(connect_fake):
+    async def scenario():
+        client = await connect_fake()
+        concurrency = ConcurrencyLimiter(client, lease_ttl=30)
+        kept = await concurrency.acquire([(USER_SET, 2)])
+        released = await concurrency.acquire([(USER_SET, 2)])
+        await concurrency.stop()
+        expiry = await client.redis.zscore(USER_SET, kept.lease_id)
+        # Released in Redis while a renewal had already collected it
+        await client.redis.zrem(USER_SET, released.lease_id)
+        await asyncio.sleep(0.01)
+        await concurrency.renew()
+        return kept.lease_id, expiry, await client.redis.zrange(USER_SET, 0, -1, withscores=True)
+
+    kept, expiry, members = asyncio.run(scenario())
+    assert [member for member, _ in members] == [kept]
+    assert members[0][1] > expiry
+
+class AppError(Exception):
+    pass
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_middleware_releases_the_lease_when_the_app_finishes(connect_fake, fails):
+    async def app(scope, receive, send):
+        in_flight.append(await limiter.redis.redis.zcard(USER_SET))
+        if fails:
+            raise AppError("upstream blew up")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def request():
+        scope = {"type": "http", "method": "GET", "path": "/api/data", "client": ("10.0.0.1", 5000),
+                 "headers": [(b"authorization", f"Bearer {token}".encode())]}
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        try:
+            await middleware(scope, None, send)
+        except AppError:
+            return "raised"
+        return sent[0]["status"]
+
+    async def scenario():
+        nonlocal limiter, middleware
+        limiter = await concurrency_limiter(connect_fake)
+        middleware = RateLimitMiddleware(app, limiter)
+        statuses = [await request() for _ in range(3)]
+        left = await limiter.redis.redis.zcard(USER_SET), await limiter.redis.redis.zcard(ROUTE_SET)
+        await limiter.concurrency.stop()
+        return statuses, left
+
+    limiter = middleware = None
+    in_flight = []
+    token = create_access_token({"sub": "alice"})
+    statuses, left = asyncio.run(scenario())
+    # The route allows one in flight: each request only gets it because the previous one gave it back
+    assert statuses == ["raised" if fails else 200] * 3
+    assert in_flight == [1, 1, 1]
+    assert left == (0, 0)
@@ -0,0 +1,84 @@
+import asyncio
+
+from config import settings
+from config_watcher import ConfigWatcher
+from rate_limiter import TokenBucketRateLimiter
+
+def candidate(requests_per_minute):
+    return {"default_requests_per_minute": requests_per_minute, "default_burst_size": 5,
+            "endpoints": {}, "user_overrides": {}}
+
+def count_fetches(client, monkeypatch):
+    """Record the keys read with GET (config bodies); the version keys are read with MGET"""
+    fetched = []
+    get = client.get
+
+    async def counting_get(key):
+        fetched.append(key)
+        return await get(key)
+    monkeypatch.setattr(client, "get", counting_get)
+    return fetched
+
+def test_reload_fetches_config_and_shadow_only_when_their_version_changes(connect_fake, monkeypatch):
+    async def scenario():
+        client = await connect_fake()
+        publisher = ConfigWatcher(client, TokenBucketRateLimiter(client))
+        watcher = ConfigWatcher(client, TokenBucketRateLimiter(client))
+        fetched = count_fetches(client, monkeypatch)
+
+        await publisher.publish(candidate(30))
+        _, run = await publisher.publish_shadow(candidate(15))
+        await watcher.reload()
+        first = list(fetched)
+        fetched.clear()
+
+        # Nothing changed: only the version keys are read
+        for _ in range(3):
+            await watcher.reload()
+        idle = list(fetched)
+
+        await publisher.publish_shadow(None)
+        await watcher.reload()
+        return watcher, run, first, idle, fetched[len(idle):]
+
+    watcher, run, first, idle, after_stop = asyncio.run(scenario())
+    assert sorted(first) == sorted([settings.CONFIG_KEY, settings.SHADOW_CONFIG_KEY])
+    assert idle == []
+    assert after_stop == [settings.SHADOW_CONFIG_KEY]
+    assert watcher.rate_limiter.config["default_requests_per_minute"] == 30
+    assert watcher.rate_limiter.shadow.run_id is None
+    assert watcher.rate_limiter.shadow.last_run[0] == run["id"]
+
+def test_rejected_config_is_not_fetched_again(connect_fake, monkeypatch):
+    async def scenario():
+        client = await connect_fake()
+        await client.set_json_versioned(settings.CONFIG_KEY, settings.CONFIG_VERSION_KEY, candidate(0))
+        watcher = ConfigWatcher(client, TokenBucketRateLimiter(client))
+        await watcher.reload()
+        fetched = count_fetches(client, monkeypatch)
+        await watcher.reload()
+        return watcher, fetched
+
+    watcher, fetched = asyncio.run(scenario())
+    assert watcher.rate_limiter.config_version is None
+    assert fetched == []
+
+def test_shadow_run_is_not_applied_when_it_cannot_be_stored(connect_fake):
+    async def scenario():
+        client = await connect_fake()
+        publisher = ConfigWatcher(client, TokenBucketRateLimiter(client))
+        published = []
+
+        async def publish(channel, message):
+            published.append(message)
+        client.publish = publish
+        for _ in range(client.breaker.failure_threshold):
+            client.breaker.record_failure()
+        version, run = await publisher.publish_shadow(candidate(15))
+        return publisher, version, run, published
+
+    publisher, version, run, published = asyncio.run(scenario())
+    assert version is None and run is not None
+    assert published == []
+    assert publisher.rate_limiter.shadow.run_id is None
+    assert publisher.shadow_seen is None
@@ -0,0 +1,71 @@
+import asyncio
+
+from engines import BUCKET_TTL, LimitCheck, MultiLimitEvaluator
+
+NOW = 1_000_000.0
+INDEX = "bucket_index:{alice}"
+
+def mixed_checks(tenant_burst: int = 5):
+    """One check per engine, the user-level ones recorded in the index"""
+    return [
+        LimitCheck("bucket:{alice}:/api/data:GET", 60, 5, "token_bucket", indexed=True),
+        LimitCheck("bucket:{alice}:/api/data:GET:gcra", 60, 5, "gcra", indexed=True),
+        LimitCheck("bucket:{alice}:quota:day:swc", 100, 100, "sliding_window_counter", window=86400),
+        LimitCheck("limit:tenant:acme:swl", 60, 60, "sliding_window_log"),
+        LimitCheck("limit:ip:10.0.0.1", 60, tenant_burst, "token_bucket"),
+    ]
+
+async def evaluator(connect_fake):
+    client = await connect_fake()
+    return client, MultiLimitEvaluator(client, clock=lambda: NOW)
+
+def test_denied_dimension_leaves_every_key_unwritten(connect_fake):
+    async def scenario():
+        client, multi_limit = await evaluator(connect_fake)
+        # The last check needs 2 tokens from a bucket of 1
+        checks = mixed_checks(tenant_burst=1)
+        checks[-1] = checks[-1]._replace(cost=2)
+        allowed, admissions = await multi_limit.consume_many(checks, INDEX)
+        return allowed, admissions, await client.redis.keys("*")
+
+    allowed, admissions, keys = asyncio.run(scenario())
+    assert allowed is False
+    assert [admission.allowed for admission in admissions] == [True, True, True, True, False]
+    assert keys == []
+
+def test_mixed_engines_in_one_call(connect_fake):
+    async def scenario():
+        client, multi_limit = await evaluator(connect_fake)
+        results = [await multi_limit.consume_many(mixed_checks(), INDEX) for _ in range(6)]
+        types = {key: await client.redis.type(key) for key in await client.redis.keys("*")}
+        return results, types
+
+    results, types = asyncio.run(scenario())
+    # Burst 5 on both bucket engines and the IP bucket: the sixth is denied by all three
+    assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+    assert [round(admission.remaining) for admission in results[4][1]] == [0, 0, 95, 55, 0]
+    assert [admission.allowed for admission in results[5][1]] == [False, False, True, True, False]
+    assert types == {
+        "bucket:{alice}:/api/data:GET": "hash",
+        "bucket:{alice}:/api/data:GET:gcra": "string",
+        "bucket:{alice}:quota:day:swc": "hash",
+        "limit:tenant:acme:swl": "zset",
+        "limit:ip:10.0.0.1": "hash",
+        INDEX: "set",
+    }
+
+def test_index_lists_only_indexed_checks(connect_fake):
+    async def scenario():
+        client, multi_limit = await evaluator(connect_fake)
+        await multi_limit.consume_many(mixed_checks(), INDEX)
+        members = await client.redis.smembers(INDEX)
+        ttl = await client.redis.ttl(INDEX)
+        # Without any indexed check, the index is never created
+        await client.redis.delete(INDEX)
+        await multi_limit.consume_many([check._replace(indexed=False) for check in mixed_checks()], INDEX)
+        return members, ttl, await client.redis.exists(INDEX)
+
+    members, ttl, exists = asyncio.run(scenario())
+    assert members == {"bucket:{alice}:/api/data:GET", "bucket:{alice}:/api/data:GET:gcra"}
+    assert ttl > BUCKET_TTL
+    assert exists == 0
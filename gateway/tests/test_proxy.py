@@ -0,0 +1,148 @@
+import asyncio
+
+import httpx
+from fastapi.middleware.cors import CORSMiddleware
+
+from proxy import ReverseProxyMiddleware, UpstreamPool
+
+UPSTREAM = "http://users:8080"
+
+def streamed(*chunks):
+    """Response body as an unread stream (bytes content would arrive already read, unlike a real upstream)"""
+    async def body():
+        for chunk in chunks:
+            yield chunk
+    return body()
+
+def gateway(handler):
+    """Proxy middleware routing /api/users to a MockTransport upstream; unrouted paths get a 404 app"""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b"gateway"})
+
+    pool = UpstreamPool({"/api/users": UPSTREAM})
+    pool.retries = 2
+    pool.clients[UPSTREAM] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return ReverseProxyMiddleware(app, pool)
+
+async def call(proxy, method, path, headers=(), chunks=(b"",)):
+    """Send one request through the middleware; the response start message and body messages"""
+    scope = {
+        "type": "http", "method": method, "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [(b"host", b"gateway"), *headers], "client": ("10.0.0.1", 5000), "scheme": "http"
+    }
+    incoming = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await proxy(scope, receive, send)
+    return sent[0], [message for message in sent[1:] if message["body"]]
+
+def test_streams_request_and_response_bodies():
+    received = []
+
+    async def handler(request):
+        received.append((request.method, request.url.path, await request.aread()))
+        return httpx.Response(200, content=streamed(b"one,", b"two,", b"three"))
+
+    start, body = asyncio.run(call(gateway(handler), "POST", "/api/users/42", chunks=[b"a" * 10, b"b" * 10, b"c"]))
+    assert received == [("POST", "/api/users/42", b"a" * 10 + b"b" * 10 + b"c")]
+    assert start["status"] == 200
+    # Forwarded as the upstream produced it, one message per chunk
+    assert [message["body"] for message in body] == [b"one,", b"two,", b"three"]
+
+def test_unrouted_paths_go_to_the_app():
+    async def handler(request):
+        raise AssertionError("upstream called")
+
+    start, body = asyncio.run(call(gateway(handler), "GET", "/api/usersettings"))
+    assert start["status"] == 404 and body[0]["body"] == b"gateway"
+
+def test_hop_by_hop_headers_are_dropped():
+    forwarded = []
+
+    async def handler(request):
+        forwarded.append(request.headers)
+        return httpx.Response(200, headers=[("keep-alive", "timeout=5"), ("connection", "x-internal"),
+                                            ("x-internal", "1"), ("x-request-id", "abc")], content=streamed(b"ok"))
+
+    start, _ = asyncio.run(call(gateway(handler), "GET", "/api/users", headers=[
+        (b"connection", b"keep-alive, x-secret"), (b"keep-alive", b"timeout=5"), (b"te", b"trailers"),
+        (b"upgrade", b"websocket"), (b"proxy-authorization", b"Basic x"), (b"x-secret", b"1"),
+        (b"authorization", b"Bearer token")
+    ]))
+    headers = forwarded[0]
+    for name in ("keep-alive", "te", "upgrade", "proxy-authorization", "x-secret"):
+        assert name not in headers
+    # The upstream client sets its own Connection header for its own connection
+    assert "x-secret" not in headers.get("connection", "")
+    assert headers["authorization"] == "Bearer token"
+    assert headers["x-forwarded-host"] == "gateway"
+    assert headers["x-forwarded-for"] == "10.0.0.1"
+
+    response_headers = {name.lower() for name, _ in start["headers"]}
+    assert not response_headers & {b"keep-alive", b"connection", b"x-internal"}
+    assert b"x-request-id" in response_headers
+
+def test_response_header_names_are_lowercased():
+    async def handler(request):
+        return httpx.Response(200, headers=[("Access-Control-Allow-Origin", "https://app.example"),
+                                            ("X-Request-Id", "abc")], content=streamed(b"ok"))
+
+    # Behind CORS as in main.py, which only sees lowercase names and would add its own ACAO
+    cors = CORSMiddleware(gateway(handler), allow_origins=["*"], allow_credentials=True,
+                          allow_methods=["*"], allow_headers=["*"])
+    start, _ = asyncio.run(call(cors, "GET", "/api/users", headers=[(b"origin", b"https://app.example")]))
+    names = [name for name, _ in start["headers"]]
+    assert all(name == name.lower() for name in names)
+    assert names.count(b"access-control-allow-origin") == 1
+    assert b"x-request-id" in names
+
+def failing(error, successes_after=None):
+    """Upstream handler raising `error` for every attempt (or the first `successes_after` ones)"""
+    attempts = []
+
+    async def handler(request):
+        attempts.append(request.method)
+        if successes_after is None or len(attempts) <= successes_after:
+            raise error("upstream failure", request=request)
+        return httpx.Response(200, content=streamed(b"ok"))
+    return handler, attempts
+
+def test_idempotent_methods_are_retried_on_connection_errors():
+    handler, attempts = failing(httpx.ConnectError, successes_after=2)
+    start, body = asyncio.run(call(gateway(handler), "GET", "/api/users"))
+    assert start["status"] == 200 and body[0]["body"] == b"ok"
+    assert len(attempts) == 3
+
+def test_non_idempotent_methods_are_not_retried():
+    handler, attempts = failing(httpx.ConnectError, successes_after=1)
+    start, _ = asyncio.run(call(gateway(handler), "POST", "/api/users", chunks=[b"{}"]))
+    assert start["status"] == 502
+    assert len(attempts) == 1
+
+def test_bad_gateway_once_retries_run_out():
+    handler, attempts = failing(httpx.ConnectError)
+    start, body = asyncio.run(call(gateway(handler), "GET", "/api/users"))
+    assert start["status"] == 502
+    assert body[0]["body"] == b'{"error":"Upstream unavailable"}'
+    assert len(attempts) == 3  # the first try plus UPSTREAM_RETRIES
+
+def test_gateway_timeout_once_connect_retries_run_out():
+    handler, attempts = failing(httpx.ConnectTimeout)
+    start, _ = asyncio.run(call(gateway(handler), "GET", "/api/users"))
+    assert start["status"] == 504
+    assert len(attempts) == 3
+
+def test_read_timeouts_are_not_retried():
+    handler, attempts = failing(httpx.ReadTimeout)
+    start, body = asyncio.run(call(gateway(handler), "GET", "/api/users"))
+    assert start["status"] == 504
+    assert body[0]["body"] == b'{"error":"Upstream timed out"}'
+    assert len(attempts) == 1
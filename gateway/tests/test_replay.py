@@ -0,0 +1,47 @@
+import asyncio
+import json
+import random
+from collections import Counter
+
+from benchmarks import replay
+
+def write_log(path, start: float, seed: int):
+    rng = random.Random(seed)
+    timestamp = start
+    with open(path, "w") as f:
+        for _ in range(200):
+            timestamp += rng.random() * 0.05
+            f.write(json.dumps({"user": f"user-{rng.randrange(3)}", "path": "/api/data", "timestamp": timestamp}) + "\n")
+
+def replay_args(log, timing="fast"):
+    return replay.parse_args([str(log), "--fake", "--timing", timing, "--concurrency", "20"])
+
+def test_fast_replays_running_at_once_keep_their_own_clocks(tmp_path):
+    # Same traffic shape an hour apart: the buckets refill by log time, so the decisions match
+    write_log(tmp_path / "a.jsonl", 1760000000.0, seed=1)
+    write_log(tmp_path / "b.jsonl", 1760003600.0, seed=1)
+
+    async def together():
+        return await asyncio.gather(*(replay.run(replay_args(tmp_path / name)) for name in ("a.jsonl", "b.jsonl")))
+
+    first, second = asyncio.run(together())
+    alone = asyncio.run(replay.run(replay_args(tmp_path / "a.jsonl")))
+    assert first["blocked"] > 0
+    assert first["users"] == second["users"] == alone["users"]
+
+def test_lines_missing_user_or_path_are_malformed():
+    malformed = Counter()
+    lines = [
+        '{"path": "/api/data", "timestamp": 1}',
+        '{"user": "alice", "timestamp": 1}',
+        '{"user_id": null, "endpoint": "/api/data", "timestamp": 1}',
+        '{"user_id": 7, "endpoint": "/api/users", "method": "post", "timestamp": 2}'
+    ]
+    records = list(replay.parse_records(lines, malformed))
+    assert records == [replay.Record(4, "7", "/api/users", "POST", 2.0)]
+    assert malformed["lines"] == 3
+
+def test_naive_iso_timestamps_are_utc():
+    assert replay.parse_timestamp("2025-10-09T08:53:20") == 1760000000.0
+    assert replay.parse_timestamp("2025-10-09T10:53:20+02:00") == 1760000000.0
+    assert replay.parse_timestamp(1760000000) == 1760000000.0
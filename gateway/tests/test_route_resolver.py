@@ -0,0 +1,63 @@
+import pytest
+
+from rate_limiter import TokenBucketRateLimiter
+from redis_client import RedisClient
+from route_resolver import RouteResolver
+
+def config(**overrides):
+    return {"default_requests_per_minute": 60, "default_burst_size": 10, "endpoints": {}, "user_overrides": {},
+            **overrides}
+
+@pytest.mark.parametrize("bad", [
+    config(default_requests_per_minute=0),
+    config(endpoints={"/api/data": {"GET": {"requests_per_minute": 0, "algorithm": "gcra"}}}),
+    config(user_overrides={"alice": {"requests_per_minute": -5, "burst_size": 1}}),
+    config(global_limits={"tenant": {"requests_per_minute": 0, "burst_size": 10}})
+])
+def test_requests_per_minute_below_one_is_rejected(bad):
+    with pytest.raises(ValueError, match="requests_per_minute"):
+        RouteResolver(bad)
+
+def test_limits_inherit_a_valid_default_rate():
+    resolver = RouteResolver(config(endpoints={"/api/data": {"GET": {"burst_size": 5}}}))
+    assert resolver.resolve("alice", "/api/data", "GET").requests_per_minute == 60
+
+def test_override_and_dimension_costs_apply():
+    resolver = RouteResolver(config(
+        endpoints={"/api/data": {"GET": {"cost": 3}}},
+        user_overrides={"alice": {"requests_per_minute": 60, "cost": 5}, "bob": {"requests_per_minute": 60}},
+        global_limits={"user": {"requests_per_minute": 60, "cost": 7}, "ip": {"requests_per_minute": 60}}
+    ))
+    assert resolver.resolve("alice", "/api/data", "GET").cost == 5
+    assert resolver.resolve("alice", "/api/other", "GET").cost == 5
+    # An override without a cost keeps the rule's
+    assert resolver.resolve("bob", "/api/data", "GET").cost == 3
+    assert resolver.dimension_costs == {"user": 7}
+
+def test_limit_checks_charge_dimension_costs():
+    limiter = TokenBucketRateLimiter(RedisClient())
+    limiter.resolver = RouteResolver(config(
+        endpoints={"/api/data": {"GET": {"cost": 3}}},
+        global_limits={"user": {"requests_per_minute": 60, "cost": 7}, "ip": {"requests_per_minute": 60}}
+    ))
+    checks = limiter.limit_checks("alice", "/api/data", "GET", client_ip="10.0.0.1")
+    assert [check.cost for check in checks] == [3, 7, 3]
+
+def test_invalid_override_cost_is_rejected():
+    with pytest.raises(ValueError, match="cost"):
+        RouteResolver(config(user_overrides={"alice": {"cost": 0}}))
+
+def test_templates_beat_wildcards_on_another_branch():
+    limit = {"GET": {"requests_per_minute": 60}}
+    resolver = RouteResolver(config(endpoints={
+        "/api/users/*": limit, "/api/{x}/items": limit, "/api/users/{id}/*": limit, "/api/*": limit,
+        "/api/users/{id}/profile": limit
+    }))
+    route = lambda path: resolver.resolve("alice", path, "GET").route
+    assert route("/api/users/items") == "/api/{x}/items"
+    assert route("/api/users/42/profile") == "/api/users/{id}/profile"
+    # Deepest wildcard when no template matches
+    assert route("/api/users/42/posts") == "/api/users/{id}/*"
+    assert route("/api/users/42/posts/1") == "/api/users/{id}/*"
+    assert route("/api/orders/7/lines") == "/api/*"
+    assert route("/other") == "/other"
@@ -0,0 +1,69 @@
+from engines import LimitCheck
+from shared_memory_limiter import MAX_PROBE, SLOT, SharedMemoryRateLimiter, fingerprint
+from test_bucket_index import Clock
+
+def limiter(tmp_path, clock, slots: int = 64, stripes: int = 4) -> SharedMemoryRateLimiter:
+    return SharedMemoryRateLimiter(str(tmp_path / "limits"), slots, stripes, clock=clock)
+
+def stored_keys(shared: SharedMemoryRateLimiter) -> set:
+    """Fingerprints of every claimed slot"""
+    offsets = (shared._slot_offset(stripe, index)
+               for stripe in range(shared.stripes) for index in range(shared.slots_per_stripe))
+    return {SLOT.unpack_from(shared.map, offset)[0] for offset in offsets} - {0}
+
+def test_workers_share_one_burst(tmp_path):
+    clock = Clock()
+    workers = [limiter(tmp_path, clock), limiter(tmp_path, clock)]
+    results = [workers[i % 2].consume("bucket:{alice}:/api/data:GET", 60, 5).allowed for i in range(7)]
+    assert results == [True] * 5 + [False] * 2
+    clock.now += 2
+    assert [worker.consume("bucket:{alice}:/api/data:GET", 60, 5).allowed for worker in workers] == [True, True]
+    assert workers[1].consume("bucket:{alice}:/api/data:GET", 60, 5).allowed is False
+
+def test_consume_many_is_all_or_nothing(tmp_path):
+    shared = limiter(tmp_path, Clock())
+    checks = [LimitCheck("bucket:{alice}:/api/data:GET", 60, 5, "token_bucket"),
+              LimitCheck("limit:tenant:acme", 60, 1, "token_bucket", cost=2)]
+    denied = shared.consume_many(checks)
+    assert denied.allowed is False and denied.retry_after > 0
+    # The endpoint bucket was not charged for the denied request
+    assert shared.consume("bucket:{alice}:/api/data:GET", 60, 5, cost=5).allowed
+    assert (shared.admitted, shared.rejected) == (1, 1)
+
+def test_clear_owner_resets_only_that_owners_buckets(tmp_path):
+    shared = limiter(tmp_path, Clock())
+    for user_id in ("alice", "bob"):
+        shared.consume_many([LimitCheck(f"bucket:{{{user_id}}}:/api/data:GET", 60, 2, "token_bucket", 2, indexed=True),
+                             LimitCheck("limit:tenant:acme", 60, 10, "token_bucket", 2)], owner=f"bucket:{{{user_id}}}:")
+    assert shared.clear_owner("bucket:{alice}:") == 1
+    assert shared.consume("bucket:{alice}:/api/data:GET", 60, 2, cost=2).allowed
+    assert not shared.consume("bucket:{bob}:/api/data:GET", 60, 2).allowed
+    # Tenant buckets are never tagged: 4 of 10 tokens are still spent
+    assert shared.consume("limit:tenant:acme", 60, 10).remaining == 5
+
+def test_refilled_slots_are_reused_before_evicting(tmp_path):
+    clock = Clock()
+    # One stripe as large as the probe window: every key competes for the same slots
+    shared = limiter(tmp_path, clock, slots=MAX_PROBE, stripes=1)
+    drained = [f"bucket:{{user{i}}}:/api/data:GET" for i in range(MAX_PROBE - 1)]
+    for key in drained:
+        shared.consume(key, 60, 100, cost=100)
+    shared.consume("bucket:{idle}:/api/data:GET", 60, 100)
+    clock.now += 2
+    shared.consume("bucket:{new}:/api/data:GET", 60, 100)
+    assert stored_keys(shared) == {fingerprint(key) for key in drained + ["bucket:{new}:/api/data:GET"]}
+    # The drained buckets kept their state
+    assert all(not shared.consume(key, 60, 100, cost=3).allowed for key in drained)
+
+def test_full_window_evicts_the_stalest_slot(tmp_path):
+    clock = Clock()
+    shared = limiter(tmp_path, clock, slots=MAX_PROBE, stripes=1)
+    keys = [f"bucket:{{user{i}}}:/api/data:GET" for i in range(MAX_PROBE)]
+    for key in keys:
+        # Drained a second apart: the first is full again soonest
+        shared.consume(key, 60, 100, cost=100)
+        clock.now += 1
+    shared.consume("bucket:{new}:/api/data:GET", 60, 100)
+    assert stored_keys(shared) == {fingerprint(key) for key in keys[1:] + ["bucket:{new}:/api/data:GET"]}
+    # The evicted bucket starts over from a full burst
+    assert shared.consume(keys[0], 60, 100, cost=100).allowed
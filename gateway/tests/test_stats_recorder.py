@@ -0,0 +1,36 @@
+import asyncio
+import time
+
+from stats_recorder import StatsRecorder
+
+def test_failed_flushes_keep_only_the_newest_minutes(connect_fake, monkeypatch):
+    async def scenario():
+        client = await connect_fake()
+        recorder = StatsRecorder(client)
+        recorder.max_retained = 40
+
+        async def unavailable(*args):
+            return False
+        monkeypatch.setattr(client, "increment_many", unavailable)
+
+        clock = [time.time()]
+        monkeypatch.setattr(time, "time", lambda: clock[0])
+        minutes = []
+        # Redis stays down for ten minutes, with two users per minute
+        for _ in range(10):
+            for user_id in ("alice", "bob"):
+                recorder.record(user_id, "/api/data", "GET", allowed=True)
+            minutes.append(int(clock[0] // 60))
+            await recorder.flush()
+            clock[0] += 60
+        return recorder, minutes
+
+    recorder, minutes = asyncio.run(scenario())
+    retained = len(recorder.pending) + len(recorder.pending_top)
+    assert retained <= 40
+    # Each minute holds 8 counters and 3 top-N entries
+    assert recorder.dropped == 11 * 10 - retained
+    assert {minute for _, minute, _ in recorder.pending} == set(minutes[-3:])
+    assert {minute for _, _, minute in recorder.pending_top} == set(minutes[-3:])
+    # The minutes kept still hold every count
+    assert recorder.pending[("global", minutes[-1], "total")] == 2
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from rate_limiter import TokenBucketRateLimiter
+from route_resolver import RouteResolver
+from test_bucket_index import Clock, advance
+
+def config(**tiers):
+    """Generous endpoint limits, so only the plan quotas decide; everyone is on the first tier"""
+    return {"default_requests_per_minute": 6000, "default_burst_size": 100,
+            "endpoints": {"/api/data": {"GET": {"cost": 1}, "POST": {"cost": 2}}}, "user_overrides": {},
+            "tiers": tiers, "default_tier": next(iter(tiers))}
+
+@pytest.mark.parametrize("quotas, message", [
+    ({"minute": 10, "hour": 5}, r"Tier free hour quota \(5\) is below its minute quota \(10\)"),
+    ({"day": 50, "hour": 100}, r"Tier free day quota \(50\) is below its hour quota \(100\)"),
+    ({"week": 10}, "Unknown quota window in tier free: week"),
+    ({"hour": 0}, "Tier free hour quota must be at least 1"),
+])
+def test_tier_quotas_must_nest(quotas, message):
+    with pytest.raises(ValueError, match=message):
+        RouteResolver(config(free={"quotas": quotas}))
+
+def test_tier_costs_override_the_rule_cost():
+    resolver = RouteResolver({
+        **config(free={"quotas": {"day": 100}, "costs": {"/api/data": {"POST": 10}}}, pro={}),
+        "user_tiers": {"alice": "pro"}
+    })
+    assert resolver.resolve("bob", "/api/data", "POST").cost == 10
+    # Other methods, and users on plans without the cost, keep the rule's
+    assert resolver.resolve("bob", "/api/data", "GET").cost == 1
+    assert resolver.resolve("alice", "/api/data", "POST").cost == 2
+
+async def admit(limiter, count: int, method: str = "GET"):
+    return [(await limiter.admit_dimensions("alice", "/api/data", method)).allowed for _ in range(count)]
+
+def test_quotas_reject_once_exhausted(connect_fake):
+    async def scenario():
+        client = await connect_fake()
+        clock = Clock()
+        limiter = TokenBucketRateLimiter(client, clock=clock)
+        await limiter.update_config(config(free={"quotas": {"hour": 5, "day": 8}}))
+        first_hour = await admit(limiter, 6)
+        # Two hours on the previous hour no longer weighs in; the day still counts all of it
+        await advance(client, clock, 2 * 3600)
+        later = await admit(limiter, 4)
+        return first_hour, later
+
+    first_hour, later = asyncio.run(scenario())
+    assert first_hour == [True] * 5 + [False]
+    assert later == [True] * 3 + [False]
+
+def test_quotas_charge_the_tier_cost(connect_fake):
+    async def scenario():
+        client = await connect_fake()
+        limiter = TokenBucketRateLimiter(client, clock=Clock())
+        await limiter.update_config(config(free={"quotas": {"hour": 10}, "costs": {"/api/data": {"POST": 4}}}))
+        return await admit(limiter, 3, "POST"), await admit(limiter, 3)
+
+    post, get = asyncio.run(scenario())
+    assert post == [True, True, False]
+    assert get == [True, True, False]
+
+def test_reset_leaves_quota_usage_alone(connect_fake):
+    async def scenario():
+        client = await connect_fake()
+        limiter = TokenBucketRateLimiter(client, clock=Clock())
+        await limiter.update_config(config(free={"quotas": {"minute": 3}}))
+        await admit(limiter, 3)
+        await limiter.reset_user_limits("alice")
+        return await client.redis.keys("bucket:*"), await admit(limiter, 1)
+
+    keys, after_reset = asyncio.run(scenario())
+    assert keys == ["bucket:{alice}:quota:minute:swc"]
+    assert after_reset == [False]
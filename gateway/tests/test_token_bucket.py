@@ -0,0 +1,41 @@
+import asyncio
+
+from rate_limiter import TokenBucketRateLimiter
+
+BURST = 25
+
+def limited_config():
+    # Refill is slow enough that no token comes back while the test runs
+    return {
+        "default_requests_per_minute": 1,
+        "default_burst_size": BURST,
+        "endpoints": {},
+        "user_overrides": {}
+    }
+
+def test_concurrent_admissions_never_exceed_burst(connect_fake):
+    async def scenario():
+        # One pooled connection per caller, so every call is in flight at once
+        limiter = TokenBucketRateLimiter(await connect_fake(max_connections=250))
+        await limiter.update_config(limited_config())
+        return await asyncio.gather(*[limiter.is_allowed("alice", "/api/data", "GET") for _ in range(200)])
+
+    decisions = asyncio.run(scenario())
+    assert decisions.count(True) == BURST
+
+def test_script_reloaded_after_script_cache_flush(connect_fake):
+    async def scenario():
+        client = await connect_fake()
+        limiter = TokenBucketRateLimiter(client)
+        await limiter.update_config(limited_config())
+        first = await limiter.is_allowed("bob", "/api/data", "GET")
+        await client.redis.script_flush()
+        assert not any(await client.redis.script_exists(*client.script_shas.values()))
+        decisions = await asyncio.gather(*[limiter.is_allowed("bob", "/api/data", "GET") for _ in range(BURST)])
+        return first, decisions, await client.redis.script_exists(client.script_shas["token_bucket"])
+
+    first, decisions, loaded = asyncio.run(scenario())
+    # One token was spent before the flush; the reloaded script still sees the bucket
+    assert first is True
+    assert decisions.count(True) == BURST - 1
+    assert loaded == [True]